@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Cliente
+from .busqueda import buscar_clientes
 
 
 @admin.register(Cliente)
@@ -22,3 +23,8 @@ class ClienteAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return buscar_clientes(queryset, search_term), False
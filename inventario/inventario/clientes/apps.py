@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ClientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clientes'
+
+    def ready(self):
+        from . import checks  # Registra el check de los triggers de SQLite
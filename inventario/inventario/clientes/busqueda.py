@@ -0,0 +1,8 @@
+"""Búsqueda indexada de clientes por nombre, apellido, documento o email (ver inventario/busqueda.py)."""
+from inventario.busqueda import BusquedaIndexada
+
+CAMPOS_BUSQUEDA = ['nombre', 'apellido', 'numero_documento', 'email']
+
+busqueda = BusquedaIndexada('clientes_cliente', CAMPOS_BUSQUEDA, orden=['apellido', 'nombre'])
+filtro_contiene = busqueda.filtro_contiene
+buscar_clientes = busqueda.buscar
@@ -0,0 +1,15 @@
+"""La búsqueda indexada de clientes depende de triggers de SQLite: ver productos/checks.py."""
+from django.core import checks
+
+from inventario.sqlite import errores_triggers
+
+TRIGGERS = {
+    ('clientes', '0002_busqueda_indexada'): ('clientes_cliente_fts', [
+        'clientes_cliente_fts_ai', 'clientes_cliente_fts_ad', 'clientes_cliente_fts_au',
+    ]),
+}
+
+
+@checks.register(checks.Tags.database)
+def triggers_clientes(app_configs, databases=None, **kwargs):
+    return errores_triggers(databases, TRIGGERS, id='clientes.E001')
@@ -0,0 +1,74 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from clientes.busqueda import buscar_clientes, filtro_contiene
+from clientes.models import Cliente
+
+NOMBRES = ['Juan', 'María', 'Carlos', 'Lucía', 'Pedro', 'Ana', 'Jorge', 'Sofía', 'Diego', 'Valentina']
+APELLIDOS = ['González', 'Rodríguez', 'Fernández', 'López', 'Martínez', 'Pérez', 'Gómez', 'Díaz', 'Sosa', 'Romero']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda indexada de clientes contra icontains sobre tablas de distintos '
+        'tamaños. Los clientes de prueba se crean en una transacción que se deshace al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamanios', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+            help='Cantidades de clientes a medir (de menor a mayor)'
+        )
+        parser.add_argument('--repeticiones', type=int, default=20, help='Búsquedas por cada medición')
+        parser.add_argument('--lote', type=int, default=5_000, help='Clientes por cada bulk_create')
+
+    def handle(self, *args, **options):
+        tamanios = sorted(options['tamanios'])
+        if not tamanios or tamanios[0] < 1 or options['repeticiones'] < 1:
+            raise CommandError('Los tamaños y las repeticiones deben ser mayores a 0')
+
+        self.stdout.write(f"{'clientes':>10} {'indexada (ms)':>15} {'icontains (ms)':>15}")
+        with transaction.atomic():
+            creados = 0
+            for tamanio in tamanios:
+                self.crear_clientes(creados, tamanio, options['lote'])
+                creados = tamanio
+                indexada, contiene = self.medir(tamanio, options['repeticiones'])
+                self.stdout.write(f'{tamanio:>10} {indexada:>15.2f} {contiene:>15.2f}')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark terminado, los clientes de prueba se descartaron'))
+
+    def crear_clientes(self, desde, hasta, lote):
+        for inicio in range(desde, hasta, lote):
+            Cliente.objects.bulk_create([
+                Cliente(
+                    nombre=random.choice(NOMBRES),
+                    apellido=f'{random.choice(APELLIDOS)}{i}',
+                    numero_documento=f'BM{i:09d}',
+                    email=f'cliente{i}@benchmark.test',
+                    telefono='0',
+                    direccion='-',
+                )
+                for i in range(inicio, min(inicio + lote, hasta))
+            ])
+
+    def medir(self, tamanio, repeticiones):
+        """Promedio en ms de buscar documentos existentes con cada estrategia."""
+        textos = [f'BM{random.randrange(tamanio):09d}' for _ in range(repeticiones)]
+        queryset = Cliente.objects.all()
+
+        inicio = time.perf_counter()
+        for texto in textos:
+            list(buscar_clientes(queryset, texto)[:10])
+        indexada = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+        inicio = time.perf_counter()
+        for texto in textos:
+            list(queryset.filter(filtro_contiene(texto)).order_by('apellido', 'nombre')[:10])
+        contiene = (time.perf_counter() - inicio) * 1000 / repeticiones
+
+        return indexada, contiene
+
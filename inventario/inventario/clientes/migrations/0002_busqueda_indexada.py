@@ -0,0 +1,76 @@
+from django.db import migrations, OperationalError
+
+CAMPOS = ['nombre', 'apellido', 'numero_documento', 'email']
+
+SQLITE = [
+    """CREATE VIRTUAL TABLE clientes_cliente_fts USING fts5(
+        nombre, apellido, numero_documento, email,
+        content='clientes_cliente', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER clientes_cliente_fts_ai AFTER INSERT ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(rowid, nombre, apellido, numero_documento, email)
+        VALUES (new.id, new.nombre, new.apellido, new.numero_documento, new.email);
+    END""",
+    """CREATE TRIGGER clientes_cliente_fts_ad AFTER DELETE ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(clientes_cliente_fts, rowid, nombre, apellido, numero_documento, email)
+        VALUES ('delete', old.id, old.nombre, old.apellido, old.numero_documento, old.email);
+    END""",
+    """CREATE TRIGGER clientes_cliente_fts_au AFTER UPDATE ON clientes_cliente BEGIN
+        INSERT INTO clientes_cliente_fts(clientes_cliente_fts, rowid, nombre, apellido, numero_documento, email)
+        VALUES ('delete', old.id, old.nombre, old.apellido, old.numero_documento, old.email);
+        INSERT INTO clientes_cliente_fts(rowid, nombre, apellido, numero_documento, email)
+        VALUES (new.id, new.nombre, new.apellido, new.numero_documento, new.email);
+    END""",
+    "INSERT INTO clientes_cliente_fts(clientes_cliente_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSA = [
+    "DROP TRIGGER IF EXISTS clientes_cliente_fts_ai",
+    "DROP TRIGGER IF EXISTS clientes_cliente_fts_ad",
+    "DROP TRIGGER IF EXISTS clientes_cliente_fts_au",
+    "DROP TABLE IF EXISTS clientes_cliente_fts",
+]
+
+POSTGRESQL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f'CREATE INDEX IF NOT EXISTS clientes_cliente_{campo}_trgm '
+    f'ON clientes_cliente USING gin ((UPPER("{campo}"::text)) gin_trgm_ops)'
+    for campo in CAMPOS
+]
+
+POSTGRESQL_REVERSA = [f'DROP INDEX IF EXISTS clientes_cliente_{campo}_trgm' for campo in CAMPOS]
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            for sql in SQLITE:
+                schema_editor.execute(sql)
+        except OperationalError:
+            # SQLite anterior a 3.34 no tiene el tokenizer trigram: se busca sin índice
+            for sql in SQLITE_REVERSA:
+                schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL:
+            schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_REVERSA:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL_REVERSA:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0002_busqueda_indexada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['apellido', 'nombre', 'id'], name='cliente_apellido_nombre_idx'),
+        ),
+    ]
@@ -39,6 +39,10 @@ class Cliente(models.Model):
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['apellido', 'nombre']
+        indexes = [
+            # Listado paginado por cursor sobre (apellido, nombre, id)
+            models.Index(fields=['apellido', 'nombre', 'id'], name='cliente_apellido_nombre_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of Cliente."""
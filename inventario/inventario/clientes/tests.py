@@ -1,3 +1,105 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from io import StringIO
 
-# Create your tests here.
+from inventario.pruebas import IndicesTestMixin, crear_cliente
+from .busqueda import buscar_clientes, filtro_contiene
+from .checks import triggers_clientes
+from .models import Cliente
+
+
+class BusquedaClientesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = crear_cliente('30111222', nombre='Ana', apellido='Gómez', email='ana@correo.com')
+        cls.martin = crear_cliente('28999000', nombre='Martín', apellido='Anaya')
+        cls.luis = crear_cliente('40555666', nombre='Luis', apellido='Sosa', email='luis@empresa.com')
+
+    def buscar(self, texto):
+        return list(buscar_clientes(Cliente.objects.all(), texto))
+
+    def test_mismos_resultados_que_icontains(self):
+        for texto in ['ana', 'GóM', '111', 'empresa.com', 'sos', 'an', 'xyz']:
+            esperados = set(Cliente.objects.filter(filtro_contiene(texto)))
+            self.assertEqual(set(self.buscar(texto)), esperados, texto)
+
+    def test_ordena_por_relevancia(self):
+        # "ana" aparece en nombre, email y apellido de Ana y solo en el apellido de Martín
+        self.assertEqual(self.buscar('ana'), [self.ana, self.martin])
+
+    def test_indice_sigue_los_cambios(self):
+        self.luis.apellido = 'Benítez'
+        self.luis.save()
+        self.assertEqual(self.buscar('Benít'), [self.luis])
+        self.assertEqual(self.buscar('Sosa'), [])
+
+        self.luis.delete()
+        self.assertEqual(self.buscar('Benít'), [])
+
+        nuevo = crear_cliente('50123123', nombre='Carla', apellido='Benítez')
+        self.assertEqual(self.buscar('Benít'), [nuevo])
+
+    def test_texto_con_comillas(self):
+        self.assertEqual(self.buscar('"ana'), [])
+
+    def test_vista_usa_la_busqueda(self):
+        user = User.objects.create_user(username='vendedor', password='clave123')
+        self.client.force_login(user)
+        response = self.client.get(reverse('clientes:cliente_list'), {'search': 'ana'})
+        self.assertEqual(list(response.context['clientes']), [self.ana, self.martin])
+
+    def test_paginacion(self):
+        user = User.objects.create_user(username='vendedor', password='clave123')
+        self.client.force_login(user)
+        response = self.client.get(reverse('clientes:cliente_list'))
+        self.assertTrue(response.context['paginacion_cursor'])
+        self.assertEqual(response.context['paginator'].count, 3)
+        # Ordenada por relevancia no se puede buscar por cursor: vuelve a la paginación por número
+        response = self.client.get(reverse('clientes:cliente_list'), {'search': 'ana'})
+        self.assertFalse(response.context['paginacion_cursor'])
+
+    def test_usa_el_indice_en_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        consulta = str(buscar_clientes(Cliente.objects.all(), 'ana').query)
+        self.assertIn('clientes_cliente_fts', consulta)
+        self.assertNotIn('LIKE', consulta)
+
+
+    def test_el_check_detecta_triggers_perdidos(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        self.assertEqual(triggers_clientes(None, databases=['default']), [])
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER clientes_cliente_fts_ai')
+        self.assertEqual([error.id for error in triggers_clientes(None, databases=['default'])], ['clientes.E001'])
+
+
+class BenchmarkBusquedaClientesTest(TestCase):
+
+    def test_no_deja_clientes(self):
+        salida = StringIO()
+        call_command('benchmark_busqueda_clientes', tamanios=[50, 100], repeticiones=2, lote=30, stdout=salida)
+        self.assertIn('100', salida.getvalue())
+        self.assertFalse(Cliente.objects.exists())
+
+
+class IndicesConsultasTest(IndicesTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Cliente.objects.bulk_create([
+            Cliente(nombre=f'Nombre {i}', apellido=f'Apellido {i % 300}', numero_documento=f'D{i}',
+                    email=f'c{i}@example.com', telefono='1', direccion='-')
+            for i in range(1500)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_paginas_por_cursor(self):
+        cliente = Cliente.objects.get(numero_documento='D700')
+        self.assertPaginaPorCursorUsaIndice(Cliente.objects.all(), ['apellido', 'nombre'], cliente)
@@ -2,32 +2,30 @@ from django.shortcuts import render
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q
 from django.contrib.auth.mixins import LoginRequiredMixin
+from inventario.paginacion import PaginacionCursorMixin
+from inventario.replicas import LecturaEnReplicaMixin
 from .models import Cliente
 from .forms import ClienteForm
+from .busqueda import buscar_clientes
 
 
-class ClienteListView(LoginRequiredMixin, ListView):
+class ClienteListView(LoginRequiredMixin, LecturaEnReplicaMixin, PaginacionCursorMixin, ListView):
     """Muestra una lista de todos los clientes."""
     model = Cliente
     template_name = "clientes/cliente_list.html"
     context_object_name = "clientes"
     paginate_by = 10
+    orden_cursor = ['apellido', 'nombre']
 
     def get_queryset(self):
-        """Permite búsqueda por nombre, apellido o documento."""
+        """Permite búsqueda por nombre, apellido, documento o email, ordenada por relevancia."""
         queryset = super().get_queryset()
         search = self.request.GET.get('search')
-        
+
         if search:
-            queryset = queryset.filter(
-                Q(nombre__icontains=search) |
-                Q(apellido__icontains=search) |
-                Q(numero_documento__icontains=search) |
-                Q(email__icontains=search)
-            )
-        
+            return buscar_clientes(queryset, search)
+
         return queryset.order_by('apellido', 'nombre')
     
     def get_context_data(self, **kwargs):
@@ -0,0 +1,123 @@
+"""
+Control de admisión por proceso para el trabajo que ocupa un worker un buen
+rato (generar PDF, mantener abierto un stream de eventos).
+
+Cada límite lee de settings `<PREFIJO>_CONCURRENCIA` (cuántos a la vez),
+`<PREFIJO>_COLA` (cuántos más esperan un lugar) y `<PREFIJO>_ESPERA`
+(segundos que espera cada uno); el resto se rechaza enseguida con la
+excepción del límite, para que la vista responda 503 en lugar de dejar a
+todos los workers ocupados mientras las pantallas de venta esperan.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class Saturado(Exception):
+    """Se alcanzó el límite y la cola de espera está llena o venció."""
+
+
+class LimiteConcurrencia:
+
+    def __init__(self, prefijo, concurrencia, cola=0, espera=0, excepcion=Saturado):
+        self.prefijo = prefijo
+        self.por_defecto = {'CONCURRENCIA': concurrencia, 'COLA': cola, 'ESPERA': espera}
+        self.excepcion = excepcion
+        self._condicion = threading.Condition()
+        self.en_curso = 0
+        self.en_cola = 0
+        self.encolados = 0
+        self.rechazados = 0
+        self.completados = 0
+        self.de_fondo = 0
+
+    def _ajuste(self, nombre):
+        return getattr(settings, f'{self.prefijo}_{nombre}', self.por_defecto[nombre])
+
+    def entrar(self, esperar=True, de_fondo=False):
+        """
+        Toma un lugar; con `esperar=False` no pasa por la cola. Cada `entrar` lleva su `salir`.
+
+        El trabajo `de_fondo` (exportaciones, tareas que no tienen a nadie
+        esperando la respuesta) ya pasó su propio control de admisión: espera
+        su lugar sin plazo y sin ocupar la cola de los pedidos.
+        """
+        concurrencia = self._ajuste('CONCURRENCIA')
+        with self._condicion:
+            if de_fondo:
+                self.de_fondo += 1
+                self._condicion.wait_for(lambda: self.en_curso < concurrencia)
+            elif self.en_curso >= concurrencia:
+                if not esperar or self.en_cola >= self._ajuste('COLA'):
+                    self.rechazados += 1
+                    raise self.excepcion()
+                self.en_cola += 1
+                self.encolados += 1
+                try:
+                    admitido = self._condicion.wait_for(
+                        lambda: self.en_curso < concurrencia, timeout=self._ajuste('ESPERA')
+                    )
+                finally:
+                    self.en_cola -= 1
+                if not admitido:
+                    self.rechazados += 1
+                    raise self.excepcion()
+            self.en_curso += 1
+
+    def salir(self, completado=True):
+        with self._condicion:
+            self.en_curso -= 1
+            self.completados += completado
+            self._condicion.notify()
+
+    @contextmanager
+    def turno(self, esperar=True, de_fondo=False):
+        self.entrar(esperar, de_fondo)
+        completado = False
+        try:
+            yield
+            completado = True
+        finally:
+            self.salir(completado)
+
+    def metricas(self):
+        with self._condicion:
+            return {
+                'en_curso': self.en_curso,
+                'en_cola': self.en_cola,
+                'encolados': self.encolados,
+                'rechazados': self.rechazados,
+                'completados': self.completados,
+                'de_fondo': self.de_fondo,
+            }
+
+
+class StreamConTurno:
+    """
+    Contenido de un StreamingHttpResponse que ocupa un lugar de `limite` mientras se genera.
+
+    El lugar se toma al crearlo (sin esperar: si no hay, lanza la excepción del
+    límite antes de empezar la respuesta) y se devuelve en `close()`, que Django
+    llama al terminar la respuesta aunque el cliente se haya desconectado antes
+    de empezar a leer.
+    """
+
+    def __init__(self, limite, partes):
+        limite.entrar(esperar=False)
+        self.limite = limite
+        self.partes = partes
+        self.abierto = True
+
+    def __iter__(self):
+        return iter(self.partes)
+
+    def close(self):
+        if not self.abierto:
+            return
+        self.abierto = False
+        try:
+            if hasattr(self.partes, 'close'):
+                self.partes.close()
+        finally:
+            self.limite.salir()
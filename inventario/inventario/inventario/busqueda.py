@@ -0,0 +1,94 @@
+"""
+Búsqueda "contiene el texto" resuelta con índices, para productos y clientes.
+
+- SQLite: tabla virtual FTS5 con tokenizer trigram (<tabla>_fts), sincronizada
+  con triggers sobre la tabla cada vez que una fila se guarda o se borra.
+- PostgreSQL: índices GIN con pg_trgm sobre UPPER(campo), que son justamente
+  las expresiones que Django usa para icontains.
+
+En ambos casos los resultados son los mismos que con icontains en cualquiera
+de los campos, pero se resuelven con el índice en lugar de recorrer toda la
+tabla y se ordenan por relevancia. Los textos de menos de 3 caracteres no
+forman trigramas y se buscan con icontains.
+
+Los índices y triggers los crean las migraciones 0002_busqueda_indexada de
+cada app, con su SQL escrito ahí: un cambio en ellos va en una migración nueva.
+"""
+from django.db import connections
+from django.db.models import Case, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+LARGO_MINIMO = 3
+
+
+class BusquedaIndexada:
+    """
+    Búsqueda sobre los `campos` de un modelo, ordenada por relevancia y después por `orden`.
+
+    `exacto`, si se indica, recibe el texto y devuelve un Q de coincidencia
+    exacta (o None): esas filas se incluyen en la misma consulta y van primero.
+    """
+
+    def __init__(self, tabla, campos, orden, exacto=None):
+        self.tabla_fts = f'{tabla}_fts'
+        self.campos = campos
+        self.orden = orden
+        self.exacto = exacto
+        self._fts_disponible = {}
+
+    def fts_disponible(self, alias):
+        """Indica si la base tiene la tabla FTS5 (SQLite sin soporte de trigram no la crea)."""
+        if alias not in self._fts_disponible:
+            with connections[alias].cursor() as cursor:
+                tablas = connections[alias].introspection.table_names(cursor)
+            self._fts_disponible[alias] = self.tabla_fts in tablas
+        return self._fts_disponible[alias]
+
+    def filtro_contiene(self, texto):
+        filtro = Q()
+        for campo in self.campos:
+            filtro |= Q(**{f'{campo}__icontains': texto})
+        return filtro
+
+    def buscar(self, queryset, texto):
+        """Filtra `queryset` por `texto` y lo ordena por relevancia."""
+        texto = texto.strip()
+        if not texto:
+            return queryset
+
+        vendor = connections[queryset.db].vendor
+        rango = None
+        orden = []
+        if len(texto) >= LARGO_MINIMO and vendor == 'sqlite' and self.fts_disponible(queryset.db):
+            coincide, rango = self._fts(queryset, texto)
+            orden = ['rango']
+        elif len(texto) >= LARGO_MINIMO and vendor == 'postgresql':
+            from django.contrib.postgres.search import TrigramSimilarity
+            from django.db.models.functions import Greatest
+
+            coincide = self.filtro_contiene(texto)
+            rango = Greatest(*[TrigramSimilarity(campo, texto) for campo in self.campos])
+            orden = ['-rango']
+        else:
+            coincide = self.filtro_contiene(texto)
+
+        exacto = self.exacto(texto) if self.exacto else None
+        if exacto is not None:
+            coincide |= exacto
+            queryset = queryset.annotate(exacto=Case(When(exacto, then=Value(0)), default=Value(1)))
+            orden.insert(0, 'exacto')
+        if rango is not None:
+            queryset = queryset.annotate(rango=rango)
+        return queryset.filter(coincide).order_by(*orden, *self.orden)
+
+    def _fts(self, queryset, texto):
+        """(filtro, rango) sobre la tabla FTS5 de SQLite."""
+        qn = connections[queryset.db].ops.quote_name
+        fts = qn(self.tabla_fts)
+        modelo = queryset.model._meta
+        fila = f'{qn(modelo.db_table)}.{qn(modelo.pk.column)}'
+        # Frase entre comillas: coincide como substring en cualquiera de las columnas
+        consulta = '"' + texto.replace('"', '""') + '"'
+        coincide = Q(pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [consulta]))
+        rango = RawSQL(f'SELECT rank FROM {fts} WHERE {fts} MATCH %s AND rowid = {fila}', [consulta])
+        return coincide, rango
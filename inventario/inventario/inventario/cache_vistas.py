@@ -0,0 +1,180 @@
+"""
+Cache de los listados y del dashboard con datos viejos mientras se recalculan.
+
+Lo que se guarda son los datos de cada página (las filas, los cursores, las
+series del dashboard) y no el HTML: la página lleva el usuario, los mensajes
+y el token CSRF, que se siguen armando en cada pedido. La clave es la
+variante visible de la vista: la ruta y sus parámetros (filtros, búsqueda,
+cursor, página, rango del dashboard).
+
+Cada entrada guarda la versión de los grupos de los que depende ('productos',
+'ventas'). Los signals de Producto, MovimientoStock y Venta (y las
+operaciones en bloque, que no pasan por los signals) llaman a `invalidar`,
+que cambia la versión del grupo. Una entrada con otra versión, o con más de
+VISTAS_CACHE_TTL segundos, está vieja: la recalcula el primer pedido que
+toma el bloqueo y mientras tanto el resto sigue recibiendo la versión vieja,
+así una ráfaga de pedidos después de una venta no recalcula lo mismo en
+todos los workers. Solo se calcula en paralelo cuando no hay nada guardado.
+
+Con réplicas de lectura (inventario/replicas.py), quien acaba de escribir
+no usa el cache: ni recibe ni guarda entradas. Lo calculado en una réplica
+durante los REPLICA_RETRASO_MAXIMO segundos que siguen a una invalidación
+tampoco se guarda, porque la réplica puede no tener todavía ese cambio.
+
+Con LocMemCache (el default) cada proceso tiene su propio cache y las
+invalidaciones no llegan a los otros workers; en producción hay que
+configurar un cache compartido (Redis, Memcached, archivos o base de datos).
+"""
+import copy
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from inventario import replicas
+
+PREFIJO = 'vistas'
+
+
+def _clave_version(grupo):
+    return f'{PREFIJO}:version:{grupo}'
+
+
+def versiones(grupos):
+    """Versión actual de cada grupo; los que no tienen una (cache vacío) la reciben."""
+    claves = {grupo: _clave_version(grupo) for grupo in grupos}
+    guardadas = cache.get_many(list(claves.values()))
+    actuales = {}
+    for grupo, clave in claves.items():
+        version = guardadas.get(clave)
+        if version is None:
+            cache.add(clave, _nueva_version(), None)
+            version = cache.get(clave)
+        actuales[grupo] = version
+    return actuales
+
+
+def _nueva_version():
+    # La versión lleva el momento en que se creó: el de la última invalidación del grupo
+    return f'{time.time():.6f}:{uuid.uuid4().hex}'
+
+
+def _creada(version):
+    try:
+        return float(version.partition(':')[0])
+    except ValueError:
+        return 0.0
+
+
+def _cambiar_versiones(grupos):
+    cache.set_many({_clave_version(grupo): _nueva_version() for grupo in grupos}, None)
+
+
+def invalidar(*grupos):
+    """
+    Marca como viejas las entradas que dependen de `grupos`.
+
+    Se invalida en el momento y otra vez al confirmar la transacción: si otro
+    pedido recalcula entre las dos, todavía no ve los cambios y lo que guarda
+    queda viejo con la segunda invalidación.
+    """
+    _cambiar_versiones(grupos)
+    transaction.on_commit(lambda: _cambiar_versiones(grupos))
+
+
+def obtener(clave, grupos, calcular):
+    """
+    Devuelve lo guardado en `clave` o el resultado de `calcular()`.
+
+    Si lo guardado está viejo y otro pedido ya lo está recalculando se
+    devuelve lo viejo en lugar de calcular de nuevo.
+    """
+    lectura = replicas.lectura_actual()
+    if lectura == replicas.PRIMARIA:
+        return calcular()
+
+    actuales = versiones(grupos)
+    guardado = cache.get(clave)
+    bloqueo = None
+    if guardado is not None:
+        version, vence, valor = guardado
+        if version == actuales and time.time() < vence:
+            return valor
+        bloqueo = f'{clave}:recalculando'
+        if not cache.add(bloqueo, True, getattr(settings, 'VISTAS_CACHE_RECALCULO', 30)):
+            return valor
+
+    try:
+        valor = calcular()
+        invalidado = max(_creada(version) for version in actuales.values()) if actuales else 0
+        if lectura is None or time.time() - invalidado >= getattr(settings, 'REPLICA_RETRASO_MAXIMO', 5):
+            vence = time.time() + getattr(settings, 'VISTAS_CACHE_TTL', 60)
+            # La entrada dura más que su vigencia para poder servirla vieja
+            cache.set(clave, (actuales, vence, valor), getattr(settings, 'VISTAS_CACHE_MAXIMO', 86400))
+    finally:
+        if bloqueo:
+            cache.delete(bloqueo)
+    return valor
+
+
+def clave_pedido(request, nombre):
+    """Clave de la variante visible de una vista: su ruta y sus parámetros."""
+    parametros = sorted((clave, valores) for clave, valores in request.GET.lists())
+    huella = hashlib.sha256(f'{request.path}?{parametros!r}'.encode('utf-8')).hexdigest()
+    return f'{PREFIJO}:{nombre}:{huella}'
+
+
+def _sin_queryset(paginador):
+    """
+    Copia del paginador que se puede guardar sin arrastrar su queryset.
+
+    Al guardar un queryset se traen todas sus filas; la copia conserva lo
+    que ya se calculó (el total, el número de páginas) y los cursores.
+    """
+    if paginador is None:
+        return None
+    paginador = copy.copy(paginador)
+    paginador.object_list = []
+    if hasattr(paginador, 'queryset'):
+        paginador.queryset = None
+    return paginador
+
+
+class CacheListadoMixin:
+    """
+    Guarda en el cache (ver `obtener`) las filas de un ListView.
+
+    La vista define `grupos_cache` con los grupos de los que dependen sus
+    filas. Con paginación se guarda la página (y los atributos que la
+    paginación deja en la vista, como `paginacion_cursor`); sin paginación,
+    la lista completa.
+    """
+    grupos_cache = ()
+    atributos_cache = ('paginacion_cursor',)
+
+    def clave_cache(self):
+        return clave_pedido(self.request, type(self).__name__)
+
+    def paginate_queryset(self, queryset, page_size):
+        def calcular():
+            paginador, pagina, filas, paginado = super(CacheListadoMixin, self).paginate_queryset(queryset, page_size)
+            paginador = _sin_queryset(paginador)
+            pagina.object_list = filas = list(filas)
+            if hasattr(pagina, 'paginator'):
+                pagina.paginator = paginador
+            atributos = {nombre: getattr(self, nombre) for nombre in self.atributos_cache if hasattr(self, nombre)}
+            return paginador, pagina, filas, paginado, atributos
+
+        paginador, pagina, filas, paginado, atributos = obtener(self.clave_cache(), self.grupos_cache, calcular)
+        for nombre, valor in atributos.items():
+            setattr(self, nombre, valor)
+        return paginador, pagina, filas, paginado
+
+    def get_context_data(self, **kwargs):
+        if self.get_paginate_by(self.object_list) is None:
+            queryset = self.object_list
+            self.object_list = obtener(self.clave_cache(), self.grupos_cache, lambda: list(queryset))
+        return super().get_context_data(**kwargs)
@@ -0,0 +1,301 @@
+"""
+Exportación de tablas a CSV o XLSX sin cargarlas en memoria.
+
+Las filas se leen con values_list().iterator(chunk_size=...) y se escriben a
+medida que se generan, así la memoria no depende de la cantidad de filas y
+la respuesta empieza a llegar al navegador enseguida. El XLSX se arma a mano
+(es un ZIP con XML) para poder escribirlo por partes; cada hoja admite como
+máximo FILAS_POR_HOJA filas y al pasarse se abre otra.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+
+TAMANIO_LOTE = 2000
+# Excel toma como fórmula una celda de CSV que empieza con alguno de estos caracteres
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+# Caracteres de control que XML 1.0 no admite: con uno solo el XLSX queda corrupto
+CONTROL_INVALIDO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# Límite de Excel (1.048.576) menos la fila de encabezados
+FILAS_POR_HOJA = 1_048_575
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class Exportacion:
+    """
+    Una tabla exportable: columnas (título, campo de values_list) y filtros.
+
+    `campo_fecha` y `campo_producto` indican sobre qué campos se aplican los
+    filtros desde/hasta y producto (SKU); si el filtro por producto no es un
+    campo directo se puede pasar `filtrar_producto(queryset, sku)`.
+    """
+
+    def __init__(self, nombre, queryset, columnas, campo_fecha=None, campo_producto=None,
+                 filtrar_producto=None):
+        self.nombre = nombre
+        self.queryset = queryset
+        self.columnas = columnas
+        self.campo_fecha = campo_fecha
+        self.campo_producto = campo_producto
+        self.filtrar_producto = filtrar_producto
+
+    @property
+    def encabezados(self):
+        return [titulo for titulo, _ in self.columnas]
+
+    def filtrar(self, desde=None, hasta=None, producto=None):
+        queryset = self.queryset.all()
+        if self.campo_fecha:
+            # Rangos sobre la columna (no __date) para que se use su índice
+            if desde:
+                inicio = timezone.make_aware(datetime.combine(desde, time.min))
+                queryset = queryset.filter(**{f'{self.campo_fecha}__gte': inicio})
+            if hasta:
+                fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+                queryset = queryset.filter(**{f'{self.campo_fecha}__lt': fin})
+        if producto:
+            if self.filtrar_producto:
+                queryset = self.filtrar_producto(queryset, producto)
+            elif self.campo_producto:
+                queryset = queryset.filter(**{self.campo_producto: producto})
+        return queryset
+
+    def filas(self, **filtros):
+        queryset = self.filtrar(**filtros).values_list(*[campo for _, campo in self.columnas])
+        return queryset.iterator(chunk_size=TAMANIO_LOTE)
+
+
+class FiltroExportacionForm(forms.Form):
+    """Filtros comunes de las exportaciones (todos opcionales)."""
+    formato = forms.ChoiceField(
+        choices=[('csv', 'CSV'), ('xlsx', 'Excel (XLSX)')],
+        required=False,
+        label="Formato"
+    )
+    desde = forms.DateField(
+        required=False,
+        label="Desde",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False,
+        label="Hasta",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    producto = forms.CharField(
+        required=False,
+        label="Producto",
+        widget=forms.TextInput(attrs={'placeholder': 'SKU'})
+    )
+
+    def clean_formato(self):
+        return self.cleaned_data.get('formato') or 'csv'
+
+    def clean_producto(self):
+        return self.cleaned_data.get('producto', '').strip().upper()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if desde and hasta and desde > hasta:
+            raise ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'")
+        return cleaned_data
+
+    def filtros(self):
+        return {campo: self.cleaned_data.get(campo) for campo in ('desde', 'hasta', 'producto')}
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).strftime('%Y-%m-%d %H:%M:%S') if timezone.is_aware(valor) else str(valor)
+    return str(valor)
+
+
+def _texto_csv(valor):
+    """Texto de una celda de CSV; el texto cargado por usuarios no se ejecuta como fórmula."""
+    texto = _texto(valor)
+    if isinstance(valor, str) and texto.startswith(INICIO_FORMULA):
+        return "'" + texto
+    return texto
+
+
+class _Eco:
+    """Destino de csv.writer que devuelve lo escrito en lugar de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def partes_csv(encabezados, filas):
+    """CSV en UTF-8 con BOM (Excel lo abre con los acentos bien), una línea por parte."""
+    escritor = csv.writer(_Eco())
+    yield '\ufeff' + escritor.writerow(encabezados)
+    for fila in filas:
+        yield escritor.writerow([_texto_csv(valor) for valor in fila])
+
+
+class SalidaZip:
+    """Destino de escritura sin seek para zipfile: acumula lo escrito hasta que se retira."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _celda(valor):
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    texto = CONTROL_INVALIDO_XML.sub('', _texto(valor))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+def _fila_xlsx(valores):
+    return ('<row>' + ''.join(_celda(valor) for valor in valores) + '</row>').encode('utf-8')
+
+
+CABECERA_HOJA = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+PIE_HOJA = b'</sheetData></worksheet>'
+
+
+def _archivos_libro(hojas):
+    """Los XML fijos del libro, que dependen solo de la cantidad de hojas."""
+    tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+        f'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for n in range(1, hojas + 1)
+    )
+    relaciones = ''.join(
+        f'<Relationship Id="rId{n}" '
+        f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, hojas + 1)
+    )
+    nombres = ''.join(f'<sheet name="Hoja{n}" sheetId="{n}" r:id="rId{n}"/>' for n in range(1, hojas + 1))
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            f'{tipos}</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{nombres}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{relaciones}</Relationships>'
+        ),
+    }
+
+
+def partes_xlsx(encabezados, filas, filas_por_hoja=FILAS_POR_HOJA):
+    """
+    XLSX escrito por partes: las hojas van primero y los XML del libro al final,
+    cuando ya se sabe cuántas hojas hubo (el orden dentro del ZIP no importa).
+    """
+    salida = SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        hojas = 0
+        hoja = None
+        en_hoja = filas_por_hoja
+        try:
+            for fila in filas:
+                if en_hoja >= filas_por_hoja:
+                    if hoja:
+                        hoja.write(PIE_HOJA)
+                        hoja.close()
+                    hojas += 1
+                    hoja = libro.open(f'xl/worksheets/sheet{hojas}.xml', 'w', force_zip64=True)
+                    hoja.write(CABECERA_HOJA + _fila_xlsx(encabezados))
+                    en_hoja = 0
+                hoja.write(_fila_xlsx(fila))
+                en_hoja += 1
+                if en_hoja % TAMANIO_LOTE == 0:
+                    yield salida.retirar()
+
+            if hoja is None:
+                # Sin filas: una hoja con los encabezados
+                hojas = 1
+                hoja = libro.open('xl/worksheets/sheet1.xml', 'w')
+                hoja.write(CABECERA_HOJA + _fila_xlsx(encabezados))
+            hoja.write(PIE_HOJA)
+        finally:
+            if hoja:
+                hoja.close()
+
+        for nombre, contenido in _archivos_libro(hojas).items():
+            libro.writestr(nombre, contenido)
+    yield salida.retirar()
+
+
+def partes_exportacion(exportacion, formato, **filtros):
+    filas = exportacion.filas(**filtros)
+    if formato == 'xlsx':
+        return partes_xlsx(exportacion.encabezados, filas)
+    return partes_csv(exportacion.encabezados, filas)
+
+
+def vista_exportacion(request, exportaciones, tipo):
+    """Descarga la exportación `tipo` con los filtros de la query string."""
+    exportacion = exportaciones.get(tipo)
+    if exportacion is None:
+        raise Http404('Exportación inexistente')
+
+    form = FiltroExportacionForm(request.GET)
+    if not form.is_valid():
+        errores = [error for lista in form.errors.values() for error in lista]
+        return HttpResponseBadRequest(" ".join(errores))
+
+    formato = form.cleaned_data['formato']
+    response = StreamingHttpResponse(
+        partes_exportacion(exportacion, formato, **form.filtros()), content_type=FORMATOS[formato]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{exportacion.nombre}_{timezone.now():%Y%m%d%H%M%S}.{formato}"'
+    )
+    return response
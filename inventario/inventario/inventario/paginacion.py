@@ -0,0 +1,269 @@
+"""
+Paginación por cursor (keyset) para las vistas de listado.
+
+En lugar de OFFSET y un COUNT(*) por página, cada página se pide con un cursor
+que guarda los valores de orden de la última (o primera) fila mostrada y la
+consulta busca desde ahí con un WHERE sobre esos campos más el pk como
+desempate. Con un índice sobre el orden, la página 1000 cuesta lo mismo que
+la primera. A cambio no se sabe el total de páginas: solo se navega a la
+primera, la anterior, la siguiente y la última.
+
+Los totales de las tablas grandes son aproximados (ver `contar`): por encima de
+CONTEO_APROXIMADO_UMBRAL filas se muestra "~1.2M" en lugar de pagar un COUNT(*)
+exacto en cada página.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+SALT_CURSOR = 'inventario.paginacion.cursor'
+
+ADELANTE = 's'
+ATRAS = 'a'
+
+
+def formatear_conteo(total, aproximado=False):
+    """1234567 -> "~1.2M" si es aproximado; los exactos se muestran completos."""
+    if not aproximado:
+        return str(total)
+    for divisor, sufijo in ((1_000_000_000, 'B'), (1_000_000, 'M'), (1_000, 'k')):
+        if total >= divisor:
+            return f"~{total / divisor:.1f}".rstrip('0').rstrip('.') + sufijo
+    return f"~{total}"
+
+
+def _estimacion_postgresql(queryset):
+    """Filas que el planificador de PostgreSQL estima para la consulta, sin ejecutarla."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def contar(queryset):
+    """
+    Devuelve (total, es_aproximado) de un queryset.
+
+    Con menos de CONTEO_APROXIMADO_UMBRAL filas el total es siempre exacto.
+    Por encima, en PostgreSQL se usa la estimación del planificador y en el
+    resto de las bases el último COUNT exacto, guardado en el cache durante
+    CONTEO_APROXIMADO_TTL segundos (se recalcula al vencer).
+    """
+    umbral = getattr(settings, 'CONTEO_APROXIMADO_UMBRAL', 100_000)
+
+    if connections[queryset.db].vendor == 'postgresql':
+        estimado = _estimacion_postgresql(queryset)
+        if estimado >= umbral:
+            return estimado, True
+        return queryset.count(), False
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    clave = 'conteo:' + hashlib.sha256(f'{queryset.db}:{sql}:{params!r}'.encode('utf-8')).hexdigest()
+    guardado = cache.get(clave)
+    if guardado is not None:
+        return guardado, True
+
+    total = queryset.count()
+    if total >= umbral:
+        cache.set(clave, total, getattr(settings, 'CONTEO_APROXIMADO_TTL', 300))
+    return total, False
+
+
+class ConteoAproximadoMixin:
+    """`count` de un paginador calculado con `contar`."""
+    es_aproximado = False
+
+    @cached_property
+    def count(self):
+        total, self.es_aproximado = contar(self.object_list)
+        return total
+
+    @property
+    def conteo_legible(self):
+        return formatear_conteo(self.count, self.es_aproximado)
+
+
+class PaginadorAproximado(ConteoAproximadoMixin, Paginator):
+    """
+    Paginator de Django con total aproximado en tablas grandes.
+
+    Se usa también en el admin (`paginator` y show_full_result_count = False).
+    Si la estimación se pasa del total real las últimas páginas salen vacías.
+    Si se queda corta (estadísticas viejas en PostgreSQL, un COUNT guardado
+    de una tabla que creció) se aceptan las páginas que siguen a la última
+    estimada mientras tengan filas, y el total se corrige con lo que se vio.
+    """
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # super() ya verificó que sea un entero; las páginas menores a 1 siguen fallando
+            if not self.es_aproximado or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.es_aproximado:
+            return super().page(number)
+
+        desde = (number - 1) * self.per_page
+        # Una fila de más para saber si hay otra página después de esta
+        filas = list(self.object_list[desde:desde + self.per_page + 1])
+        if not filas and number > self.num_pages:
+            raise EmptyPage('That page contains no results')
+        if desde + len(filas) > self.count:
+            self.__dict__['count'] = desde + len(filas)
+            self.__dict__.pop('num_pages', None)
+        return self._get_page(filas[:self.per_page], number, self)
+
+
+def _serializar(valor):
+    return valor.isoformat() if hasattr(valor, 'isoformat') else valor
+
+
+class PaginaCursor:
+    """Página de resultados con los cursores para moverse a la anterior y a la siguiente."""
+
+    def __init__(self, object_list, cursor_anterior=None, cursor_siguiente=None):
+        self.object_list = object_list
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+class PaginadorCursor(ConteoAproximadoMixin):
+    """
+    Pagina un queryset buscando por los campos de `orden` (como en order_by).
+
+    Se agrega el pk como último criterio, con la dirección del último campo,
+    para que el orden sea total aunque haya valores repetidos. Los cursores van
+    firmados: no se pueden editar a mano para consultar otros campos.
+    """
+
+    def __init__(self, queryset, orden, por_pagina):
+        orden = list(orden)
+        desc_pk = orden[-1].startswith('-') if orden else False
+        self.campos = [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+        self.campos.append(('pk', desc_pk))
+        self.queryset = self.object_list = queryset
+        self.por_pagina = por_pagina
+
+    def cursor_ultima(self):
+        return signing.dumps([ATRAS, None], salt=SALT_CURSOR)
+
+    def _cursor(self, direccion, objeto):
+        valores = [_serializar(getattr(objeto, campo)) for campo, _ in self.campos]
+        return signing.dumps([direccion, valores], salt=SALT_CURSOR)
+
+    def _ordenado(self, invertido):
+        return self.queryset.order_by(*[
+            ('-' if desc != invertido else '') + campo for campo, desc in self.campos
+        ])
+
+    def _desde(self, valores, invertido):
+        """Filtro (a, b, pk) > (va, vb, vpk) respetando la dirección de cada campo."""
+        filtro = Q()
+        iguales = Q()
+        for (campo, desc), valor in zip(self.campos, valores):
+            operador = 'lt' if desc != invertido else 'gt'
+            filtro |= iguales & Q(**{f'{campo}__{operador}': valor})
+            iguales &= Q(**{campo: valor})
+        # Cota redundante sobre el primer campo: con ella la base busca en el índice
+        # desde el cursor en lugar de recorrerlo desde el principio (SQLite no lo
+        # deduce solo a partir del OR)
+        campo, desc = self.campos[0]
+        cota = Q(**{f"{campo}__{'lte' if desc != invertido else 'gte'}": valores[0]})
+        return cota & filtro
+
+    def pagina(self, cursor=None):
+        direccion, valores = ADELANTE, None
+        if cursor:
+            try:
+                direccion, valores = signing.loads(cursor, salt=SALT_CURSOR)
+            except (signing.BadSignature, TypeError, ValueError):
+                raise Http404('Página inválida')
+            if direccion not in (ADELANTE, ATRAS) or (valores is not None and len(valores) != len(self.campos)):
+                raise Http404('Página inválida')
+
+        invertido = direccion == ATRAS
+        queryset = self._ordenado(invertido)
+        if valores is not None:
+            queryset = queryset.filter(self._desde(valores, invertido))
+
+        # Se pide una fila de más para saber si hay otra página en esa dirección
+        filas = list(queryset[:self.por_pagina + 1])
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[:self.por_pagina]
+        if invertido:
+            filas.reverse()
+        if not filas:
+            return PaginaCursor(filas)
+
+        # Si se llegó con un cursor, del otro lado siempre hay al menos una página
+        hay_anterior = hay_mas if invertido else valores is not None
+        hay_siguiente = valores is not None if invertido else hay_mas
+        return PaginaCursor(
+            filas,
+            cursor_anterior=self._cursor(ATRAS, filas[0]) if hay_anterior else None,
+            cursor_siguiente=self._cursor(ADELANTE, filas[-1]) if hay_siguiente else None,
+        )
+
+
+class PaginacionCursorMixin:
+    """
+    Cambia la paginación de un ListView por la paginación por cursor.
+
+    La vista define `orden_cursor` con el mismo orden que usa su queryset. Si el
+    queryset viene con otro orden (por ejemplo ordenado por relevancia en una
+    búsqueda) se usa la paginación por número de página, con PaginadorAproximado.
+    En los dos casos el total (`paginator.count`) solo se calcula si la
+    plantilla lo muestra.
+    """
+    orden_cursor = None
+    parametro_cursor = 'cursor'
+    paginator_class = PaginadorAproximado
+
+    def paginate_queryset(self, queryset, page_size):
+        self.paginacion_cursor = tuple(queryset.query.order_by) == tuple(self.orden_cursor)
+        if not self.paginacion_cursor:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginador = PaginadorCursor(queryset, self.orden_cursor, page_size)
+        pagina = paginador.pagina(self.request.GET.get(self.parametro_cursor))
+        return paginador, pagina, pagina.object_list, pagina.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['paginacion_cursor'] = getattr(self, 'paginacion_cursor', False)
+        parametros = self.request.GET.copy()
+        parametros.pop('page', None)
+        parametros.pop(self.parametro_cursor, None)
+        context['parametros'] = parametros.urlencode()
+        return context
@@ -0,0 +1,99 @@
+"""
+PostgreSQL con conexiones reutilizadas en lugar de una nueva por pedido.
+
+Abrir una conexión (TCP, autenticación, arranque del backend) lleva varios
+milisegundos, más que muchas de las consultas de una venta. `base_postgresql`
+arma DATABASES['default'] a partir de las variables de entorno:
+
+- Con psycopg 3 y psycopg_pool instalados (requirements.txt) se usa el pool
+  de Django: cada proceso mantiene entre DATABASE_POOL_MIN y
+  DATABASE_POOL_MAX conexiones abiertas, un pedido espera hasta
+  DATABASE_POOL_TIMEOUT segundos por una libre y las conexiones se renuevan
+  a los DATABASE_POOL_MAX_LIFETIME segundos o tras DATABASE_POOL_MAX_IDLE
+  sin usarse.
+- Sin psycopg_pool (o con DATABASE_POOL=0) la conexión de cada thread queda
+  abierta DATABASE_CONN_MAX_AGE segundos (conexiones persistentes).
+
+En los dos casos se verifica la conexión antes de usarla (CONN_HEALTH_CHECKS):
+una conexión cortada por un reinicio de la base se reemplaza en lugar de
+devolver un error al usuario.
+"""
+import importlib.util
+import os
+
+
+def pool_disponible():
+    return importlib.util.find_spec('psycopg_pool') is not None
+
+
+def base_postgresql(entorno=None):
+    """Configuración de la base PostgreSQL según `entorno` (por defecto os.environ)."""
+    entorno = os.environ if entorno is None else entorno
+    base = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': entorno.get('DATABASE_NAME', 'inventario_db'),
+        'USER': entorno.get('DATABASE_USER', 'inventario_user'),
+        'PASSWORD': entorno.get('DATABASE_PASSWORD', 'inventario_pass'),
+        'HOST': entorno.get('DATABASE_HOST', 'db'),
+        'PORT': entorno.get('DATABASE_PORT', '5432'),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(entorno.get('DATABASE_CONNECT_TIMEOUT', 5)),
+        },
+    }
+    if entorno.get('DATABASE_POOL', '1') == '1' and pool_disponible():
+        # El pool no admite CONN_MAX_AGE: la conexión vuelve al pool al terminar el pedido
+        base['CONN_MAX_AGE'] = 0
+        base['OPTIONS']['pool'] = {
+            'min_size': int(entorno.get('DATABASE_POOL_MIN', 2)),
+            'max_size': int(entorno.get('DATABASE_POOL_MAX', 10)),
+            'timeout': float(entorno.get('DATABASE_POOL_TIMEOUT', 10)),
+            'max_lifetime': float(entorno.get('DATABASE_POOL_MAX_LIFETIME', 3600)),
+            'max_idle': float(entorno.get('DATABASE_POOL_MAX_IDLE', 600)),
+        }
+    else:
+        base['CONN_MAX_AGE'] = int(entorno.get('DATABASE_CONN_MAX_AGE', 60))
+    return base
+
+
+def metricas_conexiones(alias='default'):
+    """
+    Estado de las conexiones de este proceso a la base `alias`.
+
+    Con pool: conexiones abiertas, en uso, libres y pedidos esperando una, más
+    los contadores acumulados (conexiones creadas, perdidas, esperas que
+    vencieron). Sin pool solo se informa la configuración.
+    """
+    # Este módulo lo importa settings.py: django.db se importa recién acá
+    from django.db import connections
+
+    conexion = connections[alias]
+    pool = getattr(conexion, 'pool', None)
+    if pool is None:
+        return {
+            'pool': False,
+            'motor': conexion.vendor,
+            'conn_max_age': conexion.settings_dict.get('CONN_MAX_AGE', 0),
+        }
+
+    estadisticas = pool.get_stats()
+    # Django abre el pool con la primera conexión; antes pool_size ya vale el mínimo
+    abiertas = 0 if pool.closed else estadisticas['pool_size']
+    return {
+        'pool': True,
+        'motor': conexion.vendor,
+        'abierto': not pool.closed,
+        'minimo': estadisticas['pool_min'],
+        'maximo': estadisticas['pool_max'],
+        'abiertas': abiertas,
+        'en_uso': abiertas - estadisticas['pool_available'],
+        'libres': estadisticas['pool_available'],
+        'esperando': estadisticas['requests_waiting'],
+        # Los contadores que todavía valen 0 no aparecen en get_stats()
+        'creadas': estadisticas.get('connections_num', 0),
+        'errores_al_conectar': estadisticas.get('connections_errors', 0),
+        'perdidas': estadisticas.get('connections_lost', 0),
+        'pedidos': estadisticas.get('requests_num', 0),
+        'pedidos_que_esperaron': estadisticas.get('requests_queued', 0),
+        'esperas_vencidas': estadisticas.get('requests_errors', 0),
+    }
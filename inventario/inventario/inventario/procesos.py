@@ -0,0 +1,53 @@
+"""
+Pool de procesos compartido para el trabajo de CPU pesado (renderizar PDF en lote).
+
+Hay un solo pool por proceso del servidor: se crea la primera vez que se usa,
+con PROCESOS_POOL workers (por defecto uno por núcleo), y todos los pedidos
+lo comparten en lugar de lanzar cada uno los suyos. Los workers arrancan con
+forkserver (spawn donde no existe) y no con fork: el servidor tiene hilos
+(streams, tareas de fondo) y un fork copiaría sus locks en cualquier estado.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+_pool = None
+_bloqueo = threading.Lock()
+
+
+def inicializar_proceso():
+    """Prepara Django en los workers, que arrancan sin el estado del proceso padre."""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def procesos_pool():
+    return getattr(settings, 'PROCESOS_POOL', None) or os.cpu_count() or 1
+
+
+def pool_procesos():
+    """El pool del proceso, creándolo si hace falta."""
+    global _pool
+    with _bloqueo:
+        if _pool is None:
+            metodo = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(
+                max_workers=procesos_pool(),
+                mp_context=multiprocessing.get_context(metodo),
+                initializer=inicializar_proceso,
+            )
+        return _pool
+
+
+def descartar_pool(pool):
+    """Descarta un pool roto (murió un worker) para que el próximo uso cree otro."""
+    global _pool
+    with _bloqueo:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,85 @@
+"""
+Datos y verificaciones que comparten los tests de las apps.
+
+No es un módulo de tests (el runner no lo recorre): lo importan los tests.py.
+"""
+import csv
+import zipfile
+from decimal import Decimal
+from io import BytesIO
+from xml.etree import ElementTree
+
+from django.urls import reverse
+
+from clientes.models import Cliente
+from inventario.paginacion import PaginadorCursor
+from productos.models import Producto
+
+XMLNS_HOJA = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def crear_producto(sku, nombre=None, descripcion="Sin descripción", stock=10, stock_minimo=5, precio="100.00"):
+    return Producto.objects.create(
+        sku=sku,
+        nombre=nombre or f"Producto {sku}",
+        descripcion=descripcion,
+        precio=Decimal(precio),
+        stock=stock,
+        stock_minimo=stock_minimo,
+    )
+
+
+def crear_cliente(documento="30000000", nombre="Juan", apellido="Pérez", email=None):
+    return Cliente.objects.create(
+        nombre=nombre,
+        apellido=apellido,
+        numero_documento=documento,
+        email=email or f"{documento}@example.com",
+        telefono="123",
+        direccion="Calle 1",
+    )
+
+
+class IndicesTestMixin:
+    """Verifica en el plan de una consulta que no recorre tablas enteras ni ordena en memoria."""
+
+    def assertUsaIndices(self, queryset, *tablas, sin_ordenar=True):
+        plan = queryset.explain()
+        for tabla in tablas:
+            # SQLite: "SCAN tabla" sin índice; PostgreSQL: "Seq Scan on tabla"
+            self.assertNotRegex(plan, rf"\bSCAN {tabla}\b(?! USING)|Seq Scan on {tabla}\b", plan)
+        if sin_ordenar:
+            self.assertNotRegex(plan, r"TEMP B-TREE|\bSort\b", plan)
+
+    def assertPaginaPorCursorUsaIndice(self, queryset, orden, objeto):
+        paginador = PaginadorCursor(queryset, orden, 10)
+        valores = [getattr(objeto, campo) for campo, _ in paginador.campos]
+        consulta = paginador._ordenado(False).filter(paginador._desde(valores, False))[:11]
+        tabla = queryset.model._meta.db_table
+        self.assertUsaIndices(consulta, tabla)
+        # Busca desde el cursor, no recorre el índice desde la primera página
+        self.assertRegex(consulta.explain(), rf"SEARCH {tabla}\b|Index (Only )?Scan.* on {tabla}\b")
+
+
+class ExportacionTestMixin:
+    """Descarga una exportación y lee sus filas (CSV o XLSX)."""
+
+    def descargar(self, app, tipo, **params):
+        response = self.client.get(reverse(f"{app}:exportar", args=[tipo]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def filas_csv(self, contenido):
+        return list(csv.reader(contenido.decode("utf-8-sig").splitlines()))
+
+    def filas_xlsx(self, contenido):
+        with zipfile.ZipFile(BytesIO(contenido)) as libro:
+            self.assertIn("xl/workbook.xml", libro.namelist())
+            hojas = sorted(n for n in libro.namelist() if n.startswith("xl/worksheets/"))
+            filas = []
+            for hoja in hojas:
+                raiz = ElementTree.fromstring(libro.read(hoja))
+                for fila in raiz.iter(f"{{{XMLNS_HOJA}}}row"):
+                    filas.append(["".join(celda.itertext()) for celda in fila])
+            return hojas, filas
@@ -0,0 +1,164 @@
+"""
+Réplicas de lectura para los listados, el dashboard y las exportaciones.
+
+Con una sola base, las consultas largas de los reportes compiten con los
+commits de las ventas. Las réplicas (DATABASE_REPLICAS en settings, alias
+replica_1, replica_2...) son copias de la primaria que mantiene la
+replicación de la base; Django nunca las migra ni escribe en ellas.
+
+Leer de una réplica es opcional, por vista: `en_replica` (funciones) y
+`LecturaEnReplicaMixin` (clases) marcan los pedidos GET/HEAD de las vistas
+que solo leen, y durante esos pedidos `RouterReplicas` manda a una réplica
+las lecturas de productos, ventas y clientes. El resto queda en la primaria:
+
+- las escrituras y los select_for_update (Django los trata como escrituras);
+- lo que se lee dentro de una transacción de la primaria;
+- los usuarios, las sesiones y lo demás fuera de APPS_EN_REPLICA, para que
+  un login o un cambio de permisos valgan en el pedido siguiente;
+- todo el pedido de quien escribió hace menos de REPLICA_RETRASO_MAXIMO
+  segundos: `EscrituraRecienteMiddleware` deja una cookie en cada POST (o
+  PUT, PATCH, DELETE) y así el usuario ve lo que acaba de guardar aunque la
+  réplica esté atrasada. Esos pedidos tampoco usan el cache de vistas
+  (inventario/cache_vistas.py), que puede tener algo calculado antes de la
+  escritura o en otra réplica.
+
+Otros usuarios pueden ver datos atrasados lo que tarde la replicación. Lo
+que se calcula en una réplica durante los REPLICA_RETRASO_MAXIMO segundos
+posteriores a una invalidación no se guarda en el cache de vistas.
+"""
+import copy
+import functools
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+APPS_EN_REPLICA = {'productos', 'ventas', 'clientes'}
+# Lectura de un pedido que tiene que ver sus propias escrituras
+PRIMARIA = 'default'
+COOKIE_ESCRITURA = 'escritura_reciente'
+METODOS_LECTURA = ('GET', 'HEAD')
+
+# Base que usan las lecturas del pedido en curso: una réplica, PRIMARIA o None
+# (la vista no lee de réplicas)
+_replica = ContextVar('replica', default=None)
+
+
+def bases_replica(primaria, destinos):
+    """
+    Entradas de DATABASES para las réplicas: copias de `primaria` que apuntan
+    a otro host (PostgreSQL) o a otro archivo (SQLite).
+    """
+    campo = 'NAME' if primaria['ENGINE'].endswith('sqlite3') else 'HOST'
+    bases = {}
+    for numero, destino in enumerate((d.strip() for d in destinos if d.strip()), start=1):
+        base = copy.deepcopy(primaria)
+        base[campo] = destino
+        # En los tests no hay replicación: la réplica es la base de prueba de la primaria
+        base['TEST'] = {'MIRROR': 'default'}
+        bases[f'replica_{numero}'] = base
+    return bases
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def elegir_replica(request):
+    """
+    Réplica para las lecturas de `request`; PRIMARIA si el usuario acaba de
+    escribir, o None si no hay réplicas o el pedido no es de lectura.
+    """
+    disponibles = replicas()
+    if not disponibles or request.method not in METODOS_LECTURA:
+        return None
+    if COOKIE_ESCRITURA in request.COOKIES:
+        return PRIMARIA
+    return random.choice(disponibles)
+
+
+def lectura_actual():
+    """Base que eligió `en_replica` para el pedido en curso (ver `elegir_replica`)."""
+    return _replica.get()
+
+
+def _iterar_en(alias, partes):
+    """Recorre `partes` leyendo de `alias`: el contenido de un streaming se genera después de la vista."""
+    iterador = iter(partes)
+    while True:
+        token = _replica.set(alias)
+        try:
+            parte = next(iterador)
+        except StopIteration:
+            return
+        finally:
+            _replica.reset(token)
+        yield parte
+
+
+def en_replica(vista):
+    """Decorador de vistas que solo leen: sus lecturas van a una réplica (ver `elegir_replica`)."""
+    @functools.wraps(vista)
+    def envuelta(request, *args, **kwargs):
+        alias = elegir_replica(request)
+        if alias is None:
+            return vista(request, *args, **kwargs)
+        token = _replica.set(alias)
+        try:
+            response = vista(request, *args, **kwargs)
+            # Las consultas que quedan para el template también tienen que ir a la réplica
+            if callable(getattr(response, 'render', None)):
+                response.render()
+        finally:
+            _replica.reset(token)
+        if response.streaming:
+            response.streaming_content = _iterar_en(alias, response.streaming_content)
+        return response
+    return envuelta
+
+
+class LecturaEnReplicaMixin:
+    """Para vistas de clase que solo leen; ver `en_replica`."""
+
+    def dispatch(self, request, *args, **kwargs):
+        return en_replica(super().dispatch)(request, *args, **kwargs)
+
+
+class RouterReplicas:
+    """Manda a la réplica del pedido las lecturas de APPS_EN_REPLICA; todo lo demás a la primaria."""
+
+    def db_for_read(self, model, **hints):
+        from django.db import connections
+
+        alias = _replica.get()
+        if alias is None or model._meta.app_label not in APPS_EN_REPLICA:
+            return None
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que la primaria
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in replicas()
+
+
+class EscrituraRecienteMiddleware:
+    """Marca al usuario que acaba de escribir para que lea de la primaria mientras la réplica se pone al día."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METODOS_LECTURA and request.method != 'OPTIONS' and replicas():
+            response.set_cookie(
+                COOKIE_ESCRITURA, '1', max_age=getattr(settings, 'REPLICA_RETRASO_MAXIMO', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Requerido por django-allauth
+    'inventario.replicas.EscrituraRecienteMiddleware',
 ]
 
 ROOT_URLCONF = 'inventario.urls'
@@ -87,16 +88,9 @@ import os
 
 # Usar PostgreSQL si DATABASE_HOST está definido (Docker), sino SQLite (desarrollo local)
 if os.environ.get('DATABASE_HOST'):
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.postgresql',
-            'NAME': os.environ.get('DATABASE_NAME', 'inventario_db'),
-            'USER': os.environ.get('DATABASE_USER', 'inventario_user'),
-            'PASSWORD': os.environ.get('DATABASE_PASSWORD', 'inventario_pass'),
-            'HOST': os.environ.get('DATABASE_HOST', 'db'),
-            'PORT': os.environ.get('DATABASE_PORT', '5432'),
-        }
-    }
+    # Conexiones reutilizadas (pool o persistentes) y verificadas; ver inventario/postgresql.py
+    from inventario.postgresql import base_postgresql
+    DATABASES = {'default': base_postgresql()}
 else:
     DATABASES = {
         'default': {
@@ -104,6 +98,28 @@ else:
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Perfil para varios workers (ver inventario/sqlite.py): WAL, synchronous=NORMAL,
+    # busy timeout, mmap y BEGIN IMMEDIATE. SQLITE_CONCURRENTE=0 vuelve a SQLite por defecto
+    if os.environ.get('SQLITE_CONCURRENTE', '1') == '1':
+        from inventario.sqlite import opciones_sqlite
+        DATABASES['default']['OPTIONS'] = opciones_sqlite(
+            timeout=float(os.environ.get('SQLITE_TIMEOUT', 20)),
+            mmap=int(os.environ.get('SQLITE_MMAP', 256 * 1024 * 1024)),
+        )
+
+# Réplicas de lectura (ver inventario/replicas.py) para los listados, el dashboard y
+# las exportaciones. PostgreSQL: DATABASE_REPLICA_HOSTS=host1,host2 (mismo puerto,
+# usuario y base que la primaria). SQLite: SQLITE_REPLICAS con las rutas de las copias.
+# REPLICA_RETRASO_MAXIMO: segundos que lee de la primaria quien acaba de escribir.
+from inventario.replicas import bases_replica
+_destinos_replica = os.environ.get(
+    'DATABASE_REPLICA_HOSTS' if os.environ.get('DATABASE_HOST') else 'SQLITE_REPLICAS', ''
+)
+DATABASES.update(bases_replica(DATABASES['default'], _destinos_replica.split(',')))
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['inventario.replicas.RouterReplicas']
+REPLICA_RETRASO_MAXIMO = int(os.environ.get('REPLICA_RETRASO_MAXIMO', 5))
 
 
 # Password validation
@@ -145,6 +161,89 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Los comprobantes tienen datos de los clientes: se guardan fuera de
+    # MEDIA_ROOT, donde el servidor web no los publica, y se descargan solo
+    # por la vista de la venta
+    'comprobantes': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {'location': os.environ.get('COMPROBANTES_DIR', BASE_DIR / 'privado')},
+    },
+}
+
+# Workers del pool de procesos que comparten los pedidos de cada proceso del
+# servidor (inventario/procesos.py; vacío: uno por núcleo)
+PROCESOS_POOL = int(os.environ.get('PROCESOS_POOL', 0)) or None
+
+# Comprobantes PDF de venta
+# Alias de STORAGES donde se guardan los PDF generados (por defecto privado/comprobantes/)
+COMPROBANTES_STORAGE = os.environ.get('COMPROBANTES_STORAGE', 'comprobantes')
+# Generar el PDF en segundo plano (un hilo por proceso, de a uno) apenas se confirma la venta
+COMPROBANTES_PDF_AL_CONFIRMAR = os.environ.get('COMPROBANTES_PDF_AL_CONFIRMAR', '') == '1'
+# Tope de PDF en vuelo al exportar comprobantes en lote: dos por cada uno de
+# estos procesos (vacío: uno por núcleo). Los workers que los renderizan son
+# los del pool compartido, cuyo tamaño fija PROCESOS_POOL
+COMPROBANTES_PROCESOS = int(os.environ.get('COMPROBANTES_PROCESOS', 0)) or None
+# Exportaciones de comprobantes en ZIP a la vez por proceso (las demás reciben 503)
+COMPROBANTES_EXPORTACION_CONCURRENCIA = int(os.environ.get('COMPROBANTES_EXPORTACION_CONCURRENCIA', 1))
+# Control de admisión por proceso: PDF generándose a la vez, pedidos en espera,
+# segundos que espera cada uno y Retry-After de la respuesta 503
+COMPROBANTES_PDF_CONCURRENCIA = int(os.environ.get('COMPROBANTES_PDF_CONCURRENCIA', 2))
+COMPROBANTES_PDF_COLA = int(os.environ.get('COMPROBANTES_PDF_COLA', 4))
+COMPROBANTES_PDF_ESPERA = float(os.environ.get('COMPROBANTES_PDF_ESPERA', 10))
+COMPROBANTES_PDF_REINTENTO = int(os.environ.get('COMPROBANTES_PDF_REINTENTO', 5))
+
+# Paginación: desde cuántas filas el total de un listado es aproximado ("~1.2M")
+# y cuántos segundos se reutiliza el último COUNT en las bases que no son PostgreSQL
+CONTEO_APROXIMADO_UMBRAL = int(os.environ.get('CONTEO_APROXIMADO_UMBRAL', 100000))
+CONTEO_APROXIMADO_TTL = int(os.environ.get('CONTEO_APROXIMADO_TTL', 300))
+
+# Avisos de stock bajo: segundos entre consultas de eventos nuevos y duración de
+# cada conexión SSE (el navegador se reconecta solo al terminar)
+STOCK_BAJO_SSE_INTERVALO = float(os.environ.get('STOCK_BAJO_SSE_INTERVALO', 2))
+STOCK_BAJO_SSE_DURACION = int(os.environ.get('STOCK_BAJO_SSE_DURACION', 300))
+# Conexiones SSE abiertas a la vez por proceso (cada una ocupa un worker) y
+# segundos que espera el navegador antes de reintentar si no hay lugar
+STOCK_BAJO_SSE_CONCURRENCIA = int(os.environ.get('STOCK_BAJO_SSE_CONCURRENCIA', 4))
+STOCK_BAJO_SSE_REINTENTO = int(os.environ.get('STOCK_BAJO_SSE_REINTENTO', 30))
+# Segundos que se reutiliza el conteo de stock bajo antes de volver a contar
+STOCK_BAJO_CONTEO_TTL = int(os.environ.get('STOCK_BAJO_CONTEO_TTL', 300))
+
+# Generar las variantes de las imágenes de producto en un hilo aparte (0: en el mismo pedido)
+PRODUCTOS_IMAGENES_EN_SEGUNDO_PLANO = os.environ.get('PRODUCTOS_IMAGENES_EN_SEGUNDO_PLANO', '1') == '1'
+
+# Tope de lotes en vuelo al importar productos: dos por cada uno de estos
+# procesos (vacío: uno por núcleo; con 1 se valida sin pool). Los workers que
+# validan las filas son los del pool compartido, cuyo tamaño fija PROCESOS_POOL
+IMPORTACION_PROCESOS = int(os.environ.get('IMPORTACION_PROCESOS', 0)) or None
+# Filas que se pueden importar desde la página (sin pool de procesos); los
+# archivos más grandes se importan con el comando importar_productos
+IMPORTACION_WEB_MAXIMO_FILAS = int(os.environ.get('IMPORTACION_WEB_MAXIMO_FILAS', 5000))
+
+# Cache: LocMemCache por defecto (uno por proceso). Con varios workers usar uno
+# compartido, por ejemplo CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# y CACHE_LOCATION=redis://127.0.0.1:6379 (o FileBasedCache con un directorio)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+if CACHE_BACKEND.rsplit('.', 1)[-1] in ('LocMemCache', 'FileBasedCache', 'DatabaseCache'):
+    # Las filas de los listados se cachean una por una: las 300 entradas por
+    # defecto de estos backends se llenan con un par de páginas
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRADAS', 20000))}
+
+# Cache de listados y dashboard (inventario/cache_vistas.py): segundos que una
+# entrada está vigente, cuánto se conserva para servirla vieja mientras se
+# recalcula y cuánto puede tardar el recálculo antes de que otro pedido lo intente
+VISTAS_CACHE_TTL = int(os.environ.get('VISTAS_CACHE_TTL', 60))
+VISTAS_CACHE_MAXIMO = int(os.environ.get('VISTAS_CACHE_MAXIMO', 86400))
+VISTAS_CACHE_RECALCULO = int(os.environ.get('VISTAS_CACHE_RECALCULO', 30))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,80 @@
+"""
+SQLite para varios workers (sucursales sin PostgreSQL).
+
+Con el journal por defecto (rollback) una escritura bloquea también a los que
+leen, y una transacción que empieza leyendo (DEFERRED) y después escribe
+falla con "database is locked" sin esperar si otra ya tomó la escritura: el
+busy timeout no sirve en ese caso porque esperar no la destrabaría. El
+perfil de `opciones_sqlite`, aplicado por Django al abrir cada conexión:
+
+- journal_mode=WAL: las lecturas no esperan a las escrituras ni al revés
+  (queda guardado en el archivo; aparecen los archivos -wal y -shm).
+- synchronous=NORMAL: en WAL no se pierde consistencia, solo las últimas
+  transacciones si se corta la luz, y cada commit no espera un fsync.
+- busy timeout: una escritura espera su turno en lugar de fallar.
+- mmap_size: las lecturas van directo a la memoria del archivo.
+- BEGIN IMMEDIATE en cada transaction.atomic: la transacción toma el
+  bloqueo de escritura al empezar y, si está tomado, espera con el busy
+  timeout; así no queda ningún caso que falle sin esperar.
+
+Las escrituras siguen siendo de a una (SQLite tiene un solo escritor), pero
+se encolan en lugar de fallar.
+
+`errores_triggers` es la base de los checks que verifican los triggers de
+las apps: SQLite los borra sin avisar cuando una migración recrea la tabla.
+"""
+from django.core import checks
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+}
+
+
+def opciones_sqlite(timeout=20, mmap=256 * 1024 * 1024):
+    """OPTIONS de DATABASES para SQLite: `timeout` en segundos y `mmap` en bytes."""
+    pragmas = {**PRAGMAS, 'mmap_size': mmap}
+    return {
+        'timeout': timeout,
+        'transaction_mode': 'IMMEDIATE',
+        'init_command': '; '.join(f'PRAGMA {nombre}={valor}' for nombre, valor in pragmas.items()),
+    }
+
+
+def triggers_faltantes(connection, triggers):
+    """Los nombres de `triggers` que no existen en la base SQLite de `connection`."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existentes = {fila[0] for fila in cursor.fetchall()}
+    return [trigger for trigger in triggers if trigger not in existentes]
+
+
+def errores_triggers(databases, esperados, id):
+    """
+    Errores de check por los triggers que faltan en las bases SQLite de `databases`.
+
+    `esperados` es {(app, migración): (tabla, [triggers])}: se exigen los
+    triggers de las migraciones aplicadas cuya `tabla` existe (las de búsqueda
+    no crean la tabla FTS en un SQLite sin trigram, y entonces tampoco los triggers).
+    """
+    errores = []
+    for alias in databases or []:
+        connection = connections[alias]
+        if connection.vendor != 'sqlite':
+            continue
+        aplicadas = MigrationRecorder(connection).applied_migrations()
+        tablas = connection.introspection.table_names()
+        faltantes = []
+        for migracion, (tabla, triggers) in esperados.items():
+            if migracion in aplicadas and tabla in tablas:
+                faltantes += triggers_faltantes(connection, triggers)
+        if faltantes:
+            errores.append(checks.Error(
+                f"Faltan triggers en la base '{alias}': {', '.join(faltantes)}",
+                hint='Una migración recreó la tabla y SQLite borró sus triggers: '
+                     'hay que volver a crearlos en una migración nueva.',
+                id=id,
+            ))
+    return errores
@@ -0,0 +1,54 @@
+"""
+Tareas en segundo plano dentro del proceso del servidor.
+
+Una `ColaTareas` tiene un solo hilo que ejecuta las tareas de a una, en orden,
+y una cola de como mucho `maximo` pendientes. Si la cola está llena la tarea
+se descarta con un aviso en el log: lo que se encola acá es trabajo que se
+adelanta (un comprobante, las variantes de una imagen) y se hace igual la
+primera vez que alguien lo pide.
+"""
+import logging
+import queue
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class ColaTareas:
+
+    def __init__(self, nombre, maximo=100):
+        self.nombre = nombre
+        self._cola = queue.Queue(maxsize=maximo)
+        self._hilo = None
+        self._bloqueo = threading.Lock()
+
+    def encolar(self, tarea, *args):
+        """Agrega `tarea(*args)` a la cola; devuelve False si estaba llena y se descartó."""
+        try:
+            self._cola.put_nowait((tarea, args))
+        except queue.Full:
+            logger.warning('Cola de tareas %s llena, se descarta %s%r', self.nombre, tarea.__name__, args)
+            return False
+        with self._bloqueo:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._trabajar, name=f'tareas-{self.nombre}', daemon=True)
+                self._hilo.start()
+        return True
+
+    def _trabajar(self):
+        while True:
+            tarea, args = self._cola.get()
+            try:
+                tarea(*args)
+            except Exception:
+                logger.exception('Falló la tarea %s%r de la cola %s', tarea.__name__, args, self.nombre)
+            finally:
+                # Las conexiones de este hilo no las cierra ningún fin de pedido
+                connections.close_all()
+                self._cola.task_done()
+
+    def esperar(self):
+        """Espera a que terminen las tareas encoladas (para los tests y los comandos)."""
+        self._cola.join()
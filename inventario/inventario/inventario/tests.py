@@ -0,0 +1,312 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.utils import ConnectionHandler
+from django.core.paginator import EmptyPage
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from productos.models import Producto
+from ventas.models import Venta
+from . import exportacion
+from .cache_vistas import clave_pedido
+from .paginacion import PaginadorAproximado, contar, formatear_conteo
+from .postgresql import base_postgresql, metricas_conexiones, pool_disponible
+from .pruebas import ExportacionTestMixin, crear_cliente, crear_producto
+from .replicas import COOKIE_ESCRITURA, RouterReplicas, bases_replica, en_replica
+
+
+class ConteoAproximadoTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        cliente = crear_cliente()
+        Venta.objects.bulk_create([
+            Venta(cliente=cliente, codigo_venta=f"V-{i:03d}", fecha=timezone.now()) for i in range(12)
+        ])
+
+    def test_formato(self):
+        self.assertEqual(formatear_conteo(1234567), "1234567")
+        self.assertEqual(formatear_conteo(1234567, True), "~1.2M")
+        self.assertEqual(formatear_conteo(2_000_000, True), "~2M")
+        self.assertEqual(formatear_conteo(15300, True), "~15.3k")
+        self.assertEqual(formatear_conteo(950, True), "~950")
+
+    @override_settings(CONTEO_APROXIMADO_UMBRAL=10)
+    def test_reutiliza_el_conteo_sobre_el_umbral(self):
+        self.assertEqual(contar(Venta.objects.all()), (12, False))
+        Venta.objects.filter(codigo_venta="V-000").delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(contar(Venta.objects.all()), (12, True))
+        # Cada filtro tiene su propio conteo
+        self.assertEqual(contar(Venta.objects.filter(codigo_venta__gte="V-005")), (7, False))
+
+    @override_settings(CONTEO_APROXIMADO_UMBRAL=10)
+    def test_estimacion_corta_no_pierde_paginas(self):
+        contar(Venta.objects.all())
+        # La tabla crece mientras sigue guardado el conteo de 12
+        cliente = crear_cliente("40000000")
+        Venta.objects.bulk_create([
+            Venta(cliente=cliente, codigo_venta=f"W-{i:03d}", fecha=timezone.now()) for i in range(15)
+        ])
+        paginador = PaginadorAproximado(Venta.objects.order_by("pk"), 10)
+        self.assertEqual(paginador.num_pages, 2)
+
+        segunda = paginador.page(2)
+        self.assertTrue(segunda.has_next())
+        tercera = paginador.page(3)
+        self.assertEqual(len(tercera), 7)
+        self.assertFalse(tercera.has_next())
+        self.assertEqual((paginador.count, paginador.num_pages), (27, 3))
+        with self.assertRaises(EmptyPage):
+            paginador.page(4)
+        with self.assertRaises(EmptyPage):
+            paginador.page(0)
+
+        self.client.force_login(get_user_model().objects.create_superuser("admin", password="clave"))
+        with mock.patch("ventas.admin.VentaAdmin.list_per_page", 10):
+            response = self.client.get(reverse("admin:ventas_venta_changelist"), {"p": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["cl"].result_list), 7)
+
+    @override_settings(CONTEO_APROXIMADO_UMBRAL=100)
+    def test_exacto_bajo_el_umbral(self):
+        self.assertEqual(contar(Venta.objects.all()), (12, False))
+        self.assertEqual(contar(Venta.objects.all()), (12, False))
+
+    @override_settings(CONTEO_APROXIMADO_UMBRAL=10)
+    def test_admin_sin_conteo_exacto(self):
+        self.client.force_login(get_user_model().objects.create_superuser("admin", password="clave"))
+        url = reverse("admin:ventas_venta_changelist")
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in consultas.captured_queries if "COUNT(" in q["sql"].upper()])
+
+
+class PartesExportacionTest(ExportacionTestMixin, TestCase):
+
+    def test_csv_sin_formulas(self):
+        filas = [["=HYPERLINK(\"http://x\")", Decimal("-5")], ["+54 11", "@SUMA(A1)"], ["\tx", "Mouse - USB"]]
+        contenido = "".join(exportacion.partes_csv(["Texto", "Otro"], filas)).encode("utf-8")
+        self.assertEqual(self.filas_csv(contenido)[1:], [
+            ["'=HYPERLINK(\"http://x\")", "-5"], ["'+54 11", "'@SUMA(A1)"], ["'\tx", "Mouse - USB"],
+        ])
+
+    def test_xlsx_sin_caracteres_de_control(self):
+        contenido = b"".join(exportacion.partes_xlsx(["Texto"], [["Mouse\x01 USB\x0b"], ["fin\tde\nlínea"]]))
+        _, filas = self.filas_xlsx(contenido)
+        self.assertEqual(filas[1:], [["Mouse USB"], ["fin\tde\nlínea"]])
+
+    def test_xlsx_reparte_en_hojas(self):
+        filas = ([i, f"fila <{i}>", Decimal("1.50")] for i in range(5))
+        contenido = b"".join(exportacion.partes_xlsx(["N", "Texto", "Importe"], filas, filas_por_hoja=2))
+        hojas, filas = self.filas_xlsx(contenido)
+        self.assertEqual(len(hojas), 3)
+        self.assertEqual(filas[1], ["0", "fila <0>", "1.50"])
+        self.assertEqual(len(filas), 5 + 3)
+
+
+class SqliteConcurrenteTest(TestCase):
+
+    def test_perfil_aplicado_al_conectar(self):
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class ConexionesPostgresqlTest(TestCase):
+    """El pool se prueba sin servidor (no se abre) salvo que POSTGRESQL_PRUEBAS_HOST apunte a uno."""
+
+    def metricas_con(self, entorno):
+        conexiones = ConnectionHandler({"default": base_postgresql(entorno)})
+        self.addCleanup(conexiones["default"].close_pool)
+        with mock.patch("django.db.connections", conexiones):
+            return metricas_conexiones(), conexiones["default"]
+
+    def test_persistentes_sin_pool(self):
+        base = base_postgresql({"DATABASE_HOST": "db", "DATABASE_POOL": "0", "DATABASE_CONN_MAX_AGE": "120"})
+        self.assertEqual(base["CONN_MAX_AGE"], 120)
+        self.assertTrue(base["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", base["OPTIONS"])
+
+    @unittest.skipUnless(pool_disponible(), "psycopg_pool no está instalado")
+    def test_pool_configurado_por_entorno(self):
+        metricas, conexion = self.metricas_con({"DATABASE_HOST": "db", "DATABASE_POOL_MAX": "20"})
+        self.assertEqual(conexion.settings_dict["CONN_MAX_AGE"], 0)
+        self.assertEqual(conexion.settings_dict["OPTIONS"]["pool"]["max_size"], 20)
+        self.assertIsNotNone(conexion.pool._check)
+        self.assertEqual(
+            {clave: metricas[clave] for clave in ("pool", "abierto", "minimo", "maximo", "en_uso", "creadas")},
+            {"pool": True, "abierto": False, "minimo": 2, "maximo": 20, "en_uso": 0, "creadas": 0},
+        )
+
+    @unittest.skipUnless(
+        pool_disponible() and os.environ.get("POSTGRESQL_PRUEBAS_HOST"), "sin servidor PostgreSQL de prueba"
+    )
+    def test_pool_reutiliza_conexiones(self):
+        entorno = {
+            "DATABASE_HOST": os.environ["POSTGRESQL_PRUEBAS_HOST"],
+            "DATABASE_PORT": os.environ.get("POSTGRESQL_PRUEBAS_PORT", "5432"),
+            "DATABASE_NAME": os.environ.get("POSTGRESQL_PRUEBAS_NAME", "postgres"),
+            "DATABASE_USER": os.environ.get("POSTGRESQL_PRUEBAS_USER", "postgres"),
+            "DATABASE_PASSWORD": os.environ.get("POSTGRESQL_PRUEBAS_PASSWORD", ""),
+            "DATABASE_POOL_MIN": "1",
+            "DATABASE_POOL_MAX": "2",
+        }
+        conexiones = ConnectionHandler({"default": base_postgresql(entorno)})
+        conexion = conexiones["default"]
+        self.addCleanup(conexion.close_pool)
+        for _ in range(5):
+            # Como un pedido: usa la conexión y la devuelve al pool al terminar
+            with conexion.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conexion.close()
+        conexion.pool.wait()
+        with mock.patch("django.db.connections", conexiones):
+            metricas = metricas_conexiones()
+        self.assertEqual(metricas["en_uso"], 0)
+        self.assertLessEqual(metricas["creadas"], 2)
+        self.assertGreaterEqual(metricas["pedidos"], 5)
+
+    def test_vista_metricas_solo_staff(self):
+        usuario = get_user_model().objects.create_user("cajero", password="clave")
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse("metricas_base_de_datos")).status_code, 302)
+        usuario.is_staff = True
+        usuario.save()
+        self.assertEqual(
+            self.client.get(reverse("metricas_base_de_datos")).json(),
+            {"pool": False, "motor": "sqlite", "conn_max_age": 0},
+        )
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1"], DATABASE_ROUTERS=["inventario.replicas.RouterReplicas"])
+class ReplicasLecturaTest(TransactionTestCase):
+    """Otro archivo SQLite hace de réplica: tiene un producto que la primaria no tiene."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.carpeta = tempfile.mkdtemp()
+        # La réplica se agrega después de que el runner preparó las bases de prueba.
+        # MIRROR: el test no la vacía al terminar (no tiene todas las tablas)
+        connections.settings["replica_1"] = {
+            **connections.settings["default"],
+            "NAME": os.path.join(cls.carpeta, "replica.sqlite3"),
+            "TEST": {"MIRROR": "default"},
+        }
+        cls.databases = cls.databases | {"replica_1"}
+        with connections["replica_1"].schema_editor() as editor:
+            editor.create_model(Producto)
+        Producto.objects.using("replica_1").create(
+            sku="REPLICA", nombre="Solo en la réplica", descripcion="-", precio=Decimal("1.00"), stock=1,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica_1"].close()
+        del connections["replica_1"]
+        del connections.settings["replica_1"]
+        shutil.rmtree(cls.carpeta, ignore_errors=True)
+        cls.databases = cls.databases - {"replica_1"}
+        super().tearDownClass()
+
+    def setUp(self):
+        crear_producto("PRIMARIA")
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+
+    def test_listado_y_exportacion_leen_de_la_replica(self):
+        listado = self.client.get(reverse("productos:producto_list"))
+        self.assertContains(listado, "Solo en la réplica")
+        self.assertNotContains(listado, "Producto PRIMARIA")
+        exportado = b"".join(
+            self.client.get(reverse("productos:exportar", args=["productos"]), {"formato": "csv"}).streaming_content
+        ).decode("utf-8-sig")
+        self.assertIn("REPLICA", exportado)
+        self.assertNotIn("PRIMARIA", exportado)
+
+    def test_quien_escribe_lee_de_la_primaria(self):
+        self.client.get(reverse("productos:producto_list"))
+        respuesta = self.client.post(reverse("productos:producto_create"), {
+            "sku": "NUEVO", "nombre": "Recién creado", "descripcion": "-", "precio": "5", "stock": "0",
+            "stock_minimo": "0",
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(respuesta.cookies[COOKIE_ESCRITURA]["max-age"], 5)
+        # El producto no llegó a la réplica, pero quien lo creó lo ve
+        self.assertFalse(Producto.objects.using("replica_1").filter(sku="NUEVO").exists())
+        self.assertContains(self.client.get(reverse("productos:producto_list")), "Recién creado")
+
+    def test_cache_de_listados_con_escrituras_concurrentes(self):
+        url = reverse("productos:producto_list")
+        otro = Client()
+        otro.force_login(get_user_model().objects.create_user("repositor", password="clave"))
+        self.client.get(url)
+        self.client.post(reverse("productos:producto_create"), {
+            "sku": "NUEVO", "nombre": "Recién creado", "descripcion": "-", "precio": "5", "stock": "0",
+            "stock_minimo": "0",
+        })
+
+        # Otro usuario recalcula enseguida desde la réplica atrasada: lo ve sin el producto
+        # nuevo, pero eso no queda en el cache
+        self.assertNotContains(otro.get(url), "Recién creado")
+        self.assertNotContains(otro.get(url), "Recién creado")
+        clave = clave_pedido(RequestFactory().get(url), "ProductoListView")
+        self.assertIsNone(cache.get(clave))
+
+        # Con la entrada vieja guardada y otro worker recalculándola, quien escribió
+        # no recibe la vieja: lee de la primaria sin pasar por el cache
+        cache.set(clave, ({}, 0, None))
+        cache.add(f"{clave}:recalculando", True)
+        with mock.patch("inventario.cache_vistas.cache.set") as guardar:
+            self.assertContains(self.client.get(url), "Recién creado")
+        self.assertFalse([c for c in guardar.call_args_list if c.args[0] == clave])
+
+        # Pasado REPLICA_RETRASO_MAXIMO lo leído de la réplica vuelve a guardarse
+        cache.delete_many([clave, f"{clave}:recalculando"])
+        with mock.patch("inventario.cache_vistas.time.time", return_value=time.time() + 6):
+            otro.get(url)
+        self.assertIsNotNone(cache.get(clave))
+
+    def test_escrituras_bloqueos_y_transacciones_en_la_primaria(self):
+        router = RouterReplicas()
+        pedido = mock.Mock(method="GET", COOKIES={})
+
+        @en_replica
+        def vista(request):
+            self.assertEqual(Producto.objects.all().db, "replica_1")
+            self.assertEqual(Producto.objects.select_for_update().db, "default")
+            self.assertIsNone(router.db_for_read(get_user_model()))
+            self.assertEqual(router.db_for_write(Producto), "default")
+            with transaction.atomic():
+                self.assertEqual(Producto.objects.all().db, "default")
+            return mock.Mock(streaming=False, render=None)
+
+        vista(pedido)
+        self.assertEqual(Producto.objects.all().db, "default")
+        self.assertFalse(router.allow_migrate("replica_1", "productos"))
+
+    def test_bases_replica(self):
+        sqlite = bases_replica({"ENGINE": "django.db.backends.sqlite3", "NAME": "db.sqlite3"}, ["/r1.sqlite3", " "])
+        self.assertEqual(list(sqlite), ["replica_1"])
+        self.assertEqual(sqlite["replica_1"]["NAME"], "/r1.sqlite3")
+        self.assertEqual(sqlite["replica_1"]["TEST"], {"MIRROR": "default"})
+        primaria = base_postgresql({"DATABASE_HOST": "db"})
+        postgres = bases_replica(primaria, ["r1", "r2"])
+        self.assertEqual([base["HOST"] for base in postgres.values()], ["r1", "r2"])
+        self.assertIsNot(postgres["replica_1"]["OPTIONS"], primaria["OPTIONS"])
@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from inventario.views import metricas_base_de_datos
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,6 +26,7 @@ urlpatterns = [
     path("productos/", include("productos.urls")),
     path("clientes/", include("clientes.urls")),
     path("ventas/", include("ventas.urls")),
+    path("metricas/base-de-datos/", metricas_base_de_datos, name="metricas_base_de_datos"),
 ]
 
 if settings.DEBUG:
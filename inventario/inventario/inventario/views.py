@@ -0,0 +1,10 @@
+from django.contrib.auth.decorators import user_passes_test
+from django.http import JsonResponse
+
+from inventario.postgresql import metricas_conexiones
+
+
+@user_passes_test(lambda user: user.is_staff)
+def metricas_base_de_datos(request):
+    """Conexiones a la base de este proceso (pool: en uso, esperando, creadas)."""
+    return JsonResponse(metricas_conexiones())
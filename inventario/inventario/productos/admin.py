@@ -1,9 +1,37 @@
 from django.contrib import admin
-from .models import Producto
+from inventario.paginacion import PaginadorAproximado
+from .models import Producto, MovimientoStock, ConteoInventario
+from .busqueda import buscar_productos
 
 # Register your models here.
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ['sku', 'nombre', 'precio', 'stock', 'necesita_reposicion']
     list_filter = ['stock']
-    search_fields = ['sku', 'nombre']
\ No newline at end of file
+    search_fields = ['sku', 'nombre']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return buscar_productos(queryset, search_term), False
+
+
+@admin.register(MovimientoStock)
+class MovimientoStockAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'producto', 'tipo', 'cantidad', 'motivo', 'usuario']
+    list_filter = ['tipo', 'fecha']
+    search_fields = ['producto__sku', 'producto__nombre', 'motivo']
+    list_select_related = ['producto']
+    raw_id_fields = ['producto']
+    date_hierarchy = 'fecha'
+    # Sin COUNT(*) exacto en cada página del listado
+    paginator = PaginadorAproximado
+    show_full_result_count = False
+
+
+@admin.register(ConteoInventario)
+class ConteoInventarioAdmin(admin.ModelAdmin):
+    list_display = ['id', 'descripcion', 'estado', 'usuario', 'fecha_inicio', 'fecha_confirmacion', 'productos_ajustados']
+    list_filter = ['estado']
+    # El estado cambia solo al confirmar desde la aplicación
+    readonly_fields = ['estado', 'fecha_confirmacion', 'productos_ajustados']
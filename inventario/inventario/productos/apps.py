@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'productos'
+
+    def ready(self):
+        from . import checks  # Registra el check de los triggers de SQLite
+        from . import signals  # Conecta los receivers del cache de vistas
@@ -0,0 +1,23 @@
+"""
+Búsqueda indexada de productos por SKU, nombre o descripción (ver inventario/busqueda.py).
+
+Si el texto coincide exactamente con un SKU (el caso del lector de códigos)
+ese producto va primero, seguido de los que contienen el texto.
+"""
+from django.db.models import Q
+
+from inventario.busqueda import BusquedaIndexada
+
+CAMPOS_BUSQUEDA = ['sku', 'nombre', 'descripcion']
+
+
+def _sku_exacto(texto):
+    # Los SKU se guardan en mayúsculas (ProductoForm.clean_sku) y no tienen espacios
+    if not any(caracter.isspace() for caracter in texto):
+        return Q(sku=texto.upper())
+    return None
+
+
+busqueda = BusquedaIndexada('productos_producto', CAMPOS_BUSQUEDA, orden=['nombre'], exacto=_sku_exacto)
+filtro_contiene = busqueda.filtro_contiene
+buscar_productos = busqueda.buscar
@@ -0,0 +1,25 @@
+"""
+La búsqueda indexada y los avisos de stock bajo dependen de triggers sobre
+productos_producto. Si una migración hace que Django recree la tabla en SQLite
+(un AlterField que no se resuelve con ALTER TABLE) los triggers se pierden sin
+error; este check lo detecta en `migrate`, en `check --database default` y
+antes de correr los tests.
+"""
+from django.core import checks
+
+from inventario.sqlite import errores_triggers
+
+TRIGGERS = {
+    ('productos', '0002_busqueda_indexada'): ('productos_producto_fts', [
+        'productos_producto_fts_ai', 'productos_producto_fts_ad', 'productos_producto_fts_au',
+    ]),
+    ('productos', '0004_eventos_stock_bajo'): ('productos_eventostockbajo', [
+        'productos_producto_stock_bajo_ai', 'productos_producto_stock_bajo_au_entra',
+        'productos_producto_stock_bajo_au_sale', 'productos_producto_stock_bajo_ad',
+    ]),
+}
+
+
+@checks.register(checks.Tags.database)
+def triggers_productos(app_configs, databases=None, **kwargs):
+    return errores_triggers(databases, TRIGGERS, id='productos.E001')
@@ -0,0 +1,124 @@
+"""
+Conteos de inventario: se cargan las cantidades contadas de muchos productos y
+se concilian contra el stock en bloque.
+
+- `registrar_conteo` agrega líneas a un conteo abierto (un bulk_create).
+- `diferencias_conteo` calcula en una sola consulta (GROUP BY con HAVING)
+  lo contado y la diferencia con el stock actual de cada producto.
+- `confirmar_conteo` aplica todas las diferencias en una transacción: bloquea
+  los productos contados, vuelve a calcular las diferencias con el stock ya
+  bloqueado (no con lo que se mostró en pantalla), pone el stock en lo contado
+  con un único UPDATE y crea los movimientos con un bulk_create.
+
+Los conteos confirmados no se pueden modificar.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from inventario.cache_vistas import invalidar
+
+from .lineas import ErrorLineas, leer_lineas, ids_por_sku
+from .models import Producto, MovimientoStock, ConteoInventario, LineaConteo
+
+
+def _conteo_abierto(conteo):
+    """Vuelve a leer el conteo bloqueándolo; falla si ya se confirmó."""
+    conteo = ConteoInventario.objects.select_for_update().get(pk=conteo.pk)
+    if not conteo.abierto:
+        raise ErrorLineas([(None, "El conteo ya fue confirmado")])
+    return conteo
+
+
+@transaction.atomic
+def registrar_conteo(conteo, texto, usuario='Sistema'):
+    """
+    Agrega al conteo las líneas "SKU cantidad" de `texto` y devuelve (productos, unidades).
+
+    Una línea con solo el SKU (un escaneo) cuenta una unidad. Si alguna línea
+    tiene errores lanza ErrorLineas y no se registra ninguna.
+    """
+    conteo = _conteo_abierto(conteo)
+    cantidades, lineas, errores = leer_lineas(texto, minimo=0, cantidad_por_defecto=1)
+    ids = ids_por_sku(lineas, errores)
+    if errores:
+        raise ErrorLineas(sorted(errores))
+    if not cantidades:
+        raise ErrorLineas([(None, "No hay líneas para registrar")])
+
+    ahora = timezone.now()
+    LineaConteo.objects.bulk_create([
+        LineaConteo(conteo=conteo, producto_id=ids[sku], cantidad=cantidad, usuario=usuario, fecha=ahora)
+        for sku, cantidad in cantidades.items()
+    ])
+    return len(cantidades), sum(cantidades.values())
+
+
+def diferencias_conteo(conteo):
+    """
+    Productos contados cuyo stock no coincide con lo contado.
+
+    Cada producto trae `contado` (la suma de sus líneas) y `diferencia`
+    (contado - stock); todo se resuelve en una consulta.
+    """
+    return (
+        Producto.objects.filter(lineas_conteo__conteo=conteo)
+        .annotate(contado=Sum('lineas_conteo__cantidad'))
+        .annotate(diferencia=F('contado') - F('stock'))
+        .exclude(diferencia=0)
+    )
+
+
+@transaction.atomic
+def confirmar_conteo(conteo, usuario='Sistema'):
+    """
+    Ajusta el stock de los productos contados a lo contado y devuelve la cantidad ajustada.
+
+    Lo primero es marcar el conteo como confirmado con un UPDATE condicional:
+    dos confirmaciones simultáneas no se aplican dos veces y en SQLite la
+    transacción toma el bloqueo de escritura antes de leer el stock. Los
+    productos se bloquean en orden de pk, como en descontar_stock, para que
+    una venta simultánea no deje el stock calculado sobre un valor viejo.
+    """
+    ahora = timezone.now()
+    confirmado = ConteoInventario.objects.filter(pk=conteo.pk, estado='abierto').update(
+        estado='confirmado', fecha_confirmacion=ahora
+    )
+    if not confirmado:
+        raise ErrorLineas([(None, "El conteo ya fue confirmado")])
+
+    contados = LineaConteo.objects.filter(conteo=conteo).values('producto')
+    list(Producto.objects.select_for_update().filter(pk__in=contados).order_by('pk').values_list('pk'))
+
+    ajustes = list(diferencias_conteo(conteo).order_by('pk').values_list('pk', 'diferencia'))
+    if ajustes:
+        contado = Subquery(
+            LineaConteo.objects.filter(conteo=conteo, producto=OuterRef('pk'))
+            .order_by()
+            .values('producto')
+            .annotate(total=Sum('cantidad'))
+            .values('total')
+        )
+        # Un solo UPDATE: stock = (SELECT SUM(cantidad) ...) en los productos con diferencia
+        Producto.objects.filter(pk__in=contados).exclude(stock=contado).update(
+            stock=contado, fecha_actualizacion=ahora
+        )
+
+        motivo = f"Conteo de inventario #{conteo.pk}"
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                producto_id=pk,
+                tipo='entrada' if diferencia > 0 else 'salida',
+                cantidad=abs(diferencia),
+                motivo=motivo,
+                fecha=ahora,
+                usuario=usuario,
+            )
+            for pk, diferencia in ajustes
+        ])
+        # update() y bulk_create no mandan signals
+        invalidar('productos')
+
+    ConteoInventario.objects.filter(pk=conteo.pk).update(productos_ajustados=len(ajustes))
+    conteo.refresh_from_db()
+    return len(ajustes)
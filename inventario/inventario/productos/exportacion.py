@@ -0,0 +1,37 @@
+"""Tablas de productos que se pueden exportar (ver inventario.exportacion)."""
+from inventario.exportacion import Exportacion
+
+from .models import Producto, MovimientoStock
+
+EXPORTACIONES = {
+    'productos': Exportacion(
+        'productos',
+        Producto.objects.order_by('pk'),
+        [
+            ('SKU', 'sku'),
+            ('Nombre', 'nombre'),
+            ('Descripción', 'descripcion'),
+            ('Precio', 'precio'),
+            ('Stock', 'stock'),
+            ('Stock mínimo', 'stock_minimo'),
+            ('Fecha de creación', 'fecha_creacion'),
+        ],
+        campo_fecha='fecha_creacion',
+        campo_producto='sku',
+    ),
+    'movimientos': Exportacion(
+        'movimientos',
+        MovimientoStock.objects.order_by('pk'),
+        [
+            ('Fecha', 'fecha'),
+            ('SKU', 'producto__sku'),
+            ('Producto', 'producto__nombre'),
+            ('Tipo', 'tipo'),
+            ('Cantidad', 'cantidad'),
+            ('Motivo', 'motivo'),
+            ('Usuario', 'usuario'),
+        ],
+        campo_fecha='fecha',
+        campo_producto='producto__sku',
+    ),
+}
@@ -2,7 +2,7 @@
 from django import forms
 from django.core.exceptions import ValidationError
 # Importamos los modelos para los formularios basados en modelos
-from .models import Producto, MovimientoStock
+from .models import Producto, MovimientoStock, ConteoInventario
 # Importamos las herramientas de Crispy Forms
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Submit, Reset, ButtonHolder, Field, Div, HTML
@@ -205,6 +205,130 @@ class AjusteStockForm(forms.Form):
             )
         )
 
+# -----------------------------------------------------------------------------
+# Formulario para la recepción de mercadería
+# -----------------------------------------------------------------------------
+class RecepcionMercaderiaForm(forms.Form):
+    """
+    Remito de recepción: una línea por producto con el SKU y la cantidad recibida.
+    Las líneas se validan contra la base al aplicarlo (ver productos/recepcion.py).
+    """
+    lineas = forms.CharField(
+        widget=forms.Textarea(attrs={'rows': 15, 'placeholder': 'MOU-001 20\nTEC-001 5'}),
+        label="Líneas del remito",
+        help_text="Una línea por producto: SKU y cantidad, separados por espacio, coma o punto y coma."
+    )
+    motivo = forms.CharField(
+        max_length=200,
+        required=False,
+        label="Motivo",
+        help_text="Por ejemplo, el número de remito del proveedor (opcional)."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = BaseFormHelper()
+        self.helper.layout = Layout(
+            Field('motivo'),
+            Field('lineas'),
+            ButtonHolder(
+                Submit('submit', 'Registrar recepción', css_class='btn btn-success'),
+                HTML('<a href="{% url "productos:producto_list" %}" class="btn btn-secondary">Cancelar</a>')
+            )
+        )
+
+
+# -----------------------------------------------------------------------------
+# Formularios para los conteos de inventario
+# -----------------------------------------------------------------------------
+class ConteoInventarioForm(forms.ModelForm):
+    """Abre un conteo de inventario."""
+    class Meta:
+        model = ConteoInventario
+        fields = ["descripcion"]
+        labels = {"descripcion": "Descripción (opcional)"}
+        help_texts = {"descripcion": "Por ejemplo, el depósito o el sector que se va a contar."}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = BaseFormHelper()
+        self.helper.layout = Layout(
+            Field("descripcion"),
+            ButtonHolder(
+                Submit("submit", "Abrir conteo", css_class="btn btn-success"),
+                HTML('<a href="{% url "productos:conteo_list" %}" class="btn btn-secondary">Cancelar</a>')
+            )
+        )
+
+
+class RegistrarConteoForm(forms.Form):
+    """Cantidades contadas: líneas "SKU cantidad" o solo el SKU por cada unidad escaneada."""
+    lineas = forms.CharField(
+        widget=forms.Textarea(attrs={"rows": 10, "autofocus": True, "placeholder": "MOU-001 12\nTEC-001"}),
+        label="Cantidades contadas",
+        help_text="Una línea por producto con el SKU y la cantidad, o solo el SKU por cada unidad "
+                  "(como lo manda un lector de códigos de barras). Lo contado se suma a lo ya registrado."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = BaseFormHelper()
+        self.helper.layout = Layout(
+            Field("lineas"),
+            ButtonHolder(
+                Submit("submit", "Registrar", css_class="btn btn-primary"),
+            )
+        )
+
+
+# -----------------------------------------------------------------------------
+# Formularios para la importación masiva de productos
+# -----------------------------------------------------------------------------
+class FilaImportacionForm(forms.Form):
+    """
+    Valida una fila del CSV de importación con las mismas reglas que ProductoForm.
+    No es un ModelForm: el SKU repetido no es un error, se actualiza el producto.
+    """
+    sku = forms.CharField(max_length=50)
+    nombre = forms.CharField(max_length=50)
+    descripcion = forms.CharField(max_length=200, required=False)
+    precio = forms.DecimalField(max_digits=10, decimal_places=2)
+    stock = forms.IntegerField(required=False)
+    stock_minimo = forms.IntegerField(required=False)
+
+    # Reutilizamos las validaciones de ProductoForm
+    clean_sku = ProductoForm.clean_sku
+    clean_precio = ProductoForm.clean_precio
+    clean_stock = ProductoForm.clean_stock
+    clean_stock_minimo = ProductoForm.clean_stock_minimo
+
+
+class ImportarProductosForm(forms.Form):
+    """Formulario para subir el CSV con el catálogo de productos."""
+    archivo = forms.FileField(
+        label="Archivo CSV",
+        help_text="Columnas: sku, nombre, descripcion, precio, stock, stock_minimo. "
+                  "Los SKU existentes se actualizan; el stock solo se carga en los productos nuevos."
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = BaseFormHelper()
+        self.helper.layout = Layout(
+            Field('archivo'),
+            ButtonHolder(
+                Submit('submit', 'Importar', css_class='btn btn-success'),
+                HTML('<a href="{% url "productos:producto_list" %}" class="btn btn-secondary">Cancelar</a>')
+            )
+        )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        if not archivo.name.lower().endswith('.csv'):
+            raise ValidationError("El archivo debe ser un CSV")
+        return archivo
+
+
 # -----------------------------------------------------------------------------
 # Helpers y formularios para filtros
 # -----------------------------------------------------------------------------
@@ -238,7 +362,7 @@ class FiltroProductosForm(forms.Form):
     buscar = forms.CharField(
         required=False,
         label="Buscar",
-        widget=forms.TextInput(attrs={'placeholder': 'Nombre, descripción...'})
+        widget=forms.TextInput(attrs={'placeholder': 'SKU, nombre, descripción...'})
     )
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,158 @@
+"""
+Variantes de las imágenes de producto para servir en listados y detalle.
+
+Al subir una imagen el original se guarda con el hash de su contenido como
+nombre (productos/<hash>.<ext>): si otra subida tiene el mismo contenido se
+reutiliza el archivo ya guardado en lugar de escribir una copia. Las
+variantes (varios anchos, en WebP y JPEG, para srcset) se generan fuera del
+pedido, en la cola de tareas del proceso (inventario/tareas.py) cuando la
+transacción se confirma, y solo cuando el archivo cambió: los demás save()
+del producto no tocan la imagen. Hasta que están listas las plantillas
+muestran el original.
+"""
+import hashlib
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from inventario.cache_vistas import invalidar
+from inventario.tareas import ColaTareas
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Anchos máximos de las variantes: miniaturas de los listados (2x de 50px),
+# detalle del producto y una grande para pantallas de alta densidad
+ANCHOS = [100, 400, 800]
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CARPETA_VARIANTES = 'productos/variantes'
+
+# Variantes que se generan al guardar un producto: un solo hilo, de a una imagen
+cola_imagenes = ColaTareas('imagenes')
+
+
+def huella_archivo(archivo):
+    """sha256 del contenido de un archivo (lo deja posicionado al principio)."""
+    huella = hashlib.sha256()
+    for bloque in archivo.chunks():
+        huella.update(bloque)
+    archivo.seek(0)
+    return huella.hexdigest()
+
+
+def nombre_variante(nombre, ancho, extension):
+    base = os.path.splitext(os.path.basename(nombre))[0]
+    return f'{CARPETA_VARIANTES}/{base}-{ancho}.{extension}'
+
+
+def _abrir(storage, nombre):
+    with storage.open(nombre, 'rb') as archivo:
+        imagen = Image.open(archivo)
+        imagen.load()
+    # Respeta la orientación de las fotos de celular
+    return ImageOps.exif_transpose(imagen)
+
+
+def _para_jpeg(imagen):
+    """JPEG no tiene transparencia: se pinta sobre fondo blanco."""
+    if imagen.mode != 'RGBA':
+        return imagen
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.getchannel('A'))
+    return fondo
+
+
+def generar_variantes(storage, nombre):
+    """
+    Genera las variantes de la imagen `nombre` y devuelve sus anchos.
+
+    Una imagen más angosta que un ancho no se agranda: esa variante queda con
+    el ancho original y los anchos repetidos se generan una sola vez.
+    """
+    original = _abrir(storage, nombre)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if original.has_transparency_data else 'RGB')
+
+    anchos = sorted({min(ancho, original.width) for ancho in ANCHOS})
+    # De la más grande a la más chica: cada una se reduce desde la anterior
+    imagen = original
+    for ancho in reversed(anchos):
+        if imagen.width > ancho:
+            alto = max(1, round(imagen.height * ancho / imagen.width))
+            imagen = imagen.resize((ancho, alto), Image.LANCZOS)
+        for extension, (formato, opciones) in FORMATOS.items():
+            salida = BytesIO()
+            (imagen if formato == 'WEBP' else _para_jpeg(imagen)).save(salida, formato, **opciones)
+            guardar_variante(storage, nombre_variante(nombre, ancho, extension), salida.getvalue())
+    return anchos
+
+
+def guardar_variante(storage, destino, contenido):
+    """
+    Guarda una variante sin que otro pedido la vea borrada o a medio escribir.
+
+    Las variantes de un mismo original son compartidas entre productos y dos
+    procesos pueden generarlas a la vez. En disco se escriben con otro nombre
+    y se renombran sobre el destino (os.replace es atómico); en los storages
+    sin rutas locales, si ya existe se deja la que está: sale del mismo
+    original, así que es igual.
+    """
+    try:
+        ruta = storage.path(destino)
+    except NotImplementedError:
+        if not storage.exists(destino):
+            guardado = storage.save(destino, ContentFile(contenido))
+            if guardado != destino:
+                # Otro proceso la guardó mientras se generaba esta
+                storage.delete(guardado)
+        return
+    temporal = storage.save(f'{destino}.tmp', ContentFile(contenido))
+    os.replace(storage.path(temporal), ruta)
+
+
+def procesar_imagen(nombre):
+    """
+    Deja listas las variantes de la imagen `nombre` en todos los productos que la usan.
+
+    Si otro producto ya tiene las variantes de ese mismo archivo se reutilizan.
+    Solo se actualizan los productos que siguen teniendo esa imagen, así un
+    proceso viejo no pisa una imagen cambiada mientras tanto.
+    """
+    from .models import Producto
+
+    storage = Producto._meta.get_field('imagen').storage
+    anchos = (
+        Producto.objects.filter(imagen=nombre, imagen_variantes__isnull=False)
+        .values_list('imagen_variantes', flat=True).first()
+    )
+    if not anchos:
+        anchos = generar_variantes(storage, nombre)
+    actualizados = Producto.objects.filter(imagen=nombre, imagen_variantes__isnull=True).update(
+        imagen_variantes=anchos, fecha_actualizacion=timezone.now()
+    )
+    if actualizados:
+        # Los listados pasan a mostrar las variantes
+        invalidar('productos')
+    return anchos
+
+
+def _procesar(nombre):
+    try:
+        procesar_imagen(nombre)
+    except Exception:
+        logger.exception('No se pudieron generar las variantes de la imagen %s', nombre)
+
+
+def procesar_imagen_en_segundo_plano(nombre):
+    """Encola la generación de las variantes en la cola de imágenes del proceso."""
+    if not getattr(settings, 'PRODUCTOS_IMAGENES_EN_SEGUNDO_PLANO', True):
+        procesar_imagen(nombre)
+        return
+    cola_imagenes.encolar(_procesar, nombre)
@@ -0,0 +1,246 @@
+"""
+Importación masiva de productos desde un CSV de proveedor.
+
+El archivo se lee por lotes de filas. Cada lote se valida con
+FilaImportacionForm (las mismas reglas que ProductoForm), opcionalmente en el
+pool de procesos compartido, y se guarda con un INSERT ... ON CONFLICT (sku) DO UPDATE en
+executemany: los productos nuevos se crean con su stock inicial y su
+MovimientoStock de entrada, y los existentes actualizan nombre, descripción,
+precio y stock mínimo sin tocar el stock (que solo cambia con movimientos).
+
+No se usa bulk_create(update_conflicts=True) porque armar el SQL de cada fila
+con el ORM cuesta varias veces más que ejecutarlo: con executemany la base
+recibe una sola sentencia preparada. Los triggers (búsqueda y stock bajo)
+corren igual que con el ORM.
+"""
+import csv
+import os
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from inventario.cache_vistas import invalidar
+from inventario.procesos import descartar_pool, pool_procesos
+
+from .forms import FilaImportacionForm
+from .models import Producto, MovimientoStock
+
+COLUMNAS = ['sku', 'nombre', 'descripcion', 'precio', 'stock', 'stock_minimo']
+COLUMNAS_OBLIGATORIAS = {'sku', 'nombre', 'precio'}
+CAMPOS_INSERTADOS = [
+    'sku', 'nombre', 'descripcion', 'precio', 'stock', 'stock_minimo', 'fecha_creacion', 'fecha_actualizacion',
+]
+CAMPOS_ACTUALIZADOS = ['nombre', 'descripcion', 'precio', 'stock_minimo', 'fecha_actualizacion']
+# Si estos no cambian la fila no se vuelve a escribir
+CAMPOS_COMPARADOS = ['nombre', 'descripcion', 'precio', 'stock_minimo']
+CAMPOS_MOVIMIENTO = ['producto', 'tipo', 'cantidad', 'motivo', 'fecha', 'usuario']
+STOCK_MINIMO_POR_DEFECTO = Producto._meta.get_field('stock_minimo').default
+MAXIMO_ERRORES = 100
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede importar (por ejemplo, faltan columnas)."""
+
+
+@dataclass
+class ResultadoImportacion:
+    creados: int = 0
+    actualizados: int = 0
+    sin_cambios: int = 0
+    filas_con_error: int = 0
+    # (número de línea, mensaje); se guardan como máximo MAXIMO_ERRORES
+    errores: list = field(default_factory=list)
+
+    @property
+    def procesados(self):
+        return self.creados + self.actualizados + self.sin_cambios
+
+
+def leer_lotes(archivo, tamanio_lote):
+    """Lee el CSV (`,` o `;`) y devuelve lotes de (número de línea, dict de la fila)."""
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+
+    lector = csv.reader(archivo, dialecto)
+    encabezados = [columna.strip().lower() for columna in next(lector, [])]
+    faltantes = COLUMNAS_OBLIGATORIAS - set(encabezados)
+    if faltantes:
+        raise ErrorImportacion(f"Faltan las columnas: {', '.join(sorted(faltantes))}")
+    indices = {columna: encabezados.index(columna) for columna in COLUMNAS if columna in encabezados}
+
+    lote = []
+    for linea, valores in enumerate(lector, start=2):
+        if not any(valor.strip() for valor in valores):
+            continue
+        lote.append((linea, {
+            columna: valores[indice].strip() if indice < len(valores) else ''
+            for columna, indice in indices.items()
+        }))
+        if len(lote) >= tamanio_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def validar_lote(lote):
+    """
+    Valida un lote de filas y devuelve (válidas, errores).
+
+    No usa la base, así se puede correr en otro proceso. Las válidas son
+    dicts con los valores ya convertidos; si un SKU se repite en el lote
+    queda la última fila.
+    """
+    validas = {}
+    errores = []
+    for linea, datos in lote:
+        form = FilaImportacionForm(data=datos)
+        if form.is_valid():
+            validas[form.cleaned_data['sku']] = form.cleaned_data
+        else:
+            mensajes = [f"{campo}: {' '.join(lista)}" for campo, lista in form.errors.items()]
+            errores.append((linea, "; ".join(mensajes)))
+    return list(validas.values()), errores
+
+
+def _lotes_validados(lotes, procesos):
+    """
+    Valida los lotes en orden; con más de un proceso, en el pool compartido
+    (inventario/procesos.py) con hasta dos lotes por proceso en vuelo.
+    """
+    if procesos <= 1:
+        for lote in lotes:
+            yield validar_lote(lote)
+        return
+
+    pool = pool_procesos()
+    pendientes = deque()
+    try:
+        for lote in lotes:
+            pendientes.append(pool.submit(validar_lote, lote))
+            while len(pendientes) > procesos * 2:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
+    except BrokenProcessPool:
+        descartar_pool(pool)
+        raise
+    finally:
+        # Si falla el guardado de un lote no se siguen validando los pendientes
+        for pendiente in pendientes:
+            pendiente.cancel()
+
+
+def _sql_upsert(connection):
+    """INSERT ... ON CONFLICT (sku) DO UPDATE de un producto, válido en SQLite y PostgreSQL."""
+    qn = connection.ops.quote_name
+    columnas = [Producto._meta.get_field(campo).column for campo in CAMPOS_INSERTADOS]
+    actualizadas = [Producto._meta.get_field(campo).column for campo in CAMPOS_ACTUALIZADOS]
+    return (
+        f"INSERT INTO {qn(Producto._meta.db_table)} ({', '.join(qn(c) for c in columnas)}) "
+        f"VALUES ({', '.join(['%s'] * len(columnas))}) "
+        f"ON CONFLICT ({qn(Producto._meta.get_field('sku').column)}) DO UPDATE SET "
+        + ', '.join(f"{qn(c)} = EXCLUDED.{qn(c)}" for c in actualizadas)
+    )
+
+
+def _sql_movimiento(connection):
+    qn = connection.ops.quote_name
+    columnas = [MovimientoStock._meta.get_field(campo).column for campo in CAMPOS_MOVIMIENTO]
+    return (
+        f"INSERT INTO {qn(MovimientoStock._meta.db_table)} ({', '.join(qn(c) for c in columnas)}) "
+        f"VALUES ({', '.join(['%s'] * len(columnas))})"
+    )
+
+
+@transaction.atomic
+def guardar_lote(filas, usuario):
+    """
+    Crea o actualiza los productos de un lote y registra el stock inicial de los nuevos.
+
+    Devuelve (creados, actualizados, sin cambios). Las filas iguales a lo que ya está en la
+    base no se escriben, así reimportar el mismo catálogo solo cuesta la lectura.
+    """
+    actuales = {
+        sku: resto for sku, *resto in Producto.objects.filter(sku__in=[fila['sku'] for fila in filas])
+        .values_list('sku', *CAMPOS_COMPARADOS).order_by()
+    }
+
+    connection = connections[Producto.objects.db]
+    adaptar_precio = connection.ops.adapt_decimalfield_value
+    ahora = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    valores = []
+    nuevos = []
+    actualizados = 0
+    for fila in filas:
+        stock_minimo = STOCK_MINIMO_POR_DEFECTO if fila['stock_minimo'] is None else fila['stock_minimo']
+        actual = actuales.get(fila['sku'])
+        if actual is None:
+            stock = fila['stock'] or 0
+            if stock > 0:
+                nuevos.append((fila['sku'], stock))
+        elif actual == [fila['nombre'], fila['descripcion'], fila['precio'], stock_minimo]:
+            continue
+        else:
+            # El stock de los existentes solo cambia con movimientos: no se actualiza
+            stock = 0
+            actualizados += 1
+        valores.append((
+            fila['sku'], fila['nombre'], fila['descripcion'], adaptar_precio(fila['precio'], 10, 2),
+            stock, stock_minimo, ahora, ahora,
+        ))
+
+    with connection.cursor() as cursor:
+        if valores:
+            cursor.executemany(_sql_upsert(connection), valores)
+        if nuevos:
+            ids = dict(
+                Producto.objects.filter(sku__in=[sku for sku, _ in nuevos]).values_list('sku', 'pk').order_by()
+            )
+            cursor.executemany(_sql_movimiento(connection), [
+                (ids[sku], 'entrada', stock, 'Stock inicial (importación)', ahora, usuario)
+                for sku, stock in nuevos
+            ])
+    if valores:
+        invalidar('productos')
+
+    return len(filas) - len(actuales), actualizados, len(actuales) - actualizados
+
+
+def importar_productos(archivo, usuario='Sistema', procesos=None, tamanio_lote=5000, maximo_filas=None):
+    """
+    Importa los productos de `archivo` (texto) y devuelve un ResultadoImportacion.
+
+    Cada lote se guarda en su propia transacción; las filas inválidas se
+    saltean y se informan con su número de línea. Con `maximo_filas` primero
+    se cuentan las filas y, si son más, no se importa nada.
+    """
+    procesos = procesos or getattr(settings, 'IMPORTACION_PROCESOS', None) or os.cpu_count() or 1
+    if maximo_filas is not None:
+        filas = sum(len(lote) for lote in leer_lotes(archivo, tamanio_lote))
+        if filas > maximo_filas:
+            raise ErrorImportacion(
+                f"El archivo tiene {filas} filas y desde aquí se pueden importar hasta {maximo_filas}; "
+                "para archivos más grandes use el comando importar_productos"
+            )
+        archivo.seek(0)
+
+    resultado = ResultadoImportacion()
+    for validas, errores in _lotes_validados(leer_lotes(archivo, tamanio_lote), procesos):
+        resultado.filas_con_error += len(errores)
+        resultado.errores.extend(errores[:MAXIMO_ERRORES - len(resultado.errores)])
+        if validas:
+            creados, actualizados, sin_cambios = guardar_lote(validas, usuario)
+            resultado.creados += creados
+            resultado.actualizados += actualizados
+            resultado.sin_cambios += sin_cambios
+    return resultado
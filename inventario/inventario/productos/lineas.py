@@ -0,0 +1,67 @@
+"""
+Listas de "SKU cantidad" pegadas de una planilla o cargadas con un lector de
+códigos de barras (remitos de recepción y conteos de inventario).
+"""
+import re
+
+from .models import Producto
+
+SEPARADORES = re.compile(r'[\s,;]+')
+
+
+class ErrorLineas(Exception):
+    """La lista tiene líneas con errores; `errores` es una lista de (línea, mensaje)."""
+
+    def __init__(self, errores):
+        super().__init__(f"{len(errores)} líneas con errores")
+        self.errores = errores
+
+    def mensajes(self):
+        return [f"Línea {linea}: {mensaje}" if linea else mensaje for linea, mensaje in self.errores]
+
+
+def leer_lineas(texto, minimo=1, cantidad_por_defecto=None):
+    """
+    Interpreta las líneas "SKU cantidad" (separadas por espacio, coma o punto y coma).
+
+    Devuelve ({sku: cantidad total}, {sku: números de línea}, errores). Un SKU
+    repetido suma sus cantidades; las líneas vacías y una primera línea de
+    encabezados (sku, cantidad) se ignoran. Con `cantidad_por_defecto` una
+    línea con solo el SKU (lo que manda un lector de códigos) vale esa cantidad.
+    """
+    cantidades = {}
+    lineas = {}
+    errores = []
+    for numero, linea in enumerate(texto.splitlines(), start=1):
+        partes = SEPARADORES.split(linea.strip())
+        if partes == ['']:
+            continue
+        if len(partes) == 1 and cantidad_por_defecto is not None:
+            partes.append(str(cantidad_por_defecto))
+        if len(partes) != 2:
+            errores.append((numero, "Formato inválido, se espera 'SKU cantidad'"))
+            continue
+        sku, cantidad = partes[0].upper(), partes[1]
+        if numero == 1 and cantidad.lower() == 'cantidad':
+            continue
+        try:
+            cantidad = int(cantidad)
+        except ValueError:
+            errores.append((numero, f"Cantidad inválida: {cantidad}"))
+            continue
+        if cantidad < minimo:
+            mensaje = "La cantidad debe ser mayor a cero" if minimo > 0 else "La cantidad no puede ser negativa"
+            errores.append((numero, mensaje))
+            continue
+        cantidades[sku] = cantidades.get(sku, 0) + cantidad
+        lineas.setdefault(sku, []).append(numero)
+    return cantidades, lineas, errores
+
+
+def ids_por_sku(lineas, errores):
+    """Devuelve {sku: pk} y agrega a `errores` las líneas con SKU inexistentes."""
+    ids = dict(Producto.objects.filter(sku__in=list(lineas)).values_list('sku', 'pk').order_by())
+    for sku, numeros in lineas.items():
+        if sku not in ids:
+            errores.extend((numero, f"No existe un producto con SKU {sku}") for numero in numeros)
+    return ids
@@ -0,0 +1,110 @@
+import time
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.template.loader import get_template
+from django.test import RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser
+from clientes.models import Cliente
+from productos.forms import FiltroProductosForm
+from productos.models import Producto
+from ventas.models import Venta
+
+LISTADOS = {
+    'productos': ('productos/producto_list.html', 'productos'),
+    'stock_bajo': ('productos/stock_bajo_list.html', 'productos'),
+    'ventas': ('ventas/venta_list.html', 'ventas'),
+}
+
+SIN_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+CON_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark-listados',
+    'OPTIONS': {'MAX_ENTRIES': 100_000},
+}}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el render de las plantillas de listado (productos, stock bajo, ventas) con y sin '
+        'el cache de las filas. Los productos y ventas de prueba se crean en una transacción '
+        'que se deshace al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=100, help='Filas de cada página')
+        parser.add_argument('--repeticiones', type=int, default=50, help='Renders por cada medición')
+
+    def handle(self, *args, **options):
+        filas, repeticiones = options['filas'], options['repeticiones']
+        if filas < 1 or repeticiones < 1:
+            raise CommandError('Las filas y las repeticiones deben ser mayores a 0')
+
+        self.stdout.write(
+            f"{'listado':>12} {'sin cache (ms)':>15} {'cacheadas (ms)':>15} {'1 fila nueva (ms)':>18}"
+        )
+        with transaction.atomic():
+            productos, ventas = self.crear_datos(filas)
+            objetos = {'productos': productos, 'stock_bajo': productos, 'ventas': ventas}
+            for nombre, (plantilla, variable) in LISTADOS.items():
+                sin_cache, cacheadas, una_nueva = self.medir(plantilla, variable, objetos[nombre], repeticiones)
+                self.stdout.write(f'{nombre:>12} {sin_cache:>15.2f} {cacheadas:>15.2f} {una_nueva:>18.2f}')
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark terminado, los datos de prueba se descartaron'))
+
+    def crear_datos(self, filas):
+        cliente = Cliente.objects.create(
+            nombre='Benchmark', apellido='Listados', numero_documento='BM-LISTADOS',
+            email='listados@benchmark.test', telefono='0', direccion='-',
+        )
+        Producto.objects.bulk_create([
+            Producto(
+                sku=f'BM-LST-{i:05d}', nombre=f'Producto {i}', descripcion='Benchmark',
+                precio=100 + i, stock=i % 7, stock_minimo=5,
+            )
+            for i in range(filas)
+        ])
+        productos = list(Producto.objects.filter(sku__startswith='BM-LST-').order_by('sku'))
+        Venta.objects.bulk_create([
+            Venta(codigo_venta=f'BM-LST-{i:05d}', cliente=cliente, total=100 + i) for i in range(filas)
+        ])
+        ventas = list(Venta.objects.filter(codigo_venta__startswith='BM-LST-').select_related('cliente'))
+        return productos, ventas
+
+    def medir(self, plantilla, variable, objetos, repeticiones):
+        """Promedio en ms de renderizar la página sin cache, con todas las filas cacheadas y con una fila cambiada."""
+        plantilla = get_template(plantilla)
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        contexto = {variable: objetos, 'filtro_form': FiltroProductosForm()}
+
+        def promedio(antes_de_cada=None):
+            total = 0
+            for _ in range(repeticiones):
+                if antes_de_cada:
+                    antes_de_cada()
+                inicio = time.perf_counter()
+                plantilla.render(contexto, request)
+                total += time.perf_counter() - inicio
+            return total * 1000 / repeticiones
+
+        with override_settings(CACHES=SIN_CACHE):
+            sin_cache = promedio()
+
+        with override_settings(CACHES=CON_CACHE):
+            caches['default'].clear()
+            plantilla.render(contexto, request)
+            cacheadas = promedio()
+
+            def cambiar_una():
+                # Lo que hace un save(): cambia la versión de una de las filas
+                objeto = objetos[0]
+                if isinstance(objeto, Producto):
+                    objeto.fecha_actualizacion += timedelta(microseconds=1)
+                else:
+                    objeto.total += 1
+            una_nueva = promedio(cambiar_una)
+        return sin_cache, cacheadas, una_nueva
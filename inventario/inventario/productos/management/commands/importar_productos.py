@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from productos.importacion import importar_productos, ErrorImportacion
+
+
+class Command(BaseCommand):
+    help = 'Importa o actualiza productos desde un CSV (sku, nombre, descripcion, precio, stock, stock_minimo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del CSV (UTF-8, separado por coma o punto y coma)')
+        parser.add_argument(
+            '--procesos', type=int,
+            help='Lotes en vuelo: dos por proceso indicado (por defecto IMPORTACION_PROCESOS o uno por '
+                 'CPU; con 1 se valida sin pool); los workers del pool los fija PROCESOS_POOL'
+        )
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por lote y por transacción')
+        parser.add_argument('--usuario', default='Sistema', help='Usuario de los movimientos de stock inicial')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor a 0')
+        if options['procesos'] is not None and options['procesos'] < 1:
+            raise CommandError('--procesos debe ser mayor a 0')
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resultado = importar_productos(
+                    archivo,
+                    usuario=options['usuario'],
+                    procesos=options['procesos'],
+                    tamanio_lote=options['lote'],
+                )
+        except OSError as error:
+            raise CommandError(f'No se pudo leer el archivo: {error}')
+        except (ErrorImportacion, UnicodeDecodeError) as error:
+            raise CommandError(str(error))
+        segundos = time.perf_counter() - inicio
+
+        for linea, mensaje in resultado.errores:
+            self.stderr.write(f'  línea {linea}: {mensaje}')
+        if resultado.filas_con_error > len(resultado.errores):
+            self.stderr.write(f'  ... y {resultado.filas_con_error - len(resultado.errores)} filas más con errores')
+
+        filas_por_segundo = resultado.procesados / segundos if segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {resultado.creados} productos creados, {resultado.actualizados} actualizados y '
+            f'{resultado.sin_cambios} sin cambios en {segundos:.1f} s ({filas_por_segundo:,.0f} filas/s)'
+        ))
+        if resultado.filas_con_error:
+            self.stdout.write(self.style.WARNING(f'{resultado.filas_con_error} filas con errores no se importaron'))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from productos.models import EventoStockBajo
+
+
+class Command(BaseCommand):
+    help = 'Borra los eventos de stock bajo viejos (los navegadores solo necesitan los recientes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=7, help='Se conservan los eventos de los últimos N días')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias debe ser mayor a 0')
+
+        limite = timezone.now() - timedelta(days=options['dias'])
+        borrados, _ = EventoStockBajo.objects.filter(fecha__lt=limite).delete()
+        self.stdout.write(self.style.SUCCESS(f'✓ {borrados} eventos de stock bajo borrados'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from productos.imagenes import procesar_imagen
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes (WebP y JPEG en varios anchos) de las imágenes de producto que no las tienen'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Vuelve a generar también las que ya tienen variantes')
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        if options['todas']:
+            productos.update(imagen_variantes=None)
+        nombres = productos.filter(imagen_variantes__isnull=True).values_list('imagen', flat=True).distinct().order_by()
+
+        procesadas = 0
+        for nombre in list(nombres):
+            try:
+                procesar_imagen(nombre)
+            except Exception as e:
+                self.stderr.write(f'  {nombre}: {e}')
+                continue
+            procesadas += 1
+        self.stdout.write(self.style.SUCCESS(f'✓ {procesadas} imágenes procesadas'))
@@ -0,0 +1,78 @@
+from django.db import migrations, OperationalError
+
+CAMPOS = ['sku', 'nombre', 'descripcion']
+
+# El trigger de UPDATE se limita a las columnas indexadas: los UPDATE de stock de
+# cada venta no reescriben el índice de texto.
+SQLITE = [
+    """CREATE VIRTUAL TABLE productos_producto_fts USING fts5(
+        sku, nombre, descripcion,
+        content='productos_producto', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER productos_producto_fts_ai AFTER INSERT ON productos_producto BEGIN
+        INSERT INTO productos_producto_fts(rowid, sku, nombre, descripcion)
+        VALUES (new.id, new.sku, new.nombre, new.descripcion);
+    END""",
+    """CREATE TRIGGER productos_producto_fts_ad AFTER DELETE ON productos_producto BEGIN
+        INSERT INTO productos_producto_fts(productos_producto_fts, rowid, sku, nombre, descripcion)
+        VALUES ('delete', old.id, old.sku, old.nombre, old.descripcion);
+    END""",
+    """CREATE TRIGGER productos_producto_fts_au AFTER UPDATE OF sku, nombre, descripcion ON productos_producto BEGIN
+        INSERT INTO productos_producto_fts(productos_producto_fts, rowid, sku, nombre, descripcion)
+        VALUES ('delete', old.id, old.sku, old.nombre, old.descripcion);
+        INSERT INTO productos_producto_fts(rowid, sku, nombre, descripcion)
+        VALUES (new.id, new.sku, new.nombre, new.descripcion);
+    END""",
+    "INSERT INTO productos_producto_fts(productos_producto_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSA = [
+    "DROP TRIGGER IF EXISTS productos_producto_fts_ai",
+    "DROP TRIGGER IF EXISTS productos_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS productos_producto_fts_au",
+    "DROP TABLE IF EXISTS productos_producto_fts",
+]
+
+POSTGRESQL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    f'CREATE INDEX IF NOT EXISTS productos_producto_{campo}_trgm '
+    f'ON productos_producto USING gin ((UPPER("{campo}"::text)) gin_trgm_ops)'
+    for campo in CAMPOS
+]
+
+POSTGRESQL_REVERSA = [f'DROP INDEX IF EXISTS productos_producto_{campo}_trgm' for campo in CAMPOS]
+
+
+def crear_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            for sql in SQLITE:
+                schema_editor.execute(sql)
+        except OperationalError:
+            # SQLite anterior a 3.34 no tiene el tokenizer trigram: se busca sin índice
+            for sql in SQLITE_REVERSA:
+                schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL:
+            schema_editor.execute(sql)
+
+
+def borrar_indices(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_REVERSA:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for sql in POSTGRESQL_REVERSA:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, borrar_indices),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_busqueda_indexada'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['producto', '-fecha'], name='movimiento_producto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lt', models.F('stock_minimo'))), fields=['stock'], name='producto_stock_bajo_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+COLUMNAS = 'producto_id, sku, nombre, stock, stock_minimo, tipo, fecha'
+AHORA_SQLITE = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _insert_sqlite(fila, tipo):
+    return (
+        f"INSERT INTO productos_eventostockbajo({COLUMNAS}) VALUES "
+        f"({fila}.id, {fila}.sku, {fila}.nombre, {fila}.stock, {fila}.stock_minimo, '{tipo}', {AHORA_SQLITE});"
+    )
+
+
+# Solo se registra cuando cambia si stock < stock_minimo: los UPDATE de stock
+# que no cruzan el mínimo no escriben nada
+SQLITE = [
+    f"""CREATE TRIGGER productos_producto_stock_bajo_ai AFTER INSERT ON productos_producto
+        WHEN new.stock < new.stock_minimo BEGIN {_insert_sqlite('new', 'entra')} END""",
+    f"""CREATE TRIGGER productos_producto_stock_bajo_au_entra
+        AFTER UPDATE OF stock, stock_minimo ON productos_producto
+        WHEN old.stock >= old.stock_minimo AND new.stock < new.stock_minimo
+        BEGIN {_insert_sqlite('new', 'entra')} END""",
+    f"""CREATE TRIGGER productos_producto_stock_bajo_au_sale
+        AFTER UPDATE OF stock, stock_minimo ON productos_producto
+        WHEN old.stock < old.stock_minimo AND new.stock >= new.stock_minimo
+        BEGIN {_insert_sqlite('new', 'sale')} END""",
+    f"""CREATE TRIGGER productos_producto_stock_bajo_ad AFTER DELETE ON productos_producto
+        WHEN old.stock < old.stock_minimo BEGIN {_insert_sqlite('old', 'sale')} END""",
+]
+
+SQLITE_REVERSA = [
+    "DROP TRIGGER IF EXISTS productos_producto_stock_bajo_ai",
+    "DROP TRIGGER IF EXISTS productos_producto_stock_bajo_au_entra",
+    "DROP TRIGGER IF EXISTS productos_producto_stock_bajo_au_sale",
+    "DROP TRIGGER IF EXISTS productos_producto_stock_bajo_ad",
+]
+
+POSTGRESQL = [
+    f"""CREATE OR REPLACE FUNCTION productos_evento_stock_bajo() RETURNS trigger AS $$
+    DECLARE
+        antes boolean := false;
+        despues boolean := false;
+        fila productos_producto%ROWTYPE;
+    BEGIN
+        IF TG_OP <> 'INSERT' THEN antes := OLD.stock < OLD.stock_minimo; END IF;
+        IF TG_OP <> 'DELETE' THEN despues := NEW.stock < NEW.stock_minimo; END IF;
+        IF antes = despues THEN RETURN NULL; END IF;
+        IF TG_OP = 'DELETE' THEN fila := OLD; ELSE fila := NEW; END IF;
+        INSERT INTO productos_eventostockbajo({COLUMNAS}) VALUES (
+            fila.id, fila.sku, fila.nombre, fila.stock, fila.stock_minimo,
+            CASE WHEN despues THEN 'entra' ELSE 'sale' END, now()
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER productos_producto_stock_bajo
+        AFTER INSERT OR DELETE OR UPDATE OF stock, stock_minimo ON productos_producto
+        FOR EACH ROW EXECUTE FUNCTION productos_evento_stock_bajo()""",
+]
+
+POSTGRESQL_REVERSA = [
+    "DROP TRIGGER IF EXISTS productos_producto_stock_bajo ON productos_producto",
+    "DROP FUNCTION IF EXISTS productos_evento_stock_bajo()",
+]
+
+
+def crear_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    sentencias = {'sqlite': SQLITE, 'postgresql': POSTGRESQL}.get(vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql, params=None)
+
+
+def borrar_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    sentencias = {'sqlite': SQLITE_REVERSA, 'postgresql': POSTGRESQL_REVERSA}.get(vendor, [])
+    for sql in sentencias:
+        schema_editor.execute(sql, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoStockBajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(max_length=50, verbose_name='SKU')),
+                ('nombre', models.CharField(max_length=50, verbose_name='Nombre')),
+                ('stock', models.IntegerField(verbose_name='Stock')),
+                ('stock_minimo', models.IntegerField(verbose_name='Stock mínimo')),
+                ('tipo', models.CharField(choices=[('entra', 'Entra en stock bajo'), ('sale', 'Sale de stock bajo')], max_length=10, verbose_name='Tipo')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('producto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Evento de Stock Bajo',
+                'verbose_name_plural': 'Eventos de Stock Bajo',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(crear_triggers, borrar_triggers),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_eventos_stock_bajo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descripcion', models.CharField(blank=True, max_length=200, verbose_name='Descripción')),
+                ('estado', models.CharField(choices=[('abierto', 'Abierto'), ('confirmado', 'Confirmado')], default='abierto', max_length=20, verbose_name='Estado')),
+                ('usuario', models.CharField(max_length=50, verbose_name='Usuario')),
+                ('fecha_inicio', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de inicio')),
+                ('fecha_confirmacion', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de confirmación')),
+                ('productos_ajustados', models.IntegerField(default=0, verbose_name='Productos ajustados')),
+            ],
+            options={
+                'verbose_name': 'Conteo de Inventario',
+                'verbose_name_plural': 'Conteos de Inventario',
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaConteo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField(verbose_name='Cantidad')),
+                ('usuario', models.CharField(max_length=50, verbose_name='Usuario')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha')),
+                ('conteo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='productos.conteoinventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas_conteo', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Línea de Conteo',
+                'verbose_name_plural': 'Líneas de Conteo',
+                'indexes': [models.Index(fields=['conteo', 'producto'], name='lineaconteo_conteo_prod_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_conteos_inventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Variantes de la imagen'),
+        ),
+    ]
@@ -1,9 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Case, When, Value
 import os
-import uuid
 from django.core.exceptions import ValidationError
-from PIL import Image
 from django.utils import timezone
+from .imagenes import huella_archivo, nombre_variante, procesar_imagen_en_segundo_plano
 
 def validate_image_size(image):
     filesize = image.file.size
@@ -12,10 +12,71 @@ def validate_image_size(image):
         raise ValidationError (f"El tamaño maximo permitido es de {megabyte_limit} MB")
     
 def get_image_path(instance, filename):
-    ext = filename.split('.')[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
+    # El nombre es el hash del contenido: la misma imagen subida dos veces es un solo archivo
+    ext = filename.split('.')[-1].lower()
+    filename = f"{huella_archivo(instance.imagen)}.{ext}"
     return os.path.join("productos", filename)
 
+class StockInsuficiente(ValidationError):
+    """Se lanza cuando un descuento de stock dejaría algún producto en negativo."""
+
+    def __init__(self, faltantes):
+        # faltantes: lista de tuplas (nombre, disponible, solicitado)
+        self.faltantes = faltantes
+        super().__init__([
+            f"Stock insuficiente para {nombre}. Disponible: {disponible}, Solicitado: {solicitado}"
+            for nombre, disponible, solicitado in faltantes
+        ])
+
+
+class ProductoQuerySet(models.QuerySet):
+
+    def stock_bajo(self):
+        """Productos con stock por debajo del mínimo (se resuelve con el índice parcial)."""
+        return self.filter(stock__lt=F("stock_minimo"))
+
+    def descontar_stock(self, cantidades):
+        """
+        Descuenta stock de varios productos en una sola operación atómica.
+
+        `cantidades` es un dict {producto_id: cantidad}. Primero se bloquean todas
+        las filas con un único SELECT ... FOR UPDATE ordenado por pk (dos ventas
+        concurrentes toman los bloqueos siempre en el mismo orden y no hay deadlock),
+        y luego un único UPDATE condicional resta las cantidades solo donde
+        stock >= cantidad. Si alguna fila no se actualiza se lanza StockInsuficiente
+        y no se descuenta nada.
+        """
+        cantidades = {pk: cantidad for pk, cantidad in cantidades.items() if cantidad}
+        if not cantidades:
+            return
+
+        descuento = Case(
+            *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in cantidades.items()],
+            default=Value(0),
+            output_field=models.IntegerField(),
+        )
+
+        with transaction.atomic(using=self.db):
+            bloqueados = list(
+                self.select_for_update()
+                .filter(pk__in=cantidades)
+                .order_by("pk")
+                .values_list("pk", "nombre", "stock")
+            )
+            actualizados = self.filter(pk__in=cantidades, stock__gte=descuento).update(
+                # update() no pasa por auto_now: las filas cacheadas de los listados dependen de la fecha
+                stock=F("stock") - descuento, fecha_actualizacion=timezone.now()
+            )
+            if actualizados != len(cantidades):
+                disponibles = {pk: (nombre, stock) for pk, nombre, stock in bloqueados}
+                faltantes = []
+                for pk in sorted(cantidades):
+                    nombre, stock = disponibles.get(pk, (f"producto #{pk}", 0))
+                    if stock < cantidades[pk]:
+                        faltantes.append((nombre, stock, cantidades[pk]))
+                raise StockInsuficiente(faltantes)
+
+
 class Producto(models.Model):
     """Model definition for Producto."""
 
@@ -33,33 +94,81 @@ class Producto(models.Model):
         null=True,
         help_text="Formatos permitidos: jpg, png, gif. Tamaño maximo: 5MB"
     )
+    # Anchos de las variantes ya generadas (ver productos/imagenes.py); nulo mientras no estén.
+    # Nulo y sin default para que en SQLite se agregue con ALTER TABLE sin recrear la tabla
+    # (recrearla borraría los triggers de búsqueda y de stock bajo; ver productos/checks.py)
+    imagen_variantes = models.JSONField("Variantes de la imagen", null=True, blank=True, editable=False)
     fecha_creacion = models.DateTimeField("Fecha de creacion", auto_now_add=True)
     fecha_actualizacion = models.DateTimeField("Fecha de creacion", auto_now=True)
 
-    
+    objects = ProductoQuerySet.as_manager()
+
     class Meta:
         """Meta definition for Producto."""
 
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['nombre']
+        indexes = [
+            # Listado paginado por cursor sobre (nombre, id)
+            models.Index(fields=['nombre', 'id'], name='producto_nombre_idx'),
+            # Parcial: solo entran los productos con stock bajo (StockBajoListView)
+            models.Index(
+                fields=['stock'],
+                condition=models.Q(stock__lt=F('stock_minimo')),
+                name='producto_stock_bajo_idx',
+            ),
+        ]
 
     def __str__(self):
         """Unicode representation of Producto."""
         return self.nombre
     
     def save(self, *args, **kwargs):
+        # Solo una imagen recién subida se procesa; el resto de los save() no la tocan
+        imagen_nueva = bool(self.imagen) and not self.imagen._committed
+        if imagen_nueva:
+            self._preparar_imagen()
+        elif not self.imagen:
+            self.imagen_variantes = None
         super().save(*args, **kwargs)
 
-        if self.imagen:
-            try:
-                img = Image.open(self.image.path)
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    img.thumbnail(output_size)
-                    img.save(self.imagen.path)
-            except Exception as e:
-                print(f"Error al procesar la imagen {e}")
+        if imagen_nueva and not self.imagen_variantes:
+            nombre = self.imagen.name
+            transaction.on_commit(lambda: procesar_imagen_en_segundo_plano(nombre))
+
+    def _preparar_imagen(self):
+        """Reutiliza el archivo (y sus variantes) si esa misma imagen ya se subió antes."""
+        self.imagen_variantes = None
+        nombre = get_image_path(self, self.imagen.name)
+        if self.imagen.storage.exists(nombre):
+            self.imagen.name = nombre
+            self.imagen._committed = True
+            self.imagen_variantes = (
+                Producto.objects.filter(imagen=nombre, imagen_variantes__isnull=False)
+                .values_list('imagen_variantes', flat=True).first()
+            )
+
+    def _srcset(self, extension):
+        return ", ".join(
+            f"{self.imagen.storage.url(nombre_variante(self.imagen.name, ancho, extension))} {ancho}w"
+            for ancho in self.imagen_variantes
+        )
+
+    @property
+    def imagen_srcset_webp(self):
+        return self._srcset('webp')
+
+    @property
+    def imagen_srcset_jpg(self):
+        return self._srcset('jpg')
+
+    @property
+    def imagen_chica_url(self):
+        """La variante más chica (para los listados) o el original si todavía no hay variantes."""
+        if not self.imagen_variantes:
+            return self.imagen.url
+        return self.imagen.storage.url(nombre_variante(self.imagen.name, self.imagen_variantes[0], 'jpg'))
 
     @property
     def necesita_reposicion(self):
@@ -87,7 +196,115 @@ class MovimientoStock(models.Model):
         verbose_name = 'Movimiento de Stock'
         verbose_name_plural = 'Movimientos de Stock'
         ordering = ["-fecha"]
+        indexes = [
+            # Últimos movimientos de un producto (ProductoDetailView)
+            models.Index(fields=['producto', '-fecha'], name='movimiento_producto_fecha_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of MovimientoStock."""
         return f"{self.producto.nombre} - {self.tipo}  - {self.cantidad}" 
+
+
+class EventoStockBajo(models.Model):
+    """
+    Entrada o salida de un producto del conjunto con stock bajo.
+
+    Las filas las escriben triggers de la base (migración 0004) cuando un
+    INSERT, UPDATE o DELETE cambia si stock < stock_minimo, así quedan
+    registrados también los UPDATE con F() de las ventas. Se guardan los datos
+    del producto en ese momento porque el producto puede haberse borrado.
+    """
+
+    TIPO_CHOICES = [
+        ("entra", "Entra en stock bajo"),
+        ("sale", "Sale de stock bajo"),
+    ]
+
+    producto = models.ForeignKey(
+        Producto, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    sku = models.CharField("SKU", max_length=50)
+    nombre = models.CharField("Nombre", max_length=50)
+    stock = models.IntegerField("Stock")
+    stock_minimo = models.IntegerField("Stock mínimo")
+    tipo = models.CharField("Tipo", max_length=10, choices=TIPO_CHOICES)
+    fecha = models.DateTimeField("Fecha", default=timezone.now)
+
+    class Meta:
+        """Meta definition for EventoStockBajo."""
+
+        verbose_name = 'Evento de Stock Bajo'
+        verbose_name_plural = 'Eventos de Stock Bajo'
+        ordering = ['id']
+
+    def __str__(self):
+        """Unicode representation of EventoStockBajo."""
+        return f"{self.nombre} - {self.get_tipo_display()}"
+
+
+class ConteoInventario(models.Model):
+    """
+    Sesión de conteo físico del inventario.
+
+    Mientras está abierta se cargan las cantidades contadas (LineaConteo); al
+    confirmarla el stock de cada producto contado pasa a ser lo contado y se
+    registran los movimientos por la diferencia (ver productos/conteo.py).
+    Los productos que no se contaron no se modifican.
+    """
+
+    ESTADO_CHOICES = [
+        ("abierto", "Abierto"),
+        ("confirmado", "Confirmado"),
+    ]
+
+    descripcion = models.CharField("Descripción", max_length=200, blank=True)
+    estado = models.CharField("Estado", max_length=20, choices=ESTADO_CHOICES, default="abierto")
+    usuario = models.CharField("Usuario", max_length=50)
+    fecha_inicio = models.DateTimeField("Fecha de inicio", default=timezone.now)
+    fecha_confirmacion = models.DateTimeField("Fecha de confirmación", blank=True, null=True)
+    productos_ajustados = models.IntegerField("Productos ajustados", default=0)
+
+    class Meta:
+        """Meta definition for ConteoInventario."""
+
+        verbose_name = 'Conteo de Inventario'
+        verbose_name_plural = 'Conteos de Inventario'
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        """Unicode representation of ConteoInventario."""
+        return f"Conteo #{self.pk} - {self.get_estado_display()}"
+
+    @property
+    def abierto(self):
+        return self.estado == "abierto"
+
+
+class LineaConteo(models.Model):
+    """
+    Cantidad contada de un producto en un conteo.
+
+    Un producto puede tener varias líneas (se contó en distintos lugares o se
+    escaneó varias veces): lo contado es la suma.
+    """
+
+    conteo = models.ForeignKey(ConteoInventario, on_delete=models.CASCADE, related_name='lineas')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='lineas_conteo')
+    cantidad = models.IntegerField("Cantidad")
+    usuario = models.CharField("Usuario", max_length=50)
+    fecha = models.DateTimeField("Fecha", default=timezone.now)
+
+    class Meta:
+        """Meta definition for LineaConteo."""
+
+        verbose_name = 'Línea de Conteo'
+        verbose_name_plural = 'Líneas de Conteo'
+        indexes = [
+            # Suma de lo contado por producto al calcular las diferencias
+            models.Index(fields=['conteo', 'producto'], name='lineaconteo_conteo_prod_idx'),
+        ]
+
+    def __str__(self):
+        """Unicode representation of LineaConteo."""
+        return f"{self.producto.nombre} - {self.cantidad}"
@@ -0,0 +1,74 @@
+"""
+Recepción de mercadería: un remito con muchas líneas "SKU cantidad" aplicado de una vez.
+
+Todo el remito va en una transacción: si alguna línea tiene un error no se
+aplica ninguna, así el remito se corrige y se vuelve a cargar entero. El
+stock se suma con un UPDATE por lote de productos, ya bloqueados, (stock = stock + CASE ...)
+y los movimientos se crean con un bulk_create, en lugar de una consulta por
+producto.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from inventario.cache_vistas import invalidar
+
+from .lineas import ErrorLineas, leer_lineas, ids_por_sku
+from .models import Producto, MovimientoStock
+
+# El CASE se evalúa por cada fila actualizada: con lotes acotados el UPDATE
+# no crece con el cuadrado de las líneas del remito
+LOTE_ACTUALIZACION = 500
+
+
+@transaction.atomic
+def aplicar_recepcion(texto, motivo='', usuario='Sistema'):
+    """
+    Suma al stock las cantidades del remito y registra un movimiento de entrada por producto.
+
+    Devuelve (productos, unidades). Si hay errores lanza ErrorLineas sin
+    modificar nada.
+    """
+    cantidades, lineas, errores = leer_lineas(texto)
+    ids = ids_por_sku(lineas, errores)
+    if errores:
+        raise ErrorLineas(sorted(errores))
+    if not cantidades:
+        raise ErrorLineas([(None, "El remito no tiene líneas")])
+
+    entradas = sorted((ids[sku], cantidad) for sku, cantidad in cantidades.items())
+    # Se bloquean primero, en orden de pk, como en descontar_stock y
+    # confirmar_conteo: el UPDATE bloquea las filas en el orden en que las
+    # recorre, y así dos remitos (o un remito y una venta) no se traban
+    list(
+        Producto.objects.select_for_update()
+        .filter(pk__in=[pk for pk, _ in entradas])
+        .order_by('pk')
+        .values_list('pk')
+    )
+    ahora = timezone.now()
+    for inicio in range(0, len(entradas), LOTE_ACTUALIZACION):
+        lote = entradas[inicio:inicio + LOTE_ACTUALIZACION]
+        Producto.objects.filter(pk__in=[pk for pk, _ in lote]).update(
+            stock=F('stock') + Case(
+                *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in lote],
+                output_field=IntegerField(),
+            ),
+            # update() no pasa por auto_now
+            fecha_actualizacion=ahora,
+        )
+
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            producto_id=pk,
+            tipo='entrada',
+            cantidad=cantidad,
+            motivo=motivo or 'Recepción de mercadería',
+            fecha=ahora,
+            usuario=usuario,
+        )
+        for pk, cantidad in entradas
+    ])
+    # update() y bulk_create no mandan signals
+    invalidar('productos')
+    return len(entradas), sum(cantidad for _, cantidad in entradas)
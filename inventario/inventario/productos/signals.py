@@ -0,0 +1,13 @@
+"""Invalidación del cache de los listados (inventario/cache_vistas.py) al cambiar productos."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventario.cache_vistas import invalidar
+
+from .models import Producto, MovimientoStock
+
+
+@receiver([post_save, post_delete], sender=Producto)
+@receiver([post_save, post_delete], sender=MovimientoStock)
+def invalidar_productos(sender, **kwargs):
+    invalidar('productos')
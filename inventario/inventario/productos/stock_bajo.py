@@ -0,0 +1,122 @@
+"""
+Conjunto de productos con stock bajo y avisos en vivo.
+
+El conjunto lo mantiene la base: el índice parcial producto_stock_bajo_idx
+contiene solo esos productos y los triggers de la migración 0004 registran en
+EventoStockBajo cada entrada y salida. Sobre eso:
+
+- `conteo_stock_bajo` devuelve la cantidad de productos con stock bajo desde
+  el cache y la actualiza sumando los eventos nuevos, sin volver a contar.
+- `flujo_eventos` arma el stream de Server-Sent Events que escucha la
+  página de stock bajo para actualizar el contador y avisar cuando un
+  producto entra o sale del conjunto. Cada stream ocupa un worker, así que
+  `limite_streams` acota cuántos hay abiertos a la vez en el proceso (la
+  vista lo usa con `StreamConTurno`).
+"""
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Max
+
+from inventario.admision import LimiteConcurrencia
+from .models import Producto, EventoStockBajo
+
+CLAVE_CONTEO = 'productos:stock_bajo:conteo'
+
+# Como máximo STOCK_BAJO_SSE_CONCURRENCIA streams abiertos por proceso, sin cola:
+# el que no entra recibe 503 y reintenta a los STOCK_BAJO_SSE_REINTENTO segundos
+limite_streams = LimiteConcurrencia('STOCK_BAJO_SSE', concurrencia=4)
+
+
+def conteo_stock_bajo():
+    """
+    Devuelve (cantidad de productos con stock bajo, id del último evento aplicado).
+
+    Si no hay nada en el cache se cuenta sobre el índice parcial; después solo
+    se aplican los eventos con id mayor al guardado. El valor vence a los
+    STOCK_BAJO_CONTEO_TTL segundos para corregir cualquier desfasaje entre el
+    conteo inicial y el último id leído.
+    """
+    guardado = cache.get(CLAVE_CONTEO)
+    if guardado is None:
+        ultimo = EventoStockBajo.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+        conteo = Producto.objects.stock_bajo().count()
+    else:
+        ultimo, conteo = guardado
+        nuevos = (
+            EventoStockBajo.objects.filter(id__gt=ultimo)
+            .values('tipo')
+            .annotate(cantidad=Count('id'), ultimo=Max('id'))
+            .order_by()
+        )
+        for fila in nuevos:
+            conteo += fila['cantidad'] if fila['tipo'] == 'entra' else -fila['cantidad']
+            ultimo = max(ultimo, fila['ultimo'])
+        if guardado == (ultimo, conteo):
+            return conteo, ultimo
+
+    cache.set(CLAVE_CONTEO, (ultimo, conteo), getattr(settings, 'STOCK_BAJO_CONTEO_TTL', 300))
+    return conteo, ultimo
+
+
+def mensaje_sse(evento, datos, id_evento=None):
+    lineas = []
+    if id_evento is not None:
+        lineas.append(f'id: {id_evento}')
+    lineas.append(f'event: {evento}')
+    lineas.append(f'data: {json.dumps(datos)}')
+    return '\n'.join(lineas) + '\n\n'
+
+
+def flujo_eventos(ultimo_id=None, intervalo=None, duracion=None):
+    """
+    Genera los mensajes SSE de stock bajo.
+
+    Primero manda el conteo actual y después, cada `intervalo` segundos, los
+    eventos con id mayor a `ultimo_id` (el Last-Event-ID del navegador; si no
+    viene, solo los nuevos). A los `duracion` segundos termina y el navegador
+    se reconecta solo, así un worker no queda tomado indefinidamente.
+    """
+    intervalo = getattr(settings, 'STOCK_BAJO_SSE_INTERVALO', 2) if intervalo is None else intervalo
+    duracion = getattr(settings, 'STOCK_BAJO_SSE_DURACION', 300) if duracion is None else duracion
+
+    conteo, ultimo_actual = conteo_stock_bajo()
+    if ultimo_id is None:
+        ultimo_id = ultimo_actual
+
+    yield 'retry: 3000\n\n'
+    yield mensaje_sse('conteo', {'conteo': conteo})
+
+    fin = time.monotonic() + duracion
+    ultimo_mensaje = time.monotonic()
+    while True:
+        eventos = list(EventoStockBajo.objects.filter(id__gt=ultimo_id).order_by('id')[:100])
+        if eventos:
+            conteo = conteo_stock_bajo()[0]
+            for evento in eventos:
+                yield mensaje_sse(evento.tipo, {
+                    'producto': evento.producto_id,
+                    'sku': evento.sku,
+                    'nombre': evento.nombre,
+                    'stock': evento.stock,
+                    'stock_minimo': evento.stock_minimo,
+                    'conteo': conteo,
+                }, id_evento=evento.id)
+            ultimo_id = eventos[-1].id
+            ultimo_mensaje = time.monotonic()
+        elif time.monotonic() - ultimo_mensaje >= 15:
+            # Comentario SSE para que los proxies no corten la conexión por inactividad
+            yield ': ping\n\n'
+            ultimo_mensaje = time.monotonic()
+
+        if time.monotonic() >= fin:
+            break
+        # Devolver la conexión mientras se espera: si no, cada stream abierto
+        # retiene una conexión de la base (o del pool) durante toda su duración
+        if not connection.in_atomic_block:
+            connection.close()
+        time.sleep(intervalo)
+
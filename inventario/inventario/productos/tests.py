@@ -1,3 +1,697 @@
-from django.test import TestCase
+import io
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from PIL import Image
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventario.cache_vistas import invalidar, obtener
+from inventario.pruebas import ExportacionTestMixin, IndicesTestMixin, crear_producto
+from .busqueda import buscar_productos, filtro_contiene
+from .checks import triggers_productos
+from . import imagenes
+from .imagenes import nombre_variante
+from .importacion import importar_productos, ErrorImportacion
+from .models import Producto, MovimientoStock, EventoStockBajo, ConteoInventario, StockInsuficiente
+from .conteo import registrar_conteo, diferencias_conteo, confirmar_conteo
+from .lineas import ErrorLineas
+from .recepcion import aplicar_recepcion
+from .stock_bajo import conteo_stock_bajo, limite_streams
+from .views import StockBajoListView
+
+
+class BusquedaProductosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.mouse = crear_producto('MOU-001', 'Mouse óptico', 'Mouse inalámbrico USB')
+        cls.mouse_pad = crear_producto('MOU-0010', 'Pad para mouse', 'Tela antideslizante', stock=2)
+        cls.teclado = crear_producto('TEC-001', 'Teclado mecánico', 'Switches azules, USB')
+
+    def buscar(self, texto, queryset=None):
+        return list(buscar_productos(queryset or Producto.objects.all(), texto))
+
+    def test_mismos_resultados_que_icontains(self):
+        for texto in ['mouse', 'usb', 'tec-', 'anti', 'az', 'xyz']:
+            esperados = set(Producto.objects.filter(filtro_contiene(texto)))
+            self.assertEqual(set(self.buscar(texto)), esperados, texto)
+
+    def test_sku_exacto(self):
+        # El SKU exacto va primero aunque otro SKU lo contenga, en la misma consulta
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buscar('mou-0010'), [self.mouse_pad])
+        self.assertEqual(self.buscar('mou-001'), [self.mouse, self.mouse_pad])
+        self.assertEqual(self.buscar('MOU-00'), [self.mouse, self.mouse_pad])
+        # Un SKU de menos de 3 caracteres no está en el índice de texto
+        corto = crear_producto('X1', 'Cable')
+        self.assertEqual(self.buscar('x1'), [corto])
+
+    def test_ordena_por_relevancia(self):
+        self.assertEqual(self.buscar('mouse')[0], self.mouse)
+
+    def test_indice_sigue_los_cambios(self):
+        self.teclado.nombre = 'Teclado gamer'
+        self.teclado.save()
+        self.assertEqual(self.buscar('gamer'), [self.teclado])
+        self.assertEqual(self.buscar('mecánico'), [])
+
+        # Los cambios de stock no tocan el índice y el producto se sigue encontrando
+        Producto.objects.filter(pk=self.teclado.pk).update(stock=0)
+        self.assertEqual(self.buscar('gamer'), [self.teclado])
+
+        self.teclado.delete()
+        self.assertEqual(self.buscar('gamer'), [])
+
+    def test_usa_el_indice_en_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        consulta = str(buscar_productos(Producto.objects.all(), 'mouse').query)
+        self.assertIn('productos_producto_fts', consulta)
+        self.assertNotIn('LIKE', consulta)
+
+
+class TriggersSqliteTest(TestCase):
+
+    def test_el_check_detecta_triggers_perdidos(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Solo aplica a SQLite')
+        self.assertEqual(triggers_productos(None, databases=['default']), [])
+
+        # Lo mismo que deja una migración que recrea productos_producto
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER productos_producto_stock_bajo_ai')
+            cursor.execute('DROP TRIGGER productos_producto_fts_au')
+        errores = triggers_productos(None, databases=['default'])
+        self.assertEqual([error.id for error in errores], ['productos.E001'])
+        self.assertIn('productos_producto_fts_au', errores[0].msg)
+        self.assertIn('productos_producto_stock_bajo_ai', errores[0].msg)
+
+
+class ProductoListViewTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vendedor', password='clave123')
+        cls.mouse = crear_producto('MOU-001', 'Mouse óptico', 'Mouse inalámbrico USB')
+        cls.mouse_pad = crear_producto('MOU-002', 'Pad para mouse', 'Tela', stock=2)
+        cls.teclado = crear_producto('TEC-001', 'Teclado', 'USB')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def listar(self, **params):
+        response = self.client.get(reverse('productos:producto_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_busqueda_y_filtro_de_stock_en_una_consulta(self):
+        with self.assertNumQueries(4):
+            # sesión, usuario, count del paginador y la página
+            response = self.listar(buscar='mouse', filtro='stock_bajo')
+        self.assertEqual(list(response.context['productos']), [self.mouse_pad])
+
+        response = self.listar(buscar='mouse', filtro='stock_ok')
+        self.assertEqual(list(response.context['productos']), [self.mouse])
+
+    def test_filtro_stock_bajo_anterior(self):
+        response = self.listar(stock_bajo='1')
+        self.assertEqual(list(response.context['productos']), [self.mouse_pad])
+
+    def test_paginacion_mantiene_los_filtros(self):
+        response = self.listar(buscar='usb', page='1')
+        self.assertEqual(response.context['parametros'], 'buscar=usb')
+
+
+class CacheListadosTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        self.mouse = crear_producto('MOU-001', 'Mouse', stock=2)
+        self.teclado = crear_producto('TEC-001', 'Teclado')
+
+    def test_listados_cacheados_hasta_un_cambio(self):
+        for url in (reverse('productos:producto_list'), reverse('productos:stock_bajo_list')):
+            self.client.get(url)
+            with self.assertNumQueries(2):  # sesión y usuario
+                response = self.client.get(url)
+            self.assertIn(self.mouse, response.context['productos'])
+
+        self.mouse.stock = 50
+        self.mouse.save()
+        response = self.client.get(reverse('productos:stock_bajo_list'))
+        self.assertEqual(list(response.context['productos']), [])
+
+        # Las operaciones en bloque no mandan signals e invalidan por su cuenta
+        aplicar_recepcion("TEC-001 5")
+        response = self.client.get(reverse('productos:producto_list'))
+        self.assertEqual([p.stock for p in response.context['productos']], [50, 15])
+
+    def test_cada_variante_tiene_su_entrada(self):
+        self.client.get(reverse('productos:producto_list'))
+        response = self.client.get(reverse('productos:producto_list'), {'filtro': 'stock_bajo'})
+        self.assertEqual(list(response.context['productos']), [self.mouse])
+
+    def test_vieja_mientras_otro_la_recalcula(self):
+        self.assertEqual(obtener('prueba', ['productos'], lambda: 1), 1)
+        invalidar('productos')
+        cache.add('prueba:recalculando', True)
+        self.assertEqual(obtener('prueba', ['productos'], lambda: 2), 1)
+        cache.delete('prueba:recalculando')
+        self.assertEqual(obtener('prueba', ['productos'], lambda: 2), 2)
+        self.assertEqual(obtener('prueba', ['productos'], lambda: 3), 2)
+
+    def test_filas_cacheadas_cambian_con_el_producto(self):
+        url = reverse('productos:producto_list')
+        self.assertContains(self.client.get(url), '<tr class="table-warning">', count=1)
+        # descontar_stock es un UPDATE en bloque: tiene que mover fecha_actualizacion
+        Producto.objects.descontar_stock({self.teclado.pk: 6})
+        invalidar('productos')
+        self.assertContains(self.client.get(url), '<tr class="table-warning">', count=2)
+
+    def test_benchmark_no_deja_datos(self):
+        salida = io.StringIO()
+        call_command('benchmark_listados', filas=5, repeticiones=2, stdout=salida)
+        self.assertIn('stock_bajo', salida.getvalue())
+        self.assertEqual(Producto.objects.count(), 2)
+
+
+class StockBajoTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.mouse = crear_producto('MOU-001', 'Mouse', stock=10, stock_minimo=5)
+        self.teclado = crear_producto('TEC-001', 'Teclado', stock=2, stock_minimo=5)
+
+    def eventos(self):
+        return list(EventoStockBajo.objects.values_list('sku', 'tipo', 'stock'))
+
+    def test_registra_entradas_y_salidas(self):
+        self.assertEqual(self.eventos(), [('TEC-001', 'entra', 2)])
+
+        # Los descuentos de las ventas (UPDATE con F) también se registran
+        Producto.objects.descontar_stock({self.mouse.pk: 6})
+        # Cambios que no cruzan el mínimo no generan eventos
+        Producto.objects.filter(pk=self.teclado.pk).update(stock=F('stock') + 1)
+        self.teclado.refresh_from_db()
+        self.teclado.stock_minimo = 3
+        self.teclado.save()
+        self.mouse.delete()
+
+        self.assertEqual(self.eventos(), [
+            ('TEC-001', 'entra', 2), ('MOU-001', 'entra', 4), ('TEC-001', 'sale', 3), ('MOU-001', 'sale', 4),
+        ])
+
+    def test_conteo_incremental(self):
+        self.assertEqual(conteo_stock_bajo()[0], 1)
+        Producto.objects.filter(pk=self.mouse.pk).update(stock=0)
+        crear_producto('PAD-001', 'Pad', stock=0, stock_minimo=1)
+        with self.assertNumQueries(1):
+            self.assertEqual(conteo_stock_bajo()[0], 3)
+        Producto.objects.filter(pk=self.teclado.pk).update(stock=50)
+        self.assertEqual(conteo_stock_bajo()[0], Producto.objects.stock_bajo().count())
+
+    @override_settings(STOCK_BAJO_SSE_DURACION=0)
+    def test_eventos_sse(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        Producto.objects.filter(pk=self.mouse.pk).update(stock=1)
+        primero = EventoStockBajo.objects.earliest('id')
+
+        response = self.client.get(reverse('productos:stock_bajo_eventos'), HTTP_LAST_EVENT_ID=str(primero.id))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = b''.join(response.streaming_content).decode()
+        self.assertIn('event: conteo\ndata: {"conteo": 2}', contenido)
+        self.assertIn('event: entra\ndata: {"producto": %d, "sku": "MOU-001"' % self.mouse.pk, contenido)
+        self.assertNotIn('TEC-001', contenido)
+
+        # Sin Last-Event-ID solo se mandan los eventos nuevos
+        response = self.client.get(reverse('productos:stock_bajo_eventos'))
+        self.assertNotIn('event: entra', b''.join(response.streaming_content).decode())
+
+        response = self.client.get(reverse('productos:stock_bajo_eventos'), HTTP_LAST_EVENT_ID='x')
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(STOCK_BAJO_SSE_DURACION=0, STOCK_BAJO_SSE_CONCURRENCIA=1, STOCK_BAJO_SSE_REINTENTO=20)
+    def test_eventos_sse_limita_los_streams_abiertos(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        url = reverse('productos:stock_bajo_eventos')
+        antes = limite_streams.metricas()
+
+        with limite_streams.turno():
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '20')
+        self.assertEqual(response.content, b'retry: 20000\n\n')
+
+        # El lugar se devuelve al terminar el stream
+        response = self.client.get(url)
+        self.assertEqual(limite_streams.metricas()['en_curso'], antes['en_curso'] + 1)
+        b''.join(response.streaming_content)
+        self.assertEqual(limite_streams.metricas()['en_curso'], antes['en_curso'])
+
+    def test_solo_la_pagina_de_stock_bajo_abre_el_stream(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        url = reverse('productos:stock_bajo_eventos')
+        self.assertNotContains(self.client.get(reverse('productos:producto_list')), url)
+        self.assertContains(self.client.get(reverse('productos:stock_bajo_list')), url)
+
+
+
+class ImportacionProductosTest(TestCase):
+
+    def setUp(self):
+        self.mouse = crear_producto('MOU-001', 'Mouse', stock=10, stock_minimo=5)
+
+    def importar(self, contenido, **kwargs):
+        kwargs.setdefault('procesos', 1)
+        return importar_productos(io.StringIO(contenido), **kwargs)
+
+    def test_crea_y_actualiza_por_sku(self):
+        resultado = self.importar(
+            "sku,nombre,descripcion,precio,stock,stock_minimo\n"
+            "mou-001,Mouse óptico,USB,150.50,99,3\n"
+            "TEC-001,Teclado,Mecánico,2000,7,\n"
+            "PAD-001,Pad,,300,,\n"
+        )
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.filas_con_error), (2, 1, 0))
+
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.nombre, 'Mouse óptico')
+        self.assertEqual(str(self.mouse.precio), '150.50')
+        self.assertEqual(self.mouse.stock_minimo, 3)
+        # El stock de los existentes solo cambia con movimientos
+        self.assertEqual(self.mouse.stock, 10)
+        self.assertFalse(self.mouse.movimientos.exists())
+
+        teclado = Producto.objects.get(sku='TEC-001')
+        self.assertEqual((teclado.stock, teclado.stock_minimo), (7, 5))
+        movimiento = MovimientoStock.objects.get(producto=teclado)
+        self.assertEqual((movimiento.tipo, movimiento.cantidad), ('entrada', 7))
+        self.assertFalse(MovimientoStock.objects.filter(producto__sku='PAD-001').exists())
+
+    def test_reimportar_sin_cambios(self):
+        contenido = "sku,nombre,descripcion,precio,stock\nMOU-001,Mouse,Sin descripción,100,3\nTEC-001,Teclado,,50.5,1\n"
+        self.importar(contenido)
+        actualizacion = Producto.objects.get(sku='TEC-001').fecha_actualizacion
+
+        resultado = self.importar(contenido)
+        self.assertEqual((resultado.creados, resultado.actualizados, resultado.sin_cambios), (0, 0, 2))
+        self.assertEqual(Producto.objects.get(sku='TEC-001').fecha_actualizacion, actualizacion)
+        self.assertEqual(MovimientoStock.objects.count(), 1)
+
+    def test_errores_por_linea(self):
+        resultado = self.importar(
+            "sku;nombre;precio;stock\n"
+            "A-1;Uno;10;1\n"
+            ";Sin SKU;10;1\n"
+            "A-2;Dos;-5;1\n"
+            "A-3;Tres;abc;-1\n"
+            "A-1;Uno repetido;12;1\n"
+        )
+        self.assertEqual((resultado.creados, resultado.filas_con_error), (1, 3))
+        self.assertEqual([linea for linea, _ in resultado.errores], [3, 4, 5])
+        self.assertIn('precio', resultado.errores[1][1])
+        # Con el SKU repetido en el archivo queda la última fila
+        self.assertEqual(Producto.objects.get(sku='A-1').nombre, 'Uno repetido')
+
+    def test_faltan_columnas(self):
+        with self.assertRaises(ErrorImportacion):
+            self.importar("sku,descripcion\nA-1,Uno\n")
+
+    def test_lotes_en_procesos(self):
+        filas = ''.join(f'P-{n},Producto {n},{n + 1},{n % 3}\n' for n in range(250))
+        resultado = self.importar('sku,nombre,precio,stock\n' + filas, procesos=2, tamanio_lote=40)
+        self.assertEqual(resultado.creados, 250)
+        self.assertEqual(Producto.objects.filter(sku__startswith='P-').count(), 250)
+        self.assertEqual(MovimientoStock.objects.count(), 166)
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8-sig', delete=False) as archivo:
+            archivo.write('sku,nombre,precio\nNUEVO-1,Nuevo,10\nMOU-001,Mouse,20\n')
+        self.addCleanup(os.remove, archivo.name)
+
+        salida = io.StringIO()
+        call_command('importar_productos', archivo.name, '--procesos', '1', stdout=salida)
+        self.assertIn('1 productos creados, 1 actualizados y 0 sin cambios', salida.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('importar_productos', archivo.name + '.no', stdout=io.StringIO())
+
+    def test_vista(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        archivo = SimpleUploadedFile('catalogo.csv', '\ufeffsku,nombre,precio\nTEC-001,Teclado,10\nX,,1\n'.encode())
+        response = self.client.post(reverse('productos:importar'), {'archivo': archivo}, follow=True)
+        self.assertRedirects(response, reverse('productos:producto_list'))
+        self.assertTrue(Producto.objects.filter(sku='TEC-001').exists())
+        mensajes = [str(m) for m in response.context['messages']]
+        self.assertIn('1 productos creados', mensajes[0])
+        self.assertIn('1 filas con errores', mensajes[1])
+
+        archivo = SimpleUploadedFile('catalogo.csv', b'sku,descripcion\nA,B\n')
+        response = self.client.post(reverse('productos:importar'), {'archivo': archivo})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Faltan las columnas')
+
+    @override_settings(IMPORTACION_WEB_MAXIMO_FILAS=2)
+    def test_vista_solo_archivos_chicos_y_sin_pool(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        url = reverse('productos:importar')
+        with mock.patch('productos.views.importar_productos', wraps=importar_productos) as importar:
+            archivo = SimpleUploadedFile('catalogo.csv', b'sku,nombre,precio\nA,Uno,1\nB,Dos,2\n')
+            self.assertRedirects(self.client.post(url, {'archivo': archivo}), reverse('productos:producto_list'))
+        self.assertEqual(importar.call_args.kwargs['procesos'], 1)
+
+        archivo = SimpleUploadedFile('catalogo.csv', b'sku,nombre,precio\nC,Tres,1\nD,Cuatro,2\nE,Cinco,3\n')
+        response = self.client.post(url, {'archivo': archivo})
+        self.assertContains(response, 'use el comando importar_productos')
+        self.assertFalse(Producto.objects.filter(sku__in=['C', 'D', 'E']).exists())
+
+
+class RecepcionMercaderiaTest(TestCase):
+
+    def setUp(self):
+        self.mouse = crear_producto('MOU-001', 'Mouse', stock=2, stock_minimo=5)
+        self.teclado = crear_producto('TEC-001', 'Teclado', stock=10)
+
+    def test_aplica_en_bloque(self):
+        productos = [crear_producto(f'P-{n:03d}', f'Producto {n}', stock=0) for n in range(200)]
+        lineas = "sku,cantidad\nmou-001 3\nTEC-001;4\n\nMOU-001, 7\n" + "".join(f"P-{n:03d} {n + 1}\n" for n in range(200))
+
+        # Savepoint, el SELECT de los SKU, el que bloquea, un UPDATE por lote y los
+        # INSERT de bulk_create (SQLite los parte en dos), sin importar la cantidad de líneas
+        with self.assertNumQueries(7):
+            self.assertEqual(aplicar_recepcion(lineas, 'Remito 0001-123', 'deposito'), (202, 10 + 4 + 20100))
+
+        self.mouse.refresh_from_db()
+        self.teclado.refresh_from_db()
+        self.assertEqual((self.mouse.stock, self.teclado.stock), (12, 14))
+        self.assertEqual(Producto.objects.get(pk=productos[-1].pk).stock, 200)
+        movimiento = MovimientoStock.objects.get(producto=self.mouse)
+        self.assertEqual((movimiento.tipo, movimiento.cantidad, movimiento.motivo), ('entrada', 10, 'Remito 0001-123'))
+        # Los triggers de stock bajo ven el UPDATE en bloque
+        self.assertTrue(EventoStockBajo.objects.filter(producto_id=self.mouse.pk, tipo='sale').exists())
+
+    def test_bloquea_los_productos_en_orden_antes_de_actualizar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            aplicar_recepcion("TEC-001 1\nMOU-001 1")
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        bloqueo = next(
+            i for i, s in enumerate(sql)
+            if re.match(r'SELECT .* FROM "productos_producto" WHERE "productos_producto"."id" IN .* ORDER BY', s)
+        )
+        actualizacion = next(i for i, s in enumerate(sql) if s.startswith('UPDATE "productos_producto"'))
+        self.assertLess(bloqueo, actualizacion)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', sql[bloqueo])
+
+    def test_errores_no_aplican_nada(self):
+        with self.assertRaises(ErrorLineas) as contexto:
+            aplicar_recepcion("MOU-001 5\nXXX-999 1\nTEC-001 0\nTEC-001 dos\nsolo-sku\nXXX-999 2\n")
+        self.assertEqual([linea for linea, _ in contexto.exception.errores], [2, 3, 4, 5, 6])
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 2)
+        self.assertFalse(MovimientoStock.objects.exists())
+
+    def test_vista(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        url = reverse('productos:recepcion')
+        response = self.client.post(url, {'lineas': 'MOU-001 5\nNOPE 1', 'motivo': ''})
+        self.assertContains(response, 'Línea 2: No existe un producto con SKU NOPE')
+
+        response = self.client.post(url, {'lineas': 'MOU-001 5\nTEC-001 1', 'motivo': ''}, follow=True)
+        self.assertRedirects(response, reverse('productos:producto_list'))
+        self.assertContains(response, 'Recepción registrada: 6 unidades de 2 productos')
+        self.assertEqual(MovimientoStock.objects.get(producto=self.mouse).usuario, 'vendedor')
+
+    def test_movimiento_busca_el_producto_una_vez(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        url = reverse('productos:movimiento_create', args=[self.mouse.pk])
+        # sesión, usuario, producto, UPDATE del producto e INSERT del movimiento
+        with self.assertNumQueries(5):
+            self.client.post(url, {'tipo': 'entrada', 'cantidad': 3, 'motivo': ''})
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 5)
+
+
+class ConteoInventarioTest(TestCase):
+
+    def setUp(self):
+        self.mouse = crear_producto('MOU-001', 'Mouse', stock=10)
+        self.teclado = crear_producto('TEC-001', 'Teclado', stock=4)
+        self.monitor = crear_producto('MON-001', 'Monitor', stock=7)
+        self.cable = crear_producto('CAB-001', 'Cable', stock=30)
+        self.conteo = ConteoInventario.objects.create(usuario='deposito')
+
+    def test_diferencias_y_confirmacion(self):
+        # Escaneos (una unidad por línea) y cantidades; lo contado se acumula
+        registrar_conteo(self.conteo, "MOU-001\nmou-001\nTEC-001 4\nMON-001 0")
+        registrar_conteo(self.conteo, "MOU-001 5\nCAB-001 30")
+
+        with self.assertNumQueries(1):
+            diferencias = {p.sku: (p.contado, p.diferencia) for p in diferencias_conteo(self.conteo)}
+        self.assertEqual(diferencias, {'MOU-001': (7, -3), 'MON-001': (0, -7)})
+
+        # Una venta entre el conteo y la confirmación: se ajusta contra el stock actual
+        Producto.objects.filter(pk=self.mouse.pk).update(stock=9)
+        self.assertEqual(confirmar_conteo(self.conteo, 'supervisor'), 2)
+
+        stocks = dict(Producto.objects.values_list('sku', 'stock'))
+        self.assertEqual(stocks, {'MOU-001': 7, 'TEC-001': 4, 'MON-001': 0, 'CAB-001': 30})
+        movimientos = {m.producto.sku: (m.tipo, m.cantidad) for m in MovimientoStock.objects.select_related('producto')}
+        self.assertEqual(movimientos, {'MOU-001': ('salida', 2), 'MON-001': ('salida', 7)})
+        self.assertEqual((self.conteo.estado, self.conteo.productos_ajustados), ('confirmado', 2))
+
+        with self.assertRaises(ErrorLineas):
+            confirmar_conteo(self.conteo)
+        with self.assertRaises(ErrorLineas):
+            registrar_conteo(self.conteo, "MOU-001 1")
+
+    def test_confirmacion_en_bloque(self):
+        productos = [crear_producto(f'P-{n:03d}', f'Producto {n}', stock=n) for n in range(300)]
+        registrar_conteo(self.conteo, "".join(f"P-{n:03d} {n + n % 2}\n" for n in range(300)))
+        # Las consultas no dependen de la cantidad de productos contados
+        with self.assertNumQueries(9):
+            self.assertEqual(confirmar_conteo(self.conteo), 150)
+        self.assertEqual(Producto.objects.get(pk=productos[-1].pk).stock, 300)
+        self.assertEqual(MovimientoStock.objects.filter(tipo='entrada').count(), 150)
+
+    def test_errores_no_registran_nada(self):
+        with self.assertRaises(ErrorLineas) as contexto:
+            registrar_conteo(self.conteo, "MOU-001 3\nNOPE\nTEC-001 -1")
+        self.assertEqual([linea for linea, _ in contexto.exception.errores], [2, 3])
+        self.assertFalse(self.conteo.lineas.exists())
+
+    def test_vistas(self):
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        response = self.client.post(reverse('productos:conteo_create'), {'descripcion': 'Depósito A'})
+        conteo = ConteoInventario.objects.get(descripcion='Depósito A')
+        url = reverse('productos:conteo_detail', args=[conteo.pk])
+        self.assertRedirects(response, url)
+
+        response = self.client.post(url, {'lineas': 'MOU-001 8\nXXX 1'})
+        self.assertContains(response, 'Línea 2: No existe un producto con SKU XXX')
+        self.assertContains(response, 'MOU-001 8')
+
+        response = self.client.post(url, {'lineas': 'MOU-001 8'}, follow=True)
+        self.assertContains(response, 'Registradas 8 unidades de 1 productos')
+        self.assertContains(response, '-2')
+
+        response = self.client.post(reverse('productos:conteo_confirmar', args=[conteo.pk]), follow=True)
+        self.assertContains(response, 'Conteo confirmado: 1 productos ajustados')
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 8)
+
+
+def imagen_png(ancho, alto, color=(200, 30, 30, 255)):
+    salida = io.BytesIO()
+    Image.new('RGBA', (ancho, alto), color).save(salida, 'PNG')
+    return SimpleUploadedFile('foto.png', salida.getvalue(), content_type='image/png')
+
+
+@override_settings(PRODUCTOS_IMAGENES_EN_SEGUNDO_PLANO=False)
+class ImagenesProductoTest(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.mouse = crear_producto('MOU-001', 'Mouse')
+
+    def subir(self, producto, imagen):
+        """Guarda el producto con `imagen` y devuelve cuántas veces se generaron variantes."""
+        producto.imagen = imagen
+        with mock.patch.object(imagenes, 'generar_variantes', wraps=imagenes.generar_variantes) as generar:
+            with self.captureOnCommitCallbacks(execute=True):
+                producto.save()
+        return generar.call_count
+
+    def test_variantes(self):
+        self.subir(self.mouse, imagen_png(1000, 500))
+        self.mouse.refresh_from_db()
+        self.assertRegex(self.mouse.imagen.name, r'^productos/[0-9a-f]{64}\.png$')
+        self.assertEqual(self.mouse.imagen_variantes, [100, 400, 800])
+        for ancho in (100, 400, 800):
+            for extension in ('webp', 'jpg'):
+                with default_storage.open(nombre_variante(self.mouse.imagen.name, ancho, extension)) as archivo:
+                    self.assertEqual(Image.open(archivo).size, (ancho, ancho // 2))
+        self.assertIn('-400.webp 400w', self.mouse.imagen_srcset_webp)
+        self.assertTrue(self.mouse.imagen_chica_url.endswith('-100.jpg'))
+
+        # Los demás save() no vuelven a procesar la imagen
+        self.mouse.stock = 3
+        self.assertEqual(self.subir(self.mouse, self.mouse.imagen), 0)
+
+    def test_imagen_chica_no_se_agranda(self):
+        self.subir(self.mouse, imagen_png(250, 250))
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.imagen_variantes, [100, 250])
+
+    def test_misma_imagen_se_reutiliza(self):
+        self.subir(self.mouse, imagen_png(500, 500))
+        self.mouse.refresh_from_db()
+        teclado = crear_producto('TEC-001', 'Teclado')
+        # Mismo contenido: el archivo y las variantes ya existen, no hay nada que procesar
+        self.assertEqual(self.subir(teclado, imagen_png(500, 500)), 0)
+        teclado.refresh_from_db()
+        self.assertEqual(teclado.imagen.name, self.mouse.imagen.name)
+        self.assertEqual(teclado.imagen_variantes, [100, 400, 500])
+        self.assertEqual(len(os.listdir(os.path.dirname(self.mouse.imagen.path))), 2)
+
+    def test_listado_usa_la_variante_chica(self):
+        self.subir(self.mouse, imagen_png(600, 600))
+        self.client.force_login(User.objects.create_user(username='vendedor', password='clave123'))
+        response = self.client.get(reverse('productos:producto_list'))
+        self.assertContains(response, '-100.jpg')
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_comando_procesa_las_pendientes(self):
+        default_storage.save('productos/vieja.png', imagen_png(300, 150))
+        Producto.objects.filter(pk=self.mouse.pk).update(imagen='productos/vieja.png')
+        call_command('procesar_imagenes', stdout=io.StringIO())
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.imagen_variantes, [100, 300])
+        self.assertTrue(default_storage.exists('productos/variantes/vieja-300.webp'))
+
+
+    def test_regenerar_reemplaza_las_variantes_sin_dejar_temporales(self):
+        self.subir(self.mouse, imagen_png(300, 150))
+        self.mouse.refresh_from_db()
+        variantes = os.path.dirname(default_storage.path(nombre_variante(self.mouse.imagen.name, 100, 'jpg')))
+        antes = sorted(os.listdir(variantes))
+        call_command('procesar_imagenes', '--todas', stdout=io.StringIO())
+        self.assertEqual(sorted(os.listdir(variantes)), antes)
+
+
+class ImagenesEnSegundoPlanoTest(TransactionTestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media, PRODUCTOS_IMAGENES_EN_SEGUNDO_PLANO=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_las_variantes_se_generan_en_la_cola(self):
+        mouse = crear_producto('MOU-001', 'Mouse')
+        mouse.imagen = imagen_png(300, 150)
+        mouse.save()
+        imagenes.cola_imagenes.esperar()
+        mouse.refresh_from_db()
+        self.assertEqual(mouse.imagen_variantes, [100, 300])
+
+    def test_los_errores_van_al_log(self):
+        with self.assertLogs('productos.imagenes', 'ERROR') as log:
+            imagenes.procesar_imagen_en_segundo_plano('productos/no-existe.png')
+            imagenes.cola_imagenes.esperar()
+        self.assertIn('productos/no-existe.png', log.output[0])
+
+
+class DescontarStockTest(TestCase):
+
+    def test_descuenta_solo_si_alcanza_para_todos(self):
+        a = crear_producto('A', stock=5)
+        b = crear_producto('B', stock=2)
+        with self.assertRaises(StockInsuficiente) as ctx:
+            Producto.objects.descontar_stock({a.pk: 1, b.pk: 3})
+        self.assertEqual(ctx.exception.faltantes, [(b.nombre, 2, 3)])
+        self.assertEqual(
+            list(Producto.objects.order_by('pk').values_list('stock', flat=True)), [5, 2]
+        )
+        Producto.objects.descontar_stock({a.pk: 5, b.pk: 2})
+        self.assertEqual(
+            list(Producto.objects.order_by('pk').values_list('stock', flat=True)), [0, 0]
+        )
+
+
+class IndicesConsultasTest(IndicesTestMixin, TestCase):
+    """Las consultas de productos más usadas se resuelven con índices aunque las tablas sean grandes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Producto.objects.bulk_create([
+            Producto(sku=f'P{i}', nombre=f'Producto {i}', descripcion='-', precio=1,
+                     stock=i % 50, stock_minimo=5)
+            for i in range(1500)
+        ])
+        productos = list(Producto.objects.values_list('pk', flat=True))
+        inicio = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(producto_id=productos[i % len(productos)], tipo='entrada', cantidad=1,
+                            fecha=inicio + timedelta(hours=i), usuario='test')
+            for i in range(6000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.producto = Producto.objects.get(sku='P7')
+
+    def test_ultimos_movimientos_de_un_producto(self):
+        self.assertUsaIndices(self.producto.movimientos.all()[:10], 'productos_movimientostock')
+
+    def test_productos_con_stock_bajo(self):
+        self.assertUsaIndices(StockBajoListView().get_queryset(), 'productos_producto')
+
+    def test_paginas_por_cursor(self):
+        self.assertPaginaPorCursorUsaIndice(Producto.objects.all(), ['nombre'], self.producto)
+
+
+class ExportarDatosTest(ExportacionTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='vendedor', password='clave123')
+        cls.a = crear_producto('A', stock=88)
+        cls.b = crear_producto('B', stock=100)
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(producto=producto, tipo='entrada', cantidad=1, motivo='Compra', usuario='test')
+            for producto in (cls.a, cls.b, cls.b)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_productos_csv(self):
+        filas = self.filas_csv(self.descargar('productos', 'productos'))
+        self.assertEqual([fila[0] for fila in filas[1:]], ['A', 'B'])
+        self.assertEqual(filas[1][4], '88')
+
+    def test_movimientos_xlsx(self):
+        _, filas = self.filas_xlsx(self.descargar('productos', 'movimientos', formato='xlsx', producto='B'))
+        self.assertEqual(filas[0][:2], ['Fecha', 'SKU'])
+        self.assertEqual([fila[1] for fila in filas[1:]], ['B', 'B'])
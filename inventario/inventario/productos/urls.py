@@ -12,4 +12,12 @@ urlpatterns = [
     path('<int:pk>/movimiento/', views.MovimientoStockCreateView.as_view(), name='movimiento_create'),
     path('<int:pk>/ajustar-stock/', views.AjusteStockView.as_view(), name='ajustar_stock'),
     path('stock-bajo/', views.StockBajoListView.as_view(), name='stock_bajo_list'),
+    path('stock-bajo/eventos/', views.eventos_stock_bajo, name='stock_bajo_eventos'),
+    path('recepcion/', views.RecepcionMercaderiaView.as_view(), name='recepcion'),
+    path('conteos/', views.ConteoListView.as_view(), name='conteo_list'),
+    path('conteos/nuevo/', views.ConteoCreateView.as_view(), name='conteo_create'),
+    path('conteos/<int:pk>/', views.ConteoDetailView.as_view(), name='conteo_detail'),
+    path('conteos/<int:pk>/confirmar/', views.ConteoConfirmarView.as_view(), name='conteo_confirmar'),
+    path('importar/', views.ImportarProductosView.as_view(), name='importar'),
+    path('exportar/<str:tipo>/', views.exportar, name='exportar'),
 ]
\ No newline at end of file
@@ -2,42 +2,76 @@
 # productos/views.py
 # Este archivo contiene la lógica de la aplicación a través de las Vistas Basadas en Clases (CBVs).
 # -----------------------------------------------------------------------------
+import io
+
 from django.shortcuts import render
-from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView
+from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView, View
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect
-from django.db.models import Q, F
+from django.db import transaction
+from django.db.models import Q, F, Count, Sum
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import Producto, MovimientoStock
-from .forms import ProductoForm, MovimientoStockForm, AjusteStockForm
+from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from inventario.paginacion import PaginacionCursorMixin
+from inventario.cache_vistas import CacheListadoMixin
+from inventario.replicas import LecturaEnReplicaMixin, en_replica
+from .models import Producto, MovimientoStock, ConteoInventario
+from .forms import (
+    ProductoForm, MovimientoStockForm, AjusteStockForm, FiltroProductosForm, ImportarProductosForm,
+    RecepcionMercaderiaForm, ConteoInventarioForm, RegistrarConteoForm,
+)
+from .busqueda import buscar_productos
+from .stock_bajo import flujo_eventos, limite_streams
+from .exportacion import EXPORTACIONES
+from .importacion import importar_productos, ErrorImportacion
+from .lineas import ErrorLineas
+from .recepcion import aplicar_recepcion
+from .conteo import registrar_conteo, diferencias_conteo, confirmar_conteo
+from inventario.admision import Saturado, StreamConTurno
+from inventario.exportacion import vista_exportacion
 
 
-class ProductoListView(LoginRequiredMixin, ListView):
+class ProductoListView(LoginRequiredMixin, LecturaEnReplicaMixin, CacheListadoMixin, PaginacionCursorMixin, ListView):
     """Muestra una lista de todos los productos."""
     model = Producto
+    grupos_cache = ["productos"]
     template_name = "productos/producto_list.html"
     context_object_name = "productos"
     paginate_by = 10  # Paginación: 10 productos por página
+    orden_cursor = ["nombre"]  # Paginación por cursor salvo al ordenar por relevancia
 
     def get_queryset(self):
-        """Sobrescribe para permitir el filtrado por stock bajo."""
+        """Aplica el FiltroProductosForm: filtro de stock y búsqueda en una sola consulta."""
         queryset = super().get_queryset()
+        self.filtro_form = FiltroProductosForm(self.request.GET or None)
+
+        filtro = ""
+        buscar = ""
+        if self.filtro_form.is_valid():
+            filtro = self.filtro_form.cleaned_data["filtro"]
+            buscar = self.filtro_form.cleaned_data["buscar"]
 
-        stock_bajo = self.request.GET.get('stock_bajo')
-        if stock_bajo:
-            # Filtra en la base de datos usando F() para eficiencia
-            queryset = queryset.filter(stock__lt=F("stock_minimo"))
+        # Se mantiene ?stock_bajo=1 de los enlaces anteriores
+        if filtro == "stock_bajo" or self.request.GET.get("stock_bajo"):
+            queryset = queryset.stock_bajo()
+        elif filtro == "stock_ok":
+            queryset = queryset.filter(stock__gte=F("stock_minimo"))
+
+        if buscar:
+            return buscar_productos(queryset, buscar)
 
-        # Hay un error aquí: 'order_by' debe ser una llamada a método, no una indexación
-        # Se ha corregido la sentencia
         return queryset.order_by("nombre")
     
     def get_context_data(self, **kwargs):
-        """Añade una variable al contexto para saber si se está filtrando por stock bajo."""
+        """Añade el formulario de filtros al contexto."""
         context = super().get_context_data(**kwargs)
         context["stock_bajo"] = self.request.GET.get("stock_bajo")
+        context["filtro_form"] = self.filtro_form
         return context
 
 class ProductoDetailView(LoginRequiredMixin, DetailView):
@@ -112,22 +146,27 @@ class MovimientoStockCreateView(LoginRequiredMixin, CreateView):
     template_name = "productos/movimiento_form.html"
     form_class = MovimientoStockForm
 
+    @cached_property
+    def producto(self):
+        """El producto se busca una sola vez por pedido."""
+        return get_object_or_404(Producto, pk=self.kwargs["pk"])
+
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.producto
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.producto
         return context
 
     def form_valid(self, form):
         """Maneja la lógica de negocio para actualizar el stock."""
         movimiento = form.save(commit=False)
-        movimiento.producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        movimiento.producto = self.producto
         movimiento.usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
 
         if movimiento.tipo == "entrada":
@@ -152,42 +191,50 @@ class AjusteStockView(LoginRequiredMixin, FormView):
     form_class = AjusteStockForm
     template_name = "productos/ajuste_stock_form.html"
 
+    @cached_property
+    def producto(self):
+        """El producto se busca una sola vez por pedido."""
+        return get_object_or_404(Producto, pk=self.kwargs["pk"])
+
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario para que pueda pre-llenar los datos."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.producto
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.producto
         return context
 
     def form_valid(self, form):
         """
         Calcula la diferencia de stock, registra un movimiento y actualiza el stock del producto.
         """
-        producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
         nueva_cantidad = form.cleaned_data["cantidad"]
         motivo = form.cleaned_data["motivo"] or "Ajuste de stock"
 
-        diferencia = nueva_cantidad - producto.stock
+        with transaction.atomic():
+            # La diferencia se calcula con el stock bloqueado, no con el que se leyó al mostrar el formulario
+            producto = Producto.objects.select_for_update().get(pk=self.producto.pk)
+            diferencia = nueva_cantidad - producto.stock
 
-        if diferencia != 0:
-            tipo = "entrada" if diferencia > 0 else "salida" 
-            MovimientoStock.objects.create(
-                producto=producto,
-                tipo=tipo,
-                cantidad=abs(diferencia),
-                motivo=motivo,
-                fecha=timezone.now(),
-                usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
-            )
+            if diferencia != 0:
+                tipo = "entrada" if diferencia > 0 else "salida" 
+                MovimientoStock.objects.create(
+                    producto=producto,
+                    tipo=tipo,
+                    cantidad=abs(diferencia),
+                    motivo=motivo,
+                    fecha=timezone.now(),
+                    usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+                )
 
-            producto.stock = nueva_cantidad
-            producto.save()
+                producto.stock = nueva_cantidad
+                producto.save()
 
+        if diferencia != 0:
             messages.success(self.request, f"Stock actualizado exitosamente")
         else:
             messages.info(self.request, f"El stock no ha cambiado")
@@ -195,9 +242,143 @@ class AjusteStockView(LoginRequiredMixin, FormView):
         return redirect("productos:producto_detail", pk=producto.pk)
 
 
-class StockBajoListView(LoginRequiredMixin, ListView):
+class RecepcionMercaderiaView(LoginRequiredMixin, FormView):
+    """Registra la entrada de muchos productos a la vez a partir de un remito."""
+    form_class = RecepcionMercaderiaForm
+    template_name = "productos/recepcion_form.html"
+
+    def form_valid(self, form):
+        usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+        try:
+            productos, unidades = aplicar_recepcion(
+                form.cleaned_data["lineas"], form.cleaned_data["motivo"], usuario
+            )
+        except ErrorLineas as error:
+            form.add_error("lineas", error.mensajes())
+            return self.form_invalid(form)
+
+        messages.success(self.request, f"Recepción registrada: {unidades} unidades de {productos} productos")
+        return redirect("productos:producto_list")
+
+
+class ConteoListView(LoginRequiredMixin, LecturaEnReplicaMixin, ListView):
+    """Lista los conteos de inventario, abiertos y confirmados."""
+    model = ConteoInventario
+    template_name = "productos/conteo_list.html"
+    context_object_name = "conteos"
+    paginate_by = 20
+
+
+class ConteoCreateView(LoginRequiredMixin, CreateView):
+    """Abre un conteo de inventario."""
+    model = ConteoInventario
+    form_class = ConteoInventarioForm
+    template_name = "productos/conteo_form.html"
+
+    def form_valid(self, form):
+        form.instance.usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+        conteo = form.save()
+        messages.success(self.request, f"Conteo #{conteo.pk} abierto")
+        return redirect("productos:conteo_detail", pk=conteo.pk)
+
+
+class ConteoDetailView(LoginRequiredMixin, ListView):
+    """
+    Un conteo: carga de cantidades contadas y diferencias con el stock actual.
+
+    El listado son los productos con diferencia, calculados en una consulta.
+    """
+    template_name = "productos/conteo_detail.html"
+    context_object_name = "diferencias"
+    paginate_by = 50
+
+    @cached_property
+    def conteo(self):
+        return get_object_or_404(ConteoInventario, pk=self.kwargs["pk"])
+
+    def get_queryset(self):
+        if not self.conteo.abierto:
+            return Producto.objects.none()
+        return diferencias_conteo(self.conteo).order_by("sku")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["conteo"] = self.conteo
+        context.setdefault("form", RegistrarConteoForm())
+        context["resumen"] = self.conteo.lineas.aggregate(
+            productos=Count("producto", distinct=True), unidades=Sum("cantidad")
+        )
+        return context
+
+    def post(self, request, *args, **kwargs):
+        """Registra las cantidades contadas; con errores vuelve a mostrar lo cargado."""
+        form = RegistrarConteoForm(request.POST)
+        if form.is_valid():
+            usuario = request.user.username if request.user.is_authenticated else "Sistema"
+            try:
+                productos, unidades = registrar_conteo(self.conteo, form.cleaned_data["lineas"], usuario)
+            except ErrorLineas as error:
+                form.add_error("lineas", error.mensajes())
+            else:
+                messages.success(request, f"Registradas {unidades} unidades de {productos} productos")
+                return redirect("productos:conteo_detail", pk=self.conteo.pk)
+
+        self.object_list = self.get_queryset()
+        return self.render_to_response(self.get_context_data(form=form))
+
+
+class ConteoConfirmarView(LoginRequiredMixin, View):
+    """Aplica las diferencias del conteo al stock (solo POST)."""
+
+    def post(self, request, pk):
+        conteo = get_object_or_404(ConteoInventario, pk=pk)
+        usuario = request.user.username if request.user.is_authenticated else "Sistema"
+        try:
+            ajustados = confirmar_conteo(conteo, usuario)
+        except ErrorLineas as error:
+            messages.error(request, " ".join(error.mensajes()))
+        else:
+            messages.success(request, f"Conteo confirmado: {ajustados} productos ajustados")
+        return redirect("productos:conteo_detail", pk=pk)
+
+
+class ImportarProductosView(LoginRequiredMixin, FormView):
+    """Importa o actualiza productos en masa desde un CSV."""
+    form_class = ImportarProductosForm
+    template_name = "productos/importar_form.html"
+
+    def form_valid(self, form):
+        archivo = io.TextIOWrapper(form.cleaned_data["archivo"].file, encoding="utf-8-sig", newline="")
+        usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+        try:
+            # Desde la web solo archivos chicos y sin pool de procesos: el pedido
+            # ocupa un worker mientras dura. Los catálogos grandes van por el comando
+            resultado = importar_productos(
+                archivo, usuario=usuario, procesos=1,
+                maximo_filas=getattr(settings, "IMPORTACION_WEB_MAXIMO_FILAS", 5000),
+            )
+        except ErrorImportacion as error:
+            form.add_error("archivo", str(error))
+            return self.form_invalid(form)
+        except UnicodeDecodeError:
+            form.add_error("archivo", "El archivo debe estar en UTF-8")
+            return self.form_invalid(form)
+
+        messages.success(
+            self.request,
+            f"Importación terminada: {resultado.creados} productos creados, "
+            f"{resultado.actualizados} actualizados y {resultado.sin_cambios} sin cambios"
+        )
+        if resultado.filas_con_error:
+            detalle = "; ".join(f"línea {linea}: {mensaje}" for linea, mensaje in resultado.errores[:5])
+            messages.warning(self.request, f"{resultado.filas_con_error} filas con errores no se importaron ({detalle})")
+        return redirect("productos:producto_list")
+
+
+class StockBajoListView(LoginRequiredMixin, LecturaEnReplicaMixin, CacheListadoMixin, ListView):
     """Muestra una lista filtrada solo para productos con stock bajo."""
     model = Producto
+    grupos_cache = ["productos"]
     template_name = "productos/stock_bajo_list.html"
     context_object_name = "productos"
 
@@ -206,5 +387,41 @@ class StockBajoListView(LoginRequiredMixin, ListView):
         Filtra y ordena el QuerySet para mostrar solo productos
         cuyo stock sea menor que el stock mínimo.
         """
-        # Se ha corregido la sintaxis. Se usa F() para una comparación eficiente
-        return Producto.objects.filter(stock__lt=F("stock_minimo")).order_by("stock")
\ No newline at end of file
+        return Producto.objects.stock_bajo().order_by("stock")
+
+
+@login_required
+def eventos_stock_bajo(request):
+    """
+    Server-Sent Events con el conteo de stock bajo y los productos que entran o salen.
+
+    El navegador manda Last-Event-ID al reconectarse y recibe los eventos que se perdió.
+    Si ya hay STOCK_BAJO_SSE_CONCURRENCIA streams abiertos responde 503 con el
+    tiempo de reintento.
+    """
+    ultimo_id = request.headers.get("Last-Event-ID") or request.GET.get("desde")
+    try:
+        ultimo_id = int(ultimo_id) if ultimo_id else None
+    except ValueError:
+        return HttpResponseBadRequest("Last-Event-ID inválido")
+
+    try:
+        stream = StreamConTurno(limite_streams, flujo_eventos(ultimo_id))
+    except Saturado:
+        reintento = getattr(settings, "STOCK_BAJO_SSE_REINTENTO", 30)
+        response = HttpResponse(f"retry: {reintento * 1000}\n\n", status=503, content_type="text/event-stream")
+        response["Retry-After"] = str(reintento)
+        return response
+
+    response = StreamingHttpResponse(stream, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Que nginx no acumule el stream en su buffer
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@login_required
+@en_replica
+def exportar(request, tipo):
+    """Descarga productos o movimientos de stock en CSV o XLSX (?formato=, desde, hasta, producto)."""
+    return vista_exportacion(request, EXPORTACIONES, tipo)
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Venta, ItemVenta
+from inventario.paginacion import PaginadorAproximado
+from .models import Venta, ItemVenta, ResumenVentaDiaria
 
 
 class ItemVentaInline(admin.TabularInline):
@@ -18,6 +19,9 @@ class VentaAdmin(admin.ModelAdmin):
     readonly_fields = ['codigo_venta', 'total', 'fecha_creacion']
     date_hierarchy = 'fecha'
     inlines = [ItemVentaInline]
+    # Sin COUNT(*) exacto en cada página del listado
+    paginator = PaginadorAproximado
+    show_full_result_count = False
     
     fieldsets = (
         ('Información de la Venta', {
@@ -39,3 +43,12 @@ class ItemVentaAdmin(admin.ModelAdmin):
     list_filter = ['venta__fecha']
     search_fields = ['venta__codigo_venta', 'producto__nombre']
     readonly_fields = ['subtotal']
+    paginator = PaginadorAproximado
+    show_full_result_count = False
+
+
+@admin.register(ResumenVentaDiaria)
+class ResumenVentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ['fecha', 'total', 'cantidad_ventas', 'unidades']
+    date_hierarchy = 'fecha'
+    readonly_fields = ['fecha', 'total', 'cantidad_ventas', 'unidades']
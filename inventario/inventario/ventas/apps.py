@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class VentasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ventas'
+
+    def ready(self):
+        from . import signals  # Conecta los receivers del cache de vistas
@@ -0,0 +1,245 @@
+"""
+Generación de los comprobantes PDF de venta.
+
+Una venta confirmada no cambia, así que el PDF se guarda en un storage
+indexado por la huella (hash) de la venta y sus items. Mientras los datos
+sean los mismos, las descargas siguientes leen el archivo en lugar de volver
+a correr xhtml2pdf.
+"""
+import hashlib
+import json
+import logging
+import os
+import zipfile
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.template.loader import render_to_string
+from django.utils import timezone
+from xhtml2pdf import pisa
+
+from inventario.admision import LimiteConcurrencia, Saturado
+from inventario.exportacion import SalidaZip
+from inventario.procesos import descartar_pool, pool_procesos
+from inventario.tareas import ColaTareas
+
+logger = logging.getLogger(__name__)
+
+# Subir este número al modificar comprobante_pdf.html para descartar los PDF ya generados
+VERSION_PLANTILLA = 1
+
+
+class ErrorComprobante(Exception):
+    """xhtml2pdf no pudo generar el PDF."""
+
+
+class ComprobantesSaturados(Saturado):
+    """Se alcanzó el límite de PDF generándose y la cola de espera está llena o venció."""
+
+
+# Como máximo COMPROBANTES_PDF_CONCURRENCIA comprobantes generándose a la vez por
+# proceso; hasta COMPROBANTES_PDF_COLA pedidos más esperan COMPROBANTES_PDF_ESPERA
+# segundos (ver inventario/admision.py)
+limite_comprobantes = LimiteConcurrencia(
+    'COMPROBANTES_PDF', concurrencia=2, cola=4, espera=10, excepcion=ComprobantesSaturados
+)
+# Exportaciones en ZIP a la vez por proceso, sin cola: cada una ocupa el pool de procesos
+limite_exportaciones = LimiteConcurrencia(
+    'COMPROBANTES_EXPORTACION', concurrencia=1, excepcion=ComprobantesSaturados
+)
+
+# Comprobantes que se generan al confirmar la venta: un solo hilo, de a uno
+cola_comprobantes = ColaTareas('comprobantes')
+
+
+def storage_comprobantes():
+    return storages[getattr(settings, 'COMPROBANTES_STORAGE', 'default')]
+
+
+def huella_venta(venta, items):
+    """Hash de todos los datos que se imprimen en el comprobante."""
+    cliente = venta.cliente
+    datos = {
+        'version': VERSION_PLANTILLA,
+        'codigo': venta.codigo_venta,
+        'fecha': venta.fecha.isoformat(),
+        'total': str(venta.total),
+        'cliente': [
+            cliente.nombre_completo, cliente.numero_documento, cliente.email,
+            cliente.telefono, cliente.direccion,
+        ],
+        'items': [
+            [item.producto.sku, item.producto.nombre, item.cantidad,
+             str(item.precio_unitario), str(item.subtotal)]
+            for item in items
+        ],
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def ruta_comprobante(huella):
+    return f'comprobantes/{huella[:2]}/{huella}.pdf'
+
+
+def renderizar_pdf(venta, items):
+    """Renderiza el comprobante con xhtml2pdf y devuelve los bytes del PDF."""
+    html_string = render_to_string('ventas/comprobante_pdf.html', {
+        'venta': venta,
+        'items': items,
+        'fecha_actual': timezone.now()
+    })
+
+    result = BytesIO()
+    pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
+    if pdf.err:
+        raise ErrorComprobante(f'Error al generar el comprobante de la venta {venta.codigo_venta}')
+    return result.getvalue()
+
+
+def guardar_comprobante(storage, ruta, contenido):
+    guardado = storage.save(ruta, ContentFile(contenido))
+    if guardado != ruta:
+        # Otro proceso guardó el mismo comprobante mientras se generaba este
+        storage.delete(guardado)
+
+
+def obtener_comprobante(venta, items=None, huella=None, de_fondo=False):
+    """
+    Devuelve (huella, bytes del PDF) de la venta, generándolo solo si no está guardado.
+
+    Lanza ComprobantesSaturados si hay que generarlo y no hay lugar; `de_fondo`
+    espera el lugar sin plazo (ver LimiteConcurrencia.entrar).
+    """
+    if items is None:
+        items = list(venta.items.select_related('producto'))
+    if huella is None:
+        huella = huella_venta(venta, items)
+
+    storage = storage_comprobantes()
+    ruta = ruta_comprobante(huella)
+    if storage.exists(ruta):
+        with storage.open(ruta, 'rb') as archivo:
+            return huella, archivo.read()
+
+    # Solo la generación pasa por el control de admisión: los guardados se sirven siempre
+    with limite_comprobantes.turno(de_fondo=de_fondo):
+        contenido = renderizar_pdf(venta, items)
+    guardar_comprobante(storage, ruta, contenido)
+    return huella, contenido
+
+
+def _renderizar_en_proceso(venta, items):
+    # Corre en otro proceso: recibe la venta con cliente e items ya cargados y no usa la base
+    return renderizar_pdf(venta, items)
+
+
+def _liberar_turno(futuro):
+    limite_comprobantes.salir(completado=not futuro.cancelled() and futuro.exception() is None)
+
+
+def renderizar_en_pool(venta, items):
+    """
+    Manda a renderizar el comprobante al pool de procesos y devuelve el Future.
+
+    Cada render ocupa un lugar de `limite_comprobantes` hasta que termina, así
+    las exportaciones no suman PDF generándose por encima del límite y
+    aparecen en sus métricas.
+    """
+    limite_comprobantes.entrar(de_fondo=True)
+    try:
+        futuro = pool_procesos().submit(_renderizar_en_proceso, venta, items)
+    except BaseException:
+        limite_comprobantes.salir(completado=False)
+        raise
+    futuro.add_done_callback(_liberar_turno)
+    return futuro
+
+
+def generar_comprobantes(ventas, procesos=None, lote=100):
+    """
+    Genera los comprobantes de un queryset de ventas, en orden, como (venta, bytes).
+
+    Los que ya están guardados se leen del storage y el resto se renderiza en el
+    pool de procesos compartido (inventario/procesos.py), con a lo sumo dos PDF
+    por proceso (`procesos`, por defecto COMPROBANTES_PROCESOS o uno por núcleo)
+    en vuelo y sin pasar el límite de PDF generándose a la vez; `procesos` no
+    cambia cuántos workers tiene el pool, que es PROCESOS_POOL. Las ventas se
+    leen de a `lote`, así la memoria queda acotada sin importar cuántas ventas
+    haya en el rango.
+    """
+    procesos = procesos or getattr(settings, 'COMPROBANTES_PROCESOS', None) or os.cpu_count() or 1
+    storage = storage_comprobantes()
+    ventas = ventas.select_related('cliente').prefetch_related('items__producto')
+
+    pool = None
+    pendientes = deque()
+
+    def entregar(pendiente):
+        venta, huella, resultado = pendiente
+        if isinstance(resultado, bytes):
+            return venta, resultado
+        try:
+            contenido = resultado.result()
+        except BrokenProcessPool:
+            descartar_pool(pool)
+            raise
+        guardar_comprobante(storage, ruta_comprobante(huella), contenido)
+        return venta, contenido
+
+    try:
+        for venta in ventas.iterator(chunk_size=lote):
+            items = list(venta.items.all())
+            huella = huella_venta(venta, items)
+            ruta = ruta_comprobante(huella)
+            if storage.exists(ruta):
+                with storage.open(ruta, 'rb') as archivo:
+                    resultado = archivo.read()
+            else:
+                pool = pool or pool_procesos()
+                resultado = renderizar_en_pool(venta, items)
+            pendientes.append((venta, huella, resultado))
+
+            while len(pendientes) > procesos * 2:
+                yield entregar(pendientes.popleft())
+
+        while pendientes:
+            yield entregar(pendientes.popleft())
+    finally:
+        # Si el cliente corta la descarga no se siguen renderizando sus pendientes
+        for _, _, resultado in pendientes:
+            if not isinstance(resultado, bytes):
+                resultado.cancel()
+
+
+def zip_comprobantes(ventas, procesos=None):
+    """
+    Genera un ZIP con los comprobantes de las ventas, en partes de bytes.
+
+    Cada PDF se entrega apenas se agrega al ZIP, pensado para StreamingHttpResponse
+    o para escribir en un archivo sin tener el ZIP completo en memoria.
+    """
+    salida = SalidaZip()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as archivo_zip:
+        for venta, contenido in generar_comprobantes(ventas, procesos=procesos):
+            archivo_zip.writestr(f'comprobante_venta_{venta.codigo_venta}.pdf', contenido)
+            yield salida.retirar()
+    yield salida.retirar()
+
+
+def _pregenerar(venta_pk):
+    from .models import Venta
+
+    try:
+        venta = Venta.objects.select_related('cliente').get(pk=venta_pk)
+        obtener_comprobante(venta, de_fondo=True)
+    except Exception:
+        logger.exception('No se pudo pregenerar el comprobante de la venta %s', venta_pk)
+
+
+def pregenerar_comprobante(venta_pk):
+    """Encola la generación del comprobante (se usa al confirmar la venta)."""
+    cola_comprobantes.encolar(_pregenerar, venta_pk)
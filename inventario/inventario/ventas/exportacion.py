@@ -0,0 +1,44 @@
+"""Tablas de ventas que se pueden exportar (ver inventario.exportacion)."""
+from django.db.models import Exists, OuterRef
+
+from inventario.exportacion import Exportacion
+
+from .models import Venta, ItemVenta
+
+
+def ventas_con_producto(queryset, sku):
+    # Exists en lugar de un join con los items: cada venta sale una sola vez
+    return queryset.filter(Exists(ItemVenta.objects.filter(venta=OuterRef('pk'), producto__sku=sku)))
+
+
+EXPORTACIONES = {
+    'ventas': Exportacion(
+        'ventas',
+        Venta.objects.order_by('fecha', 'pk'),
+        [
+            ('Código', 'codigo_venta'),
+            ('Fecha', 'fecha'),
+            ('Documento', 'cliente__numero_documento'),
+            ('Apellido', 'cliente__apellido'),
+            ('Nombre', 'cliente__nombre'),
+            ('Total', 'total'),
+        ],
+        campo_fecha='fecha',
+        filtrar_producto=ventas_con_producto,
+    ),
+    'items': Exportacion(
+        'items_venta',
+        ItemVenta.objects.order_by('pk'),
+        [
+            ('Venta', 'venta__codigo_venta'),
+            ('Fecha', 'venta__fecha'),
+            ('SKU', 'producto__sku'),
+            ('Producto', 'producto__nombre'),
+            ('Cantidad', 'cantidad'),
+            ('Precio unitario', 'precio_unitario'),
+            ('Subtotal', 'subtotal'),
+        ],
+        campo_fecha='venta__fecha',
+        campo_producto='producto__sku',
+    ),
+}
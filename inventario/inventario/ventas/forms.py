@@ -1,5 +1,9 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import inlineformset_factory, BaseInlineFormSet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from collections import defaultdict
+from datetime import datetime, time, timedelta
 from django.core.exceptions import ValidationError
 from .models import Venta, ItemVenta
 from clientes.models import Cliente
@@ -39,56 +43,209 @@ class VentaForm(forms.ModelForm):
         )
 
 
+def label_producto(obj):
+    """Label de las opciones de producto, incluye precio y stock."""
+    return f"{obj.nombre} - ${obj.precio} (Stock: {obj.stock})"
+
+
+class ProductoChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField que puede trabajar sobre productos ya cargados.
+
+    Si se le asigna `productos` (dict {str(pk): Producto}) valida contra ese dict
+    en lugar de hacer un `queryset.get()` por cada fila.
+    """
+    productos = None
+
+    def to_python(self, value):
+        if self.productos is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        try:
+            return self.productos[str(getattr(value, 'pk', value))]
+        except KeyError:
+            raise ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+
 class ItemVentaForm(forms.ModelForm):
     """Formulario para cada item de venta."""
     
     class Meta:
         model = ItemVenta
         fields = ['producto', 'cantidad', 'precio_unitario']
+        field_classes = {
+            'producto': ProductoChoiceField,
+        }
         widgets = {
             'cantidad': forms.NumberInput(attrs={'min': 1, 'class': 'cantidad-item'}),
             'precio_unitario': forms.NumberInput(attrs={'step': '0.01', 'class': 'precio-item'}),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, productos=None, **kwargs):
         super().__init__(*args, **kwargs)
         # Filtrar solo productos con stock
-        productos = Producto.objects.filter(stock__gt=0).order_by('nombre')
-        self.fields['producto'].queryset = productos
+        self.fields['producto'].queryset = Producto.objects.filter(stock__gt=0).order_by('nombre')
+        
+        # Sobrescribir el label de las opciones para incluir precio
+        self.fields['producto'].label_from_instance = label_producto
+
+        # Cuando el formset ya cargó los productos, se reutilizan sin consultar.
+        # El select solo lleva el producto elegido: el resto se busca con el
+        # autocompletado, así la página no incluye todo el catálogo por fila
+        if productos is not None:
+            self.fields['producto'].productos = productos
+            if self.is_bound:
+                elegido = productos.get(str(self.data.get(self.add_prefix('producto'))))
+            else:
+                elegido = productos.get(str(self.instance.producto_id))
+            opciones = [('', self.fields['producto'].empty_label)]
+            if elegido:
+                opciones.append((elegido.pk, label_producto(elegido)))
+            self.fields['producto'].choices = opciones
         
         # Agregar clase al select
         self.fields['producto'].widget.attrs.update({
             'class': 'producto-select form-control',
-            'onchange': 'actualizarPrecioProducto(this)'
         })
-        
-        # Sobrescribir el label de las opciones para incluir precio
-        self.fields['producto'].label_from_instance = lambda obj: f"{obj.nombre} - ${obj.precio} (Stock: {obj.stock})"
     
+    def _get_validation_exclusions(self):
+        """El producto ya se validó contra los productos cargados: evita un exists() por fila."""
+        exclude = super()._get_validation_exclusions()
+        if self.fields['producto'].productos is not None:
+            exclude.add('producto')
+        return exclude
+
     def clean_cantidad(self):
-        """Valida que la cantidad sea positiva y que haya stock."""
+        """Valida que la cantidad sea positiva; el stock lo valida el formset."""
         cantidad = self.cleaned_data.get('cantidad')
-        producto = self.cleaned_data.get('producto')
         
-        if cantidad and cantidad <= 0:
+        if cantidad is not None and cantidad <= 0:
             raise ValidationError("La cantidad debe ser mayor a 0")
         
-        if producto and cantidad:
-            if producto.stock < cantidad:
-                raise ValidationError(
-                    f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}"
-                )
-        
         return cantidad
 
 
+class BaseItemVentaFormSet(BaseInlineFormSet):
+    """
+    Formset de items que carga los productos disponibles una sola vez.
+
+    Solo se cargan los productos que las filas referencian (el resto del
+    catálogo se busca con el autocompletado), y todas las filas comparten el
+    mismo dict de productos, así renderizar o validar una venta de muchas
+    filas hace una única consulta.
+    """
+
+    def ids_productos(self):
+        """Ids de producto elegidos en las filas enviadas o guardadas."""
+        ids = set()
+        if self.is_bound:
+            for i in range(self.total_form_count()):
+                valor = self.data.get(f'{self.add_prefix(i)}-producto')
+                if valor and str(valor).isdigit():
+                    ids.add(int(valor))
+        elif self.instance.pk:
+            ids.update(self.get_queryset().values_list('producto_id', flat=True))
+        return ids
+
+    @cached_property
+    def productos_disponibles(self):
+        ids = self.ids_productos()
+        if not ids:
+            return {}
+        productos = Producto.objects.filter(stock__gt=0, pk__in=ids).order_by('nombre')
+        return {str(producto.pk): producto for producto in productos}
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs['productos'] = self.productos_disponibles
+        return kwargs
+
+    def clean(self):
+        """
+        Valida el stock de toda la venta de una vez.
+
+        Suma lo pedido de cada producto en todas las filas (el mismo producto
+        puede estar en varias) y lo compara contra los productos ya cargados,
+        marcando el error en cada fila afectada.
+        """
+        super().clean()
+        filas_por_producto = defaultdict(list)
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or self._should_delete_form(form):
+                continue
+            producto = form.cleaned_data.get('producto')
+            if producto and form.cleaned_data.get('cantidad'):
+                filas_por_producto[producto.pk].append(form)
+
+        for filas in filas_por_producto.values():
+            producto = filas[0].cleaned_data['producto']
+            solicitado = sum(form.cleaned_data['cantidad'] for form in filas)
+            if solicitado > producto.stock:
+                for form in filas:
+                    form.add_error(
+                        'cantidad',
+                        f"Stock insuficiente para {producto.nombre}. "
+                        f"Disponible: {producto.stock}, Solicitado en la venta: {solicitado}"
+                    )
+
+
 # Crear el formset para los items de venta
 ItemVentaFormSet = inlineformset_factory(
     Venta,
     ItemVenta,
     form=ItemVentaForm,
+    formset=BaseItemVentaFormSet,
     extra=0,  # No agregar formularios vacíos adicionales
     can_delete=True,
     min_num=1,  # Mínimo 1 item (este creará 1 formulario)
     validate_min=True,
 )
+
+
+class ExportarComprobantesForm(forms.Form):
+    """Filtros para exportar en un ZIP los comprobantes de varias ventas."""
+    desde = forms.DateField(
+        required=False,
+        label="Desde",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    hasta = forms.DateField(
+        required=False,
+        label="Hasta",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    cliente = forms.ModelChoiceField(
+        queryset=Cliente.objects.all(),
+        required=False,
+        label="Cliente",
+        widget=forms.NumberInput(attrs={'placeholder': 'ID de cliente'})
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        desde = cleaned_data.get('desde')
+        hasta = cleaned_data.get('hasta')
+        if not (desde or hasta or cleaned_data.get('cliente')) and not self.errors:
+            raise ValidationError("Indique un rango de fechas o un cliente")
+        if desde and hasta and desde > hasta:
+            raise ValidationError("La fecha 'desde' no puede ser posterior a 'hasta'")
+        return cleaned_data
+
+    def ventas(self):
+        """Ventas que cumplen los filtros, de la más antigua a la más reciente."""
+        ventas = Venta.objects.all()
+        # Rangos sobre la columna (no __date) para que se use su índice
+        if self.cleaned_data.get('desde'):
+            inicio = timezone.make_aware(datetime.combine(self.cleaned_data['desde'], time.min))
+            ventas = ventas.filter(fecha__gte=inicio)
+        if self.cleaned_data.get('hasta'):
+            fin = timezone.make_aware(datetime.combine(self.cleaned_data['hasta'] + timedelta(days=1), time.min))
+            ventas = ventas.filter(fecha__lt=fin)
+        if self.cleaned_data.get('cliente'):
+            ventas = ventas.filter(cliente=self.cleaned_data['cliente'])
+        return ventas.order_by('fecha', 'pk')
@@ -0,0 +1,134 @@
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from clientes.models import Cliente
+from inventario.procesos import inicializar_proceso
+from inventario.sqlite import opciones_sqlite
+from productos.models import Producto
+from ventas.models import Venta, ItemVenta
+
+# Opciones de la conexión en cada perfil: SQLite sin configurar (el timeout de 5
+# segundos de Python, journal rollback, BEGIN DEFERRED) y el de inventario/sqlite.py
+PERFILES = {
+    'por defecto': {},
+    'concurrente': opciones_sqlite(),
+}
+
+
+def _conectar(ruta, opciones):
+    """Apunta la conexión default del proceso a la base `ruta` con las `opciones` del perfil."""
+    connections.settings['default'] = {**connections.settings['default'], 'NAME': ruta, 'OPTIONS': opciones}
+    try:
+        # Descarta la conexión heredada del proceso padre sin cerrarla (es suya)
+        del connections['default']
+    except AttributeError:
+        pass  # Con spawn no hay conexión heredada
+
+
+def _crear_base(ruta, productos):
+    _conectar(ruta, {})
+    call_command('migrate', verbosity=0, interactive=False)
+    Cliente.objects.create(
+        nombre='Benchmark', apellido='Ventas', numero_documento='BM-VENTAS',
+        email='ventas@benchmark.test', telefono='0', direccion='-',
+    )
+    Producto.objects.bulk_create([
+        Producto(sku=f'BM-{i:05d}', nombre=f'Producto {i}', descripcion='Benchmark', precio=100, stock=10**9)
+        for i in range(productos)
+    ])
+    connection.close()
+
+
+def _vender(ruta, opciones, inicio, segundos, items, semilla):
+    """Vende sin parar hasta `inicio + segundos`; devuelve (latencias de las ventas, errores de bloqueo)."""
+    _conectar(ruta, opciones)
+    azar = random.Random(semilla)
+    cliente = Cliente.objects.get()
+    productos = list(Producto.objects.all())
+    latencias = []
+    bloqueos = 0
+
+    time.sleep(max(0, inicio - time.time()))
+    while time.time() < inicio + segundos:
+        venta = Venta(cliente=cliente)
+        lineas = [ItemVenta(producto=p, cantidad=azar.randint(1, 3)) for p in azar.sample(productos, items)]
+        comienzo = time.perf_counter()
+        try:
+            venta.confirmar(lineas, usuario='benchmark')
+        except OperationalError:
+            # "database is locked": la venta se pierde, como le pasaría al cajero
+            bloqueos += 1
+            continue
+        latencias.append(time.perf_counter() - comienzo)
+    connection.close()
+    return latencias, bloqueos
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las ventas por segundo con varios procesos vendiendo a la vez sobre SQLite, con '
+        'SQLite por defecto y con el perfil concurrente (inventario/sqlite.py). Usa bases '
+        'temporales: no toca la base configurada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=4, help='Procesos vendiendo a la vez')
+        parser.add_argument('--segundos', type=float, default=10, help='Duración de cada medición')
+        parser.add_argument('--productos', type=int, default=200, help='Productos del catálogo de prueba')
+        parser.add_argument('--items', type=int, default=3, help='Items por venta')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('El benchmark es para SQLite')
+        if options['procesos'] < 1 or options['segundos'] <= 0:
+            raise CommandError('Los procesos y los segundos deben ser mayores a 0')
+        if not 1 <= options['items'] <= options['productos']:
+            raise CommandError('Los items por venta deben estar entre 1 y la cantidad de productos')
+
+        self.stdout.write(
+            f"{'perfil':>12} {'ventas/s':>10} {'bloqueos':>9} {'p50 (ms)':>9} {'p95 (ms)':>9}"
+        )
+        carpeta = tempfile.mkdtemp(prefix='benchmark-ventas-')
+        try:
+            plantilla = os.path.join(carpeta, 'plantilla.sqlite3')
+            # La base se crea en otro proceso para no cambiar la conexión de este
+            with ProcessPoolExecutor(max_workers=1, initializer=inicializar_proceso) as pool:
+                pool.submit(_crear_base, plantilla, options['productos']).result()
+
+            for nombre, opciones in PERFILES.items():
+                ruta = os.path.join(carpeta, f'{nombre.replace(" ", "_")}.sqlite3')
+                shutil.copy(plantilla, ruta)
+                ventas, bloqueos, latencias = self.medir(ruta, opciones, options)
+                # Percentiles 50 y 95 de la duración de cada venta
+                p50, p95 = (0, 0)
+                if len(latencias) > 1:
+                    cortes = statistics.quantiles(latencias, n=20)
+                    p50, p95 = cortes[9] * 1000, cortes[18] * 1000
+                self.stdout.write(
+                    f'{nombre:>12} {ventas / options["segundos"]:>10.1f} {bloqueos:>9} {p50:>9.1f} {p95:>9.1f}'
+                )
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+        self.stdout.write(self.style.SUCCESS('✓ Benchmark terminado'))
+
+    def medir(self, ruta, opciones, options):
+        procesos = options['procesos']
+        with ProcessPoolExecutor(max_workers=procesos, initializer=inicializar_proceso) as pool:
+            # Todos arrancan a la vez, después de cargar el catálogo
+            inicio = time.time() + 1
+            futuros = [
+                pool.submit(_vender, ruta, opciones, inicio, options['segundos'], options['items'], semilla)
+                for semilla in range(procesos)
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+        latencias = [latencia for parcial, _ in resultados for latencia in parcial]
+        return len(latencias), sum(bloqueos for _, bloqueos in resultados), latencias
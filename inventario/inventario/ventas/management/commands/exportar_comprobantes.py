@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from ventas.comprobantes import zip_comprobantes
+from ventas.forms import ExportarComprobantesForm
+
+
+class Command(BaseCommand):
+    help = 'Exporta en un ZIP los comprobantes PDF de las ventas de un rango de fechas o de un cliente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('salida', help='Ruta del archivo ZIP a generar')
+        parser.add_argument('--desde', help='Primer día (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Último día (AAAA-MM-DD)')
+        parser.add_argument('--cliente', type=int, help='ID del cliente')
+        parser.add_argument(
+            '--procesos', type=int,
+            help='PDF en vuelo: dos por proceso indicado (por defecto COMPROBANTES_PROCESOS o uno por '
+                 'núcleo); los workers del pool los fija PROCESOS_POOL'
+        )
+
+    def handle(self, *args, **options):
+        form = ExportarComprobantesForm({
+            'desde': options['desde'],
+            'hasta': options['hasta'],
+            'cliente': options['cliente'],
+        })
+        if not form.is_valid():
+            errores = [error for lista in form.errors.values() for error in lista]
+            raise CommandError(" ".join(errores))
+
+        ventas = form.ventas()
+        cantidad = ventas.count()
+        with open(options['salida'], 'wb') as archivo:
+            for parte in zip_comprobantes(ventas, procesos=options['procesos']):
+                archivo.write(parte)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {cantidad} comprobante{"s" if cantidad != 1 else ""} exportado{"s" if cantidad != 1 else ""} en {options["salida"]}'
+        ))
@@ -0,0 +1,42 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from inventario.exportacion import FiltroExportacionForm, partes_exportacion
+from productos.exportacion import EXPORTACIONES as EXPORTACIONES_PRODUCTOS
+from ventas.exportacion import EXPORTACIONES as EXPORTACIONES_VENTAS
+
+EXPORTACIONES = {**EXPORTACIONES_PRODUCTOS, **EXPORTACIONES_VENTAS}
+
+
+class Command(BaseCommand):
+    help = 'Exporta productos, movimientos de stock, ventas o items de venta a CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(EXPORTACIONES), help='Tabla a exportar')
+        parser.add_argument('salida', help='Ruta del archivo a generar (.csv o .xlsx)')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], help='Por defecto, según la extensión de salida')
+        parser.add_argument('--desde', help='Primer día (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Último día (AAAA-MM-DD)')
+        parser.add_argument('--producto', help='SKU del producto')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or ('xlsx' if options['salida'].lower().endswith('.xlsx') else 'csv')
+        form = FiltroExportacionForm({
+            'formato': formato,
+            'desde': options['desde'],
+            'hasta': options['hasta'],
+            'producto': options['producto'],
+        })
+        if not form.is_valid():
+            errores = [error for lista in form.errors.values() for error in lista]
+            raise CommandError(" ".join(errores))
+
+        exportacion = EXPORTACIONES[options['tipo']]
+        with open(options['salida'], 'wb') as archivo:
+            for parte in partes_exportacion(exportacion, formato, **form.filtros()):
+                archivo.write(parte.encode('utf-8') if isinstance(parte, str) else parte)
+
+        tamanio = os.path.getsize(options['salida'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {options["tipo"]} exportado en {options["salida"]} ({tamanio / 1024:.1f} KB)'
+        ))
@@ -0,0 +1,80 @@
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum, Count, Min, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventario.cache_vistas import invalidar
+from ventas.models import Venta, ItemVenta, ResumenVentaDiaria
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de ventas a partir del historial, por lotes de días'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primer día a reconstruir (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día a reconstruir (AAAA-MM-DD)')
+        parser.add_argument(
+            '--dias-por-lote', type=int, default=31,
+            help='Cantidad de días que se agrupan y reescriben en cada transacción'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias_por_lote'] < 1:
+            raise CommandError('--dias-por-lote debe ser mayor a 0')
+
+        rango = Venta.objects.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        if rango['primera'] is None and not (options['desde'] and options['hasta']):
+            self.stdout.write(self.style.WARNING('→ No hay ventas registradas'))
+            return
+
+        desde = options['desde'] or timezone.localdate(rango['primera'])
+        hasta = options['hasta'] or timezone.localdate(rango['ultima'])
+        lote = timedelta(days=options['dias_por_lote'])
+
+        dias = 0
+        inicio = desde
+        while inicio <= hasta:
+            fin = min(inicio + lote, hasta + timedelta(days=1))
+            dias += self.reconstruir_lote(inicio, fin)
+            inicio = fin
+        # El dashboard lee el resumen
+        invalidar('ventas')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Resumen reconstruido del {desde:%d/%m/%Y} al {hasta:%d/%m/%Y} ({dias} días con ventas)'
+        ))
+
+    @transaction.atomic
+    def reconstruir_lote(self, inicio, fin):
+        """Recalcula los días en [inicio, fin) y reemplaza sus filas del resumen."""
+        desde = timezone.make_aware(datetime.combine(inicio, time.min))
+        hasta = timezone.make_aware(datetime.combine(fin, time.min))
+
+        ventas = Venta.objects.filter(fecha__gte=desde, fecha__lt=hasta).annotate(
+            dia=TruncDate('fecha')
+        ).values('dia').annotate(
+            total_dia=Sum('total'),
+            cantidad_ventas=Count('id')
+        ).order_by('dia')
+
+        unidades = dict(ItemVenta.objects.filter(
+            venta__fecha__gte=desde, venta__fecha__lt=hasta
+        ).annotate(
+            dia=TruncDate('venta__fecha')
+        ).values('dia').annotate(
+            unidades=Sum('cantidad')
+        ).order_by('dia').values_list('dia', 'unidades'))
+
+        ResumenVentaDiaria.objects.filter(fecha__gte=inicio, fecha__lt=fin).delete()
+        resumenes = ResumenVentaDiaria.objects.bulk_create([
+            ResumenVentaDiaria(
+                fecha=v['dia'],
+                total=v['total_dia'],
+                cantidad_ventas=v['cantidad_ventas'],
+                unidades=unidades.get(v['dia']) or 0,
+            )
+            for v in ventas
+        ])
+        return len(resumenes)
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-17 17:49
+
+from django.db import migrations, models
+from django.db.models import Sum, Count
+from django.db.models.functions import TruncDate
+
+
+def cargar_resumen(apps, schema_editor):
+    """Carga el resumen diario con las ventas ya existentes."""
+    Venta = apps.get_model('ventas', 'Venta')
+    ItemVenta = apps.get_model('ventas', 'ItemVenta')
+    ResumenVentaDiaria = apps.get_model('ventas', 'ResumenVentaDiaria')
+
+    unidades = dict(
+        ItemVenta.objects.annotate(dia=TruncDate('venta__fecha'))
+        .values('dia').annotate(unidades=Sum('cantidad')).order_by('dia')
+        .values_list('dia', 'unidades')
+    )
+    ventas = (
+        Venta.objects.annotate(dia=TruncDate('fecha'))
+        .values('dia').annotate(total_dia=Sum('total'), cantidad_ventas=Count('id')).order_by('dia')
+    )
+    ResumenVentaDiaria.objects.bulk_create([
+        ResumenVentaDiaria(
+            fecha=v['dia'],
+            total=v['total_dia'],
+            cantidad_ventas=v['cantidad_ventas'],
+            unidades=unidades.get(v['dia']) or 0,
+        )
+        for v in ventas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='Fecha')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Total')),
+                ('cantidad_ventas', models.IntegerField(default=0, verbose_name='Cantidad de ventas')),
+                ('unidades', models.IntegerField(default=0, verbose_name='Unidades vendidas')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas Diario',
+                'verbose_name_plural': 'Resúmenes de Ventas Diarios',
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.RunPython(cargar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_indices_consultas'),
+        ('ventas', '0002_resumenventadiaria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from clientes.models import Cliente
-from productos.models import Producto
+from productos.models import Producto, MovimientoStock
+from collections import defaultdict
 import uuid
 
 
@@ -37,6 +39,10 @@ class Venta(models.Model):
         verbose_name = 'Venta'
         verbose_name_plural = 'Ventas'
         ordering = ['-fecha']
+        indexes = [
+            # Rangos de fechas (exportación, resumen diario) y listado por cursor sobre (fecha, id)
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_idx'),
+        ]
 
     def __str__(self):
         """Unicode representation of Venta."""
@@ -51,6 +57,50 @@ class Venta(models.Model):
             self.codigo_venta = f"V-{timestamp}-{random_part}"
         super().save(*args, **kwargs)
     
+    @transaction.atomic
+    def confirmar(self, items, usuario):
+        """
+        Guarda la venta con sus items, descuenta el stock y registra los movimientos.
+
+        La cantidad de consultas no depende del número de items: bloqueo y UPDATE
+        del stock, un INSERT de la venta, un bulk_create para los items y otro
+        para los movimientos, y el UPDATE del resumen diario. Lanza
+        StockInsuficiente si algún producto no alcanza.
+        """
+        cantidades = defaultdict(int)
+        for item in items:
+            # Se toma el precio actual del producto
+            item.precio_unitario = item.producto.precio
+            item.subtotal = item.precio_unitario * item.cantidad
+            cantidades[item.producto_id] += item.cantidad
+
+        Producto.objects.descontar_stock(cantidades)
+
+        self.total = sum(item.subtotal for item in items)
+        self.save()
+
+        for item in items:
+            item.venta = self
+        ItemVenta.objects.bulk_create(items)
+
+        ResumenVentaDiaria.registrar(
+            timezone.localdate(self.fecha), self.total, sum(cantidades.values())
+        )
+
+        ahora = timezone.now()
+        MovimientoStock.objects.bulk_create([
+            MovimientoStock(
+                producto_id=item.producto_id,
+                tipo='salida',
+                cantidad=item.cantidad,
+                motivo=f'Venta {self.codigo_venta}',
+                fecha=ahora,
+                usuario=usuario,
+            )
+            for item in items
+        ])
+        return self.total
+
     def calcular_total(self):
         """Calcula el total de la venta sumando todos los items."""
         total = sum(item.subtotal for item in self.items.all())
@@ -98,17 +148,62 @@ class ItemVenta(models.Model):
         return f"{self.producto.nombre} x {self.cantidad}"
     
     def clean(self):
-        """Valida que haya stock suficiente."""
-        if self.cantidad and self.producto:
-            if self.cantidad <= 0:
-                raise ValidationError("La cantidad debe ser mayor a 0")
-            if self.producto.stock < self.cantidad:
-                raise ValidationError(
-                    f"Stock insuficiente. Disponible: {self.producto.stock}, Solicitado: {self.cantidad}"
-                )
+        """
+        Valida que la cantidad sea positiva.
+
+        El stock se valida para toda la venta en BaseItemVentaFormSet.clean y se
+        garantiza al confirmar con Producto.objects.descontar_stock.
+        """
+        if self.cantidad is not None and self.cantidad <= 0:
+            raise ValidationError("La cantidad debe ser mayor a 0")
     
     def save(self, *args, **kwargs):
         """Calcula el subtotal automáticamente."""
         if self.precio_unitario and self.cantidad:
             self.subtotal = self.precio_unitario * self.cantidad
         super().save(*args, **kwargs)
+
+
+class ResumenVentaDiaria(models.Model):
+    """
+    Totales de ventas por día.
+
+    Se actualiza en la misma transacción en que se confirma cada venta, así el
+    dashboard lee una fila por día en vez de agrupar toda la tabla de ventas.
+    Las ventas cargadas o borradas por otros medios (admin, fixtures) se
+    reflejan corriendo `python manage.py reconstruir_resumen_ventas`.
+    """
+
+    fecha = models.DateField("Fecha", unique=True)
+    total = models.DecimalField("Total", max_digits=14, decimal_places=2, default=0)
+    cantidad_ventas = models.IntegerField("Cantidad de ventas", default=0)
+    unidades = models.IntegerField("Unidades vendidas", default=0)
+
+    class Meta:
+        """Meta definition for ResumenVentaDiaria."""
+        verbose_name = 'Resumen de Ventas Diario'
+        verbose_name_plural = 'Resúmenes de Ventas Diarios'
+        ordering = ['fecha']
+
+    def __str__(self):
+        """Unicode representation of ResumenVentaDiaria."""
+        return f"{self.fecha:%d/%m/%Y} - ${self.total} ({self.cantidad_ventas} ventas)"
+
+    @classmethod
+    def registrar(cls, fecha, total, unidades, cantidad_ventas=1):
+        """Suma una venta al resumen del día con un UPDATE atómico (o crea la fila)."""
+        incrementos = {
+            'total': F('total') + total,
+            'cantidad_ventas': F('cantidad_ventas') + cantidad_ventas,
+            'unidades': F('unidades') + unidades,
+        }
+        if cls.objects.filter(fecha=fecha).update(**incrementos):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    fecha=fecha, total=total, cantidad_ventas=cantidad_ventas, unidades=unidades
+                )
+        except IntegrityError:
+            # Otra venta del mismo día creó la fila entre el UPDATE y el INSERT
+            cls.objects.filter(fecha=fecha).update(**incrementos)
@@ -0,0 +1,13 @@
+"""Invalidación del cache de los listados y del dashboard (inventario/cache_vistas.py) al cambiar ventas."""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventario.cache_vistas import invalidar
+
+from .models import Venta
+
+
+@receiver([post_save, post_delete], sender=Venta)
+def invalidar_ventas(sender, **kwargs):
+    # Una venta descuenta stock: cambian también los listados de productos
+    invalidar('ventas', 'productos')
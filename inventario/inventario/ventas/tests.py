@@ -1,3 +1,715 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from inventario.pruebas import ExportacionTestMixin, IndicesTestMixin, crear_cliente, crear_producto
+from productos.models import Producto, MovimientoStock, StockInsuficiente
+from . import comprobantes
+from .forms import ExportarComprobantesForm, ItemVentaFormSet
+from .models import Venta, ItemVenta, ResumenVentaDiaria
+
+
+def datos_venta(cliente, items):
+    """Arma el POST del formulario de venta; `items` es una lista de (producto, cantidad)."""
+    datos = {
+        "cliente": cliente.pk,
+        "fecha": "2025-11-10T10:00",
+        "items-TOTAL_FORMS": str(len(items)),
+        "items-INITIAL_FORMS": "0",
+        "items-MIN_NUM_FORMS": "1",
+        "items-MAX_NUM_FORMS": "1000",
+    }
+    for i, (producto, cantidad) in enumerate(items):
+        datos[f"items-{i}-producto"] = producto.pk
+        datos[f"items-{i}-cantidad"] = cantidad
+        datos[f"items-{i}-precio_unitario"] = producto.precio
+    return datos
+
+
+class VentaCreateViewTest(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("cajero", password="clave")
+        self.client.force_login(self.user)
+        self.cliente = crear_cliente()
+
+    def test_venta_descuenta_stock_y_registra_movimientos(self):
+        a = crear_producto("A", stock=10)
+        b = crear_producto("B", stock=5)
+        response = self.client.post(
+            reverse("ventas:venta_create"), datos_venta(self.cliente, [(a, 3), (b, 5)])
+        )
+        self.assertRedirects(response, reverse("ventas:venta_list"))
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock, b.stock), (7, 0))
+        venta = Venta.objects.get()
+        self.assertEqual(venta.total, Decimal("800.00"))
+        self.assertEqual(MovimientoStock.objects.filter(tipo="salida").count(), 2)
+
+    def test_stock_insuficiente_revierte_toda_la_venta(self):
+        a = crear_producto("A", stock=10)
+        b = crear_producto("B", stock=3)
+        # Cada fila por separado alcanza, pero entre las dos superan el stock de B
+        response = self.client.post(
+            reverse("ventas:venta_create"), datos_venta(self.cliente, [(a, 3), (b, 2), (b, 2)])
+        )
+        self.assertEqual(response.status_code, 200)
+        a.refresh_from_db()
+        b.refresh_from_db()
+        self.assertEqual((a.stock, b.stock), (10, 3))
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(MovimientoStock.objects.exists())
+
+
+class ProductosApiTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+        self.mate = crear_producto("MAT-01", stock=4, precio="1500.50")
+        self.yerba = crear_producto("YER-01", stock=0)
+
+    def test_autocompletado_por_prefijo_de_sku_o_nombre(self):
+        url = reverse("ventas:buscar_productos")
+        resultados = self.client.get(url, {"q": "mat"}).json()["resultados"]
+        self.assertEqual(resultados, [{
+            "id": self.mate.pk, "sku": "MAT-01", "nombre": "Producto MAT-01",
+            "precio": "1500.50", "stock": 4,
+        }])
+        self.assertEqual(len(self.client.get(url, {"q": "Producto"}).json()["resultados"]), 1)
+        # Sin stock no se ofrece, y sin texto no se busca
+        self.assertEqual(self.client.get(url, {"q": "YER"}).json()["resultados"], [])
+        self.assertEqual(self.client.get(url).json()["resultados"], [])
+
+    def test_precios_en_lote(self):
+        url = reverse("ventas:precios_productos")
+        with self.assertNumQueries(3):  # sesión + usuario + productos
+            data = self.client.get(url, {"ids": f"{self.mate.pk},{self.yerba.pk},x,999"}).json()
+        self.assertEqual(
+            {k: (v["precio"], v["stock"]) for k, v in data["productos"].items()},
+            {str(self.mate.pk): ("1500.50", 4), str(self.yerba.pk): ("100.00", 0)},
+        )
+
+    def test_formulario_no_incluye_el_catalogo(self):
+        response = self.client.get(reverse("ventas:venta_create"))
+        self.assertNotContains(response, "MAT-01")
+
+
+class ItemVentaFormSetTest(TestCase):
+
+    def test_consultas_no_crecen_con_las_filas(self):
+        cliente = crear_cliente()
+        productos = [crear_producto(f"SKU{i}") for i in range(5)]
+        for filas in (1, 30):
+            datos = datos_venta(cliente, [(productos[i % 5], 1) for i in range(filas)])
+            # Una sola consulta de productos para validar y renderizar todas las filas
+            with self.assertNumQueries(1):
+                formset = ItemVentaFormSet(datos, instance=Venta())
+                self.assertTrue(formset.is_valid())
+                html = str(formset)
+            # Cada fila trae solo la opción vacía y el producto elegido, no el catálogo
+            self.assertEqual(html.count("<option"), filas * 2)
+
+    def test_suma_el_mismo_producto_en_varias_filas(self):
+        cliente = crear_cliente()
+        a = crear_producto("A", stock=3)
+        b = crear_producto("B", stock=40)
+        # A: 2 + 2 > 3; B: 5 + 27 <= 40
+        filas = [(a, 2), (b, 5), (a, 2)] + [(b, 1)] * 27
+        with self.assertNumQueries(1):
+            formset = ItemVentaFormSet(datos_venta(cliente, filas), instance=Venta())
+            self.assertFalse(formset.is_valid())
+        # Se marcan solo las filas del producto que no alcanza
+        self.assertEqual(
+            [i for i, form in enumerate(formset.forms) if form.errors], [0, 2]
+        )
+        self.assertIn("Solicitado en la venta: 4", formset.forms[0].errors["cantidad"][0])
+        filas = [(a, 2), (b, 5), (a, 1), (b, 5)]
+        self.assertTrue(ItemVentaFormSet(datos_venta(cliente, filas), instance=Venta()).is_valid())
+
+    def test_producto_sin_stock_no_es_opcion_valida(self):
+        cliente = crear_cliente()
+        agotado = crear_producto("AGOTADO", stock=0)
+        formset = ItemVentaFormSet(datos_venta(cliente, [(agotado, 1)]), instance=Venta())
+        self.assertFalse(formset.is_valid())
+        self.assertIn("producto", formset.forms[0].errors)
+
+
+class ConfirmarVentaTest(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+
+    def confirmar(self, productos):
+        venta = Venta(cliente=self.cliente)
+        items = [ItemVenta(producto=p, cantidad=2) for p in productos]
+        venta.confirmar(items, usuario="cajero")
+        return venta
+
+    def test_cantidad_de_consultas_no_depende_de_los_items(self):
+        productos = [crear_producto(f"SKU{i}") for i in range(50)]
+        # 2 SAVEPOINT + bloqueo + UPDATE de stock + INSERT venta + bulk_create
+        # de items + UPDATE del resumen diario + bulk_create de movimientos
+        # + 2 RELEASE SAVEPOINT (la primera venta del día además crea el resumen)
+        self.confirmar(productos[:1])
+        with self.assertNumQueries(10):
+            self.confirmar(productos[:1])
+        with self.assertNumQueries(10):
+            venta = self.confirmar(productos)
+
+        self.assertEqual(venta.items.count(), 50)
+        self.assertEqual(venta.total, Decimal("10000.00"))
+        self.assertEqual(
+            MovimientoStock.objects.filter(motivo=f"Venta {venta.codigo_venta}").count(), 50
+        )
+        self.assertEqual(
+            set(Producto.objects.values_list("stock", flat=True)), {4, 8}
+        )
+
+
+class ResumenVentaDiariaTest(TestCase):
+
+    def setUp(self):
+        self.cliente = crear_cliente()
+        self.producto = crear_producto("A", stock=100)
+
+    def vender(self, fecha, cantidad):
+        venta = Venta(cliente=self.cliente, fecha=fecha)
+        venta.confirmar([ItemVenta(producto=self.producto, cantidad=cantidad)], usuario="cajero")
+        return venta
+
+    def test_confirmar_actualiza_el_resumen_del_dia(self):
+        dia = datetime(2025, 11, 10, 15, 0, tzinfo=dt_timezone.utc)
+        self.vender(dia, 2)
+        self.vender(dia + timedelta(hours=1), 3)
+        self.vender(dia + timedelta(days=1), 1)
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.values_list("fecha", "total", "cantidad_ventas", "unidades")),
+            [
+                (dia.date(), Decimal("500.00"), 2, 5),
+                (dia.date() + timedelta(days=1), Decimal("100.00"), 1, 1),
+            ],
+        )
+
+    def test_reconstruir_desde_el_historial(self):
+        dia = datetime(2025, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        for i in range(40):
+            self.vender(dia + timedelta(days=i * 3), 1 + i % 2)
+        esperado = list(ResumenVentaDiaria.objects.values_list("fecha", "total", "cantidad_ventas", "unidades"))
+        ResumenVentaDiaria.objects.update(total=0, cantidad_ventas=0, unidades=0)
+
+        call_command("reconstruir_resumen_ventas", "--dias-por-lote", "7", stdout=StringIO())
+
+        self.assertEqual(
+            list(ResumenVentaDiaria.objects.values_list("fecha", "total", "cantidad_ventas", "unidades")),
+            esperado,
+        )
+
+    def test_dashboard_lee_solo_el_resumen(self):
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+        for i in range(60):
+            self.vender(timezone.now() - timedelta(days=i), 1)
+        for dias, esperado in ((30, 30), (90, 60), (365, 60)):
+            with self.assertNumQueries(3):  # sesión + usuario + resumen
+                response = self.client.get(reverse("ventas:dashboard"), {"dias": dias})
+            self.assertEqual(response.context["cantidad_mes"], esperado)
+
+    def test_dashboard_cacheado_hasta_la_proxima_venta(self):
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+        self.vender(timezone.now(), 1)
+        self.client.get(reverse("ventas:dashboard"))
+        with self.assertNumQueries(2):  # sesión + usuario
+            response = self.client.get(reverse("ventas:dashboard"), {"dias": "abc"})
+        self.assertEqual(response.context["cantidad_mes"], 1)
+        self.assertEqual(response.context["rangos"], [7, 30, 90, 365])
+
+        self.vender(timezone.now(), 2)
+        response = self.client.get(reverse("ventas:dashboard"))
+        self.assertEqual(response.context["cantidad_mes"], 2)
+
+
+def storages_en(directorio):
+    """STORAGES con los comprobantes guardados en `directorio`."""
+    return {
+        **settings.STORAGES,
+        "comprobantes": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": directorio},
+        },
+    }
+
+
+class ComprobanteTestMixin:
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(STORAGES=storages_en(self.media))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+        self.venta = Venta(cliente=crear_cliente())
+        self.producto = crear_producto("A")
+        self.venta.confirmar([ItemVenta(producto=self.producto, cantidad=2)], usuario="cajero")
+        self.url = reverse("ventas:venta_pdf", args=[self.venta.pk])
+
+
+class ComprobantePdfTest(ComprobanteTestMixin, TestCase):
+
+    def test_se_genera_una_vez_y_luego_se_sirve_del_archivo(self):
+        with mock.patch.object(comprobantes, "renderizar_pdf", wraps=comprobantes.renderizar_pdf) as render:
+            primera = self.client.get(self.url)
+            segunda = self.client.get(self.url)
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(primera["Content-Type"], "application/pdf")
+        self.assertTrue(primera.content.startswith(b"%PDF"))
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(primera["ETag"], segunda["ETag"])
+
+    def test_if_none_match_devuelve_304(self):
+        etag = self.client.get(self.url)["ETag"]
+        with mock.patch.object(comprobantes, "renderizar_pdf") as render:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        render.assert_not_called()
+
+    def test_se_guarda_fuera_de_media(self):
+        huella = self.client.get(self.url)["ETag"].strip('"')
+        self.assertTrue(os.path.exists(os.path.join(self.media, comprobantes.ruta_comprobante(huella))))
+        with override_settings(STORAGES=storages_en(os.path.join(settings.BASE_DIR, "privado"))):
+            ubicacion = comprobantes.storage_comprobantes().location
+        self.assertFalse(ubicacion.startswith(str(settings.MEDIA_ROOT)))
+
+    def test_la_huella_cambia_si_cambian_los_datos_impresos(self):
+        items = list(self.venta.items.select_related("producto"))
+        huella = comprobantes.huella_venta(self.venta, items)
+        items[0].producto.nombre = "Otro nombre"
+        self.assertNotEqual(comprobantes.huella_venta(self.venta, items), huella)
+
+
+@override_settings(COMPROBANTES_PDF_AL_CONFIRMAR=True)
+class PregenerarComprobanteTest(TransactionTestCase):
+    """El comprobante se genera en segundo plano después del commit de la venta."""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(STORAGES=storages_en(self.media))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+
+    def test_se_genera_al_confirmar_la_venta(self):
+        producto = crear_producto("A")
+        response = self.client.post(reverse("ventas:venta_create"), datos_venta(crear_cliente(), [(producto, 1)]))
+        self.assertRedirects(response, reverse("ventas:venta_list"))
+        comprobantes.cola_comprobantes.esperar()
+
+        venta = Venta.objects.get()
+        huella = comprobantes.huella_venta(venta, list(venta.items.select_related("producto")))
+        self.assertTrue(comprobantes.storage_comprobantes().exists(comprobantes.ruta_comprobante(huella)))
+        # La descarga lee el archivo ya generado
+        with mock.patch.object(comprobantes, "renderizar_pdf") as render:
+            self.assertEqual(self.client.get(reverse("ventas:venta_pdf", args=[venta.pk])).status_code, 200)
+        render.assert_not_called()
+
+    def test_los_errores_van_al_log(self):
+        with self.assertLogs("ventas.comprobantes", "ERROR") as log:
+            comprobantes.pregenerar_comprobante(0)
+            comprobantes.cola_comprobantes.esperar()
+        self.assertIn("venta 0", log.output[0])
+
+
+@override_settings(COMPROBANTES_PROCESOS=2)
+class LimiteComprobantesTest(ComprobanteTestMixin, TestCase):
+
+    @override_settings(COMPROBANTES_PDF_CONCURRENCIA=1, COMPROBANTES_PDF_COLA=0, COMPROBANTES_PDF_REINTENTO=7)
+    def test_rechaza_con_503_si_no_hay_lugar(self):
+        antes = comprobantes.limite_comprobantes.metricas()
+        with comprobantes.limite_comprobantes.turno():
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+        despues = comprobantes.limite_comprobantes.metricas()
+        self.assertEqual(despues["rechazados"], antes["rechazados"] + 1)
+        # Con el lugar libre se genera normalmente
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(comprobantes.limite_comprobantes.metricas()["completados"], despues["completados"] + 1)
+
+    @override_settings(COMPROBANTES_PDF_CONCURRENCIA=1, COMPROBANTES_PDF_COLA=1, COMPROBANTES_PDF_ESPERA=5)
+    def test_espera_en_la_cola_hasta_que_se_libera_un_lugar(self):
+        limite = comprobantes.limite_comprobantes
+        antes = limite.metricas()
+        liberar = threading.Event()
+
+        def ocupar():
+            with limite.turno():
+                liberar.wait(5)
+
+        hilo = threading.Thread(target=ocupar)
+        hilo.start()
+        while limite.metricas()["en_curso"] == 0:
+            time.sleep(0.01)
+        threading.Timer(0.2, liberar.set).start()
+        response = self.client.get(self.url)
+        hilo.join()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(limite.metricas()["encolados"], antes["encolados"] + 1)
+
+    @override_settings(COMPROBANTES_PDF_CONCURRENCIA=1, COMPROBANTES_PDF_COLA=0)
+    def test_los_pdf_guardados_no_pasan_por_el_limite(self):
+        self.client.get(self.url)
+        with comprobantes.limite_comprobantes.turno():
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+@override_settings(COMPROBANTES_PROCESOS=2)
+class ExportarComprobantesTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(STORAGES=storages_en(self.media))
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.client.force_login(get_user_model().objects.create_user("cajero", password="clave"))
+        self.cliente = crear_cliente()
+        otro = crear_cliente("40000000")
+        producto = crear_producto("A", stock=100)
+        dia = datetime(2025, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        self.codigos = []
+        for i in range(6):
+            venta = Venta(cliente=otro if i == 5 else self.cliente, fecha=dia + timedelta(days=i))
+            venta.confirmar([ItemVenta(producto=producto, cantidad=1)], usuario="cajero")
+            self.codigos.append(venta.codigo_venta)
+
+    def nombres_zip(self, contenido):
+        with zipfile.ZipFile(BytesIO(contenido)) as archivo:
+            self.assertTrue(all(archivo.read(n).startswith(b"%PDF") for n in archivo.namelist()))
+            return archivo.namelist()
+
+    def test_zip_por_rango_de_fechas(self):
+        response = self.client.get(
+            reverse("ventas:exportar_comprobantes"), {"desde": "2025-10-02", "hasta": "2025-10-04"}
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(
+            self.nombres_zip(b"".join(response.streaming_content)),
+            [f"comprobante_venta_{codigo}.pdf" for codigo in self.codigos[1:4]],
+        )
+
+    def test_rango_de_fechas_sobre_la_columna(self):
+        form = ExportarComprobantesForm({"desde": "2025-10-02", "hasta": "2025-10-04"})
+        self.assertTrue(form.is_valid())
+        ventas = form.ventas()
+        self.assertEqual([venta.codigo_venta for venta in ventas], self.codigos[1:4])
+        # Sin funciones sobre fecha, para que la consulta pueda usar su índice
+        sql = str(ventas.query)
+        self.assertNotIn("cast_date", sql)
+        self.assertIn('"ventas_venta"."fecha" >=', sql)
+        self.assertIn('"ventas_venta"."fecha" <', sql)
+
+    def test_zip_por_cliente_reutiliza_los_pdf_guardados(self):
+        url = reverse("ventas:exportar_comprobantes")
+        primera = b"".join(self.client.get(url, {"cliente": self.cliente.pk}).streaming_content)
+        with mock.patch.object(comprobantes, "pool_procesos") as pool_procesos:
+            segunda = b"".join(self.client.get(url, {"cliente": self.cliente.pk}).streaming_content)
+        pool_procesos.assert_not_called()
+        self.assertEqual(self.nombres_zip(primera), self.nombres_zip(segunda))
+        self.assertEqual(len(self.nombres_zip(primera)), 5)
+
+    @override_settings(COMPROBANTES_PDF_CONCURRENCIA=1, COMPROBANTES_PDF_COLA=0)
+    def test_los_pdf_del_zip_pasan_por_el_limite(self):
+        limite = comprobantes.limite_comprobantes
+        antes = limite.metricas()
+        # Con el único lugar ocupado por un pedido, la exportación espera en vez de fallar
+        liberar = threading.Event()
+
+        def ocupar():
+            with limite.turno():
+                liberar.wait(5)
+
+        hilo = threading.Thread(target=ocupar)
+        hilo.start()
+        while limite.metricas()["en_curso"] == 0:
+            time.sleep(0.01)
+        threading.Timer(0.2, liberar.set).start()
+        response = self.client.get(reverse("ventas:exportar_comprobantes"), {"cliente": self.cliente.pk})
+        self.assertEqual(len(self.nombres_zip(b"".join(response.streaming_content))), 5)
+        hilo.join()
+
+        # El lugar de cada PDF se devuelve cuando el pool termina de avisar que está listo
+        for _ in range(100):
+            despues = limite.metricas()
+            if despues["en_curso"] == antes["en_curso"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(despues["en_curso"], antes["en_curso"])
+        self.assertEqual(despues["de_fondo"], antes["de_fondo"] + 5)
+        # Los 5 PDF del ZIP más el pedido que ocupaba el lugar
+        self.assertEqual(despues["completados"], antes["completados"] + 6)
+        self.assertEqual(despues["rechazados"], antes["rechazados"])
+
+    @override_settings(COMPROBANTES_PDF_REINTENTO=7)
+    def test_una_exportacion_a_la_vez(self):
+        url = reverse("ventas:exportar_comprobantes")
+        en_curso = self.client.get(url, {"cliente": self.cliente.pk})
+        response = self.client.get(url, {"cliente": self.cliente.pk})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "7")
+
+        # Al terminar la primera se libera el lugar
+        self.assertEqual(len(self.nombres_zip(b"".join(en_curso.streaming_content))), 5)
+        response = self.client.get(url, {"cliente": self.cliente.pk})
+        self.assertEqual(len(self.nombres_zip(b"".join(response.streaming_content))), 5)
+
+    def test_filtros_invalidos(self):
+        url = reverse("ventas:exportar_comprobantes")
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {"desde": "2025-10-05", "hasta": "2025-10-01"}).status_code, 400)
+
+    def test_comando(self):
+        salida = f"{self.media}/comprobantes.zip"
+        call_command("exportar_comprobantes", salida, "--desde", "2025-10-05", "--procesos", "1", stdout=StringIO())
+        with open(salida, "rb") as archivo:
+            self.assertEqual(
+                self.nombres_zip(archivo.read()),
+                [f"comprobante_venta_{codigo}.pdf" for codigo in self.codigos[4:]],
+            )
+
+
+class VentaListPaginacionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("cajero", password="clave")
+        cliente = crear_cliente()
+        dia = datetime(2025, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        # Varias ventas por fecha para probar el desempate por pk
+        Venta.objects.bulk_create([
+            Venta(cliente=cliente, fecha=dia + timedelta(hours=i // 3), codigo_venta=f"V-{i:03d}")
+            for i in range(25)
+        ])
+        cls.orden = list(Venta.objects.order_by("-fecha", "-pk").values_list("codigo_venta", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def pagina(self, cursor=None):
+        response = self.client.get(reverse("ventas:venta_list"), {"cursor": cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["paginacion_cursor"])
+        return response.context["page_obj"]
+
+    def codigos(self, pagina):
+        return [venta.codigo_venta for venta in pagina]
+
+    def test_recorre_todas_las_paginas_hacia_adelante_y_atras(self):
+        paginas = [self.pagina()]
+        self.assertFalse(paginas[0].has_previous())
+        while paginas[-1].has_next():
+            paginas.append(self.pagina(paginas[-1].cursor_siguiente))
+        self.assertEqual([len(p) for p in paginas], [10, 10, 5])
+        self.assertEqual(sum((self.codigos(p) for p in paginas), []), self.orden)
+
+        anterior = self.pagina(paginas[-1].cursor_anterior)
+        self.assertEqual(self.codigos(anterior), self.codigos(paginas[1]))
+        self.assertTrue(anterior.has_next())
+        primera = self.pagina(anterior.cursor_anterior)
+        self.assertEqual(self.codigos(primera), self.orden[:10])
+        self.assertFalse(primera.has_previous())
+
+    def test_ultima_pagina(self):
+        response = self.client.get(reverse("ventas:venta_list"))
+        ultima = self.pagina(response.context["paginator"].cursor_ultima())
+        self.assertEqual(self.codigos(ultima), self.orden[-10:])
+        self.assertFalse(ultima.has_next())
+        self.assertTrue(ultima.has_previous())
+
+    def test_pagina_profunda_cuesta_lo_mismo(self):
+        segunda = self.pagina().cursor_siguiente
+        tercera = self.pagina(segunda).cursor_siguiente
+        url = reverse("ventas:venta_list")
+        # sesión, usuario y una sola consulta de ventas, sin COUNT ni OFFSET
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(3) as consultas:
+            self.client.get(url, {"cursor": tercera})
+        self.assertNotIn("OFFSET", consultas.captured_queries[-1]["sql"])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse("ventas:venta_list"), {"cursor": "no-es-un-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class IndicesConsultasTest(IndicesTestMixin, TestCase):
+    """Las consultas de ventas más usadas se resuelven con índices aunque la tabla sea grande."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Cliente.objects.bulk_create([
+            Cliente(nombre=f"Nombre {i}", apellido=f"Apellido {i}", numero_documento=f"D{i}",
+                    email=f"c{i}@example.com", telefono="1", direccion="-")
+            for i in range(300)
+        ])
+        clientes = list(Cliente.objects.values_list("pk", flat=True))
+        inicio = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        Venta.objects.bulk_create([
+            Venta(cliente_id=clientes[i % len(clientes)], codigo_venta=f"V-{i}",
+                  fecha=inicio + timedelta(hours=i))
+            for i in range(6000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def test_ventas_por_rango_de_fechas(self):
+        desde = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+        ventas = Venta.objects.filter(fecha__gte=desde, fecha__lt=desde + timedelta(days=7))
+        self.assertUsaIndices(ventas, "ventas_venta", sin_ordenar=False)
+
+    def test_paginas_por_cursor(self):
+        venta = Venta.objects.get(codigo_venta="V-3000")
+        self.assertPaginaPorCursorUsaIndice(Venta.objects.all(), ["-fecha"], venta)
+
+
+class ExportarDatosTest(ExportacionTestMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("cajero", password="clave")
+        cliente = crear_cliente()
+        cls.a = crear_producto("A", stock=100)
+        cls.b = crear_producto("B", stock=100)
+        dia = datetime(2025, 10, 1, 12, 0, tzinfo=dt_timezone.utc)
+        for i in range(4):
+            venta = Venta(cliente=cliente, fecha=dia + timedelta(days=i))
+            items = [ItemVenta(producto=cls.a, cantidad=1), ItemVenta(producto=cls.a, cantidad=2)]
+            if i % 2:
+                items.append(ItemVenta(producto=cls.b, cantidad=1))
+            venta.confirmar(items, usuario="cajero")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_ventas_csv_con_filtros(self):
+        filas = self.filas_csv(self.descargar("ventas", "ventas", desde="2025-10-02", hasta="2025-10-03"))
+        self.assertEqual(filas[0], ["Código", "Fecha", "Documento", "Apellido", "Nombre", "Total"])
+        self.assertEqual(len(filas), 3)
+
+        # Cada venta una sola vez aunque tenga varios items del producto
+        filas = self.filas_csv(self.descargar("ventas", "ventas", producto="a"))
+        self.assertEqual(len(filas), 5)
+        filas = self.filas_csv(self.descargar("ventas", "ventas", producto="B"))
+        self.assertEqual(len(filas), 3)
+
+    def test_items_xlsx(self):
+        hojas, filas = self.filas_xlsx(self.descargar("ventas", "items", formato="xlsx", producto="B"))
+        self.assertEqual(hojas, ["xl/worksheets/sheet1.xml"])
+        self.assertEqual(filas[0][:3], ["Venta", "Fecha", "SKU"])
+        self.assertEqual([fila[2] for fila in filas[1:]], ["B", "B"])
+
+    def test_errores(self):
+        self.assertEqual(self.client.get(reverse("ventas:exportar", args=["otra"])).status_code, 404)
+        response = self.client.get(reverse("ventas:exportar", args=["ventas"]), {"desde": "2025-10-05", "hasta": "2025-10-01"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comando(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            call_command("exportar_datos", "items", f"{carpeta}/items.xlsx", "--desde", "2025-10-04", stdout=StringIO())
+            with open(f"{carpeta}/items.xlsx", "rb") as archivo:
+                _, filas = self.filas_xlsx(archivo.read())
+        self.assertEqual(len(filas), 1 + 3)
+
+
+class BenchmarkVentasConcurrentesTest(TestCase):
+
+    def test_usa_bases_temporales(self):
+        salida = StringIO()
+        call_command(
+            "benchmark_ventas_concurrentes", procesos=2, segundos=0.3, productos=5, items=2, stdout=salida
+        )
+        concurrente = next(linea for linea in salida.getvalue().splitlines() if "concurrente" in linea)
+        self.assertEqual(concurrente.split()[2], "0")  # sin "database is locked"
+        self.assertFalse(Venta.objects.exists())
+
+
+class VentasConcurrentesTest(TransactionTestCase):
+    """Muchos cajeros vendiendo a la vez los mismos productos nunca dejan stock negativo."""
+
+    HILOS = 4
+    VENTAS_POR_HILO = 40
+    STOCK_INICIAL = 100
+
+    def test_sin_sobreventa_bajo_concurrencia(self):
+        calientes = [crear_producto(f"HOT{i}", stock=self.STOCK_INICIAL) for i in range(3)]
+        pks = [p.pk for p in calientes]
+        resultados = {"ok": 0, "sin_stock": 0, "bloqueada": 0, "unidades": 0}
+        candado = threading.Lock()
+
+        def cajero(n):
+            try:
+                for i in range(self.VENTAS_POR_HILO):
+                    # Cada cajero pide los productos en distinto orden
+                    orden = pks[n % len(pks):] + pks[:n % len(pks)]
+                    cantidades = {pk: 1 + (i + j) % 2 for j, pk in enumerate(orden)}
+                    while True:
+                        try:
+                            Producto.objects.descontar_stock(cantidades)
+                            clave = "ok"
+                        except StockInsuficiente:
+                            clave = "sin_stock"
+                        except OperationalError as error:
+                            if "database is locked" in str(error):
+                                # Se venció el busy timeout: la venta se pierde
+                                clave = "bloqueada"
+                                break
+                            # La base de prueba en memoria bloquea tablas enteras
+                            # sin esperar ("database table is locked"): se reintenta
+                            time.sleep(random.uniform(0, 0.005))
+                            continue
+                        break
+                    with candado:
+                        resultados[clave] += 1
+                        if clave == "ok":
+                            resultados["unidades"] += sum(cantidades.values())
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero, args=(n,)) for n in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        total = self.HILOS * self.VENTAS_POR_HILO
+        self.assertEqual(resultados["bloqueada"], 0)
+        self.assertEqual(resultados["ok"] + resultados["sin_stock"], total)
+        # 300 unidades y cada venta se lleva 4 o 5: se agota el stock sin pasarse
+        self.assertGreater(resultados["sin_stock"], 0)
+        stocks = Producto.objects.filter(pk__in=pks).values_list("stock", flat=True)
+        self.assertTrue(all(stock >= 0 for stock in stocks))
+        vendido = self.STOCK_INICIAL * len(pks) - sum(stocks)
+        self.assertEqual(vendido, resultados["unidades"])
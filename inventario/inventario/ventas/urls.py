@@ -9,4 +9,9 @@ urlpatterns = [
     path('crear/', views.VentaCreateView.as_view(), name='venta_create'),
     path('<int:pk>/', views.VentaDetailView.as_view(), name='venta_detail'),
     path('<int:pk>/pdf/', views.generar_pdf_venta, name='venta_pdf'),
+    path('comprobantes/', views.exportar_comprobantes, name='exportar_comprobantes'),
+    path('comprobantes/metricas/', views.metricas_comprobantes, name='metricas_comprobantes'),
+    path('exportar/<str:tipo>/', views.exportar, name='exportar'),
+    path('productos/buscar/', views.buscar_productos, name='buscar_productos'),
+    path('productos/precios/', views.precios_productos, name='precios_productos'),
 ]
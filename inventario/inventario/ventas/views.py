@@ -5,24 +5,34 @@ from django.contrib import messages
 from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import render_to_string
-from django.db.models import Sum, Count
-from django.db.models.functions import TruncDate
-from xhtml2pdf import pisa
-from io import BytesIO
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.conf import settings
+from django.db.models import Q
 from datetime import timedelta
-from .models import Venta, ItemVenta
-from .forms import VentaForm, ItemVentaFormSet
-from productos.models import MovimientoStock
+from .models import Venta, ItemVenta, ResumenVentaDiaria
+from .forms import VentaForm, ItemVentaFormSet, ExportarComprobantesForm
+from .comprobantes import (
+    ComprobantesSaturados, ErrorComprobante, huella_venta, limite_comprobantes, limite_exportaciones,
+    obtener_comprobante, pregenerar_comprobante, zip_comprobantes,
+)
+from productos.models import Producto, StockInsuficiente
+from inventario.paginacion import PaginacionCursorMixin
+from inventario.cache_vistas import obtener
+from inventario.replicas import LecturaEnReplicaMixin, en_replica
+from inventario.admision import StreamConTurno
+from inventario.exportacion import vista_exportacion
+from .exportacion import EXPORTACIONES
 
 
-class VentaListView(LoginRequiredMixin, ListView):
+class VentaListView(LoginRequiredMixin, LecturaEnReplicaMixin, PaginacionCursorMixin, ListView):
     """Muestra una lista de todas las ventas."""
     model = Venta
     template_name = "ventas/venta_list.html"
     context_object_name = "ventas"
     paginate_by = 10
+    orden_cursor = ['-fecha']
 
     def get_queryset(self):
         """Ordena por fecha descendente."""
@@ -64,58 +74,27 @@ class VentaCreateView(LoginRequiredMixin, CreateView):
         formset = context['formset']
 
         if formset.is_valid():
-            # Guardar la venta
             self.object = form.save(commit=False)
-            self.object.save()
-
-            # Guardar los items
             formset.instance = self.object
             items = formset.save(commit=False)
 
-            total_venta = 0
-
-            # Procesar cada item
-            for item in items:
-                # Obtener el precio actual del producto
-                item.precio_unitario = item.producto.precio
-                item.subtotal = item.cantidad * item.precio_unitario
-                
-                # Validar stock
-                if item.producto.stock < item.cantidad:
-                    messages.error(
-                        self.request,
-                        f"Stock insuficiente para {item.producto.nombre}. Disponible: {item.producto.stock}"
-                    )
-                    transaction.set_rollback(True)
-                    return self.form_invalid(form)
-                
-                # Descontar stock
-                item.producto.stock -= item.cantidad
-                item.producto.save()
-
-                # Registrar movimiento de stock
-                MovimientoStock.objects.create(
-                    producto=item.producto,
-                    tipo='salida',
-                    cantidad=item.cantidad,
-                    motivo=f'Venta {self.object.codigo_venta}',
-                    fecha=timezone.now(),
+            # Guarda venta, items, stock y movimientos con una cantidad fija de
+            # consultas; las filas de producto se bloquean en orden de pk y el
+            # UPDATE solo resta donde alcanza el stock, así dos cajeros vendiendo
+            # el mismo producto no pueden dejarlo en negativo
+            try:
+                total_venta = self.object.confirmar(
+                    items,
                     usuario=self.request.user.username if self.request.user.is_authenticated else 'Sistema'
                 )
+            except StockInsuficiente as e:
+                for mensaje in e.messages:
+                    messages.error(self.request, mensaje)
+                return self.form_invalid(form)
 
-                # Guardar el item
-                item.save()
-                
-                # Acumular total
-                total_venta += item.subtotal
-
-            # Procesar items marcados para eliminación
-            for item in formset.deleted_objects:
-                item.delete()
-
-            # Actualizar el total de la venta
-            self.object.total = total_venta
-            self.object.save()
+            if settings.COMPROBANTES_PDF_AL_CONFIRMAR:
+                venta_pk = self.object.pk
+                transaction.on_commit(lambda: pregenerar_comprobante(venta_pk))
 
             messages.success(
                 self.request,
@@ -128,63 +107,162 @@ class VentaCreateView(LoginRequiredMixin, CreateView):
             return self.form_invalid(form)
 
 
+# Límites de las APIs de productos usadas por el formulario de venta
+LIMITE_AUTOCOMPLETADO = 20
+LIMITE_PRECIOS = 200
+
+
+def _producto_json(producto):
+    return {
+        'id': producto['id'],
+        'sku': producto['sku'],
+        'nombre': producto['nombre'],
+        'precio': str(producto['precio']),
+        'stock': producto['stock'],
+    }
+
+
+@login_required
+def buscar_productos(request):
+    """Autocompletado de productos con stock por prefijo de SKU o nombre."""
+    q = request.GET.get('q', '').strip()
+    if not q:
+        return JsonResponse({'resultados': []})
+
+    productos = Producto.objects.filter(
+        Q(sku__istartswith=q) | Q(nombre__istartswith=q),
+        stock__gt=0,
+    ).order_by('nombre').values('id', 'sku', 'nombre', 'precio', 'stock')[:LIMITE_AUTOCOMPLETADO]
+
+    return JsonResponse({'resultados': [_producto_json(p) for p in productos]})
+
+
+@login_required
+def precios_productos(request):
+    """Devuelve precio y stock actuales para una lista de ids (?ids=1,2,3)."""
+    ids = [i for i in request.GET.get('ids', '').split(',') if i.strip().isdigit()]
+    ids = [int(i) for i in ids[:LIMITE_PRECIOS]]
+
+    productos = Producto.objects.filter(pk__in=ids).values('id', 'sku', 'nombre', 'precio', 'stock')
+
+    return JsonResponse({'productos': {str(p['id']): _producto_json(p) for p in productos}})
+
+
 def generar_pdf_venta(request, pk):
-    """Genera un PDF del comprobante de venta."""
-    venta = get_object_or_404(Venta, pk=pk)
-    items = venta.items.select_related('producto').all()
-    
-    # Renderizar el template HTML
-    html_string = render_to_string('ventas/comprobante_pdf.html', {
-        'venta': venta,
-        'items': items,
-        'fecha_actual': timezone.now()
-    })
-    
-    # Crear el PDF
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html_string.encode("UTF-8")), result)
-    
-    if not pdf.err:
-        # Crear respuesta HTTP con el PDF
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="comprobante_venta_{venta.codigo_venta}.pdf"'
+    """
+    Descarga el PDF del comprobante de venta.
+
+    El PDF se genera una sola vez y queda guardado por la huella de la venta;
+    el navegador recibe esa huella como ETag y con If-None-Match obtiene un 304.
+    """
+    venta = get_object_or_404(Venta.objects.select_related('cliente'), pk=pk)
+    items = list(venta.items.select_related('producto'))
+
+    huella = huella_venta(venta, items)
+    etag = f'"{huella}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
         return response
-    
-    return HttpResponse('Error al generar PDF', status=500)
+
+    try:
+        huella, contenido = obtener_comprobante(venta, items, huella)
+    except ComprobantesSaturados:
+        response = HttpResponse('Hay demasiados comprobantes generándose, intente nuevamente en unos segundos', status=503)
+        response['Retry-After'] = str(settings.COMPROBANTES_PDF_REINTENTO)
+        return response
+    except ErrorComprobante:
+        return HttpResponse('Error al generar PDF', status=500)
+
+    response = HttpResponse(contenido, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="comprobante_venta_{venta.codigo_venta}.pdf"'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
+@user_passes_test(lambda user: user.is_staff)
+def metricas_comprobantes(request):
+    """Contadores del control de admisión de PDF (y de exportaciones en ZIP) de este proceso."""
+    return JsonResponse({**limite_comprobantes.metricas(), 'exportaciones': limite_exportaciones.metricas()})
+
+
+@login_required
+@en_replica
+def exportar_comprobantes(request):
+    """
+    Descarga en un ZIP los comprobantes de las ventas de un rango de fechas o de un cliente.
+
+    Hay COMPROBANTES_EXPORTACION_CONCURRENCIA exportaciones a la vez por proceso; las
+    demás reciben 503 (para exportaciones grandes está el comando exportar_comprobantes).
+    """
+    form = ExportarComprobantesForm(request.GET)
+    if not form.is_valid():
+        errores = [error for lista in form.errors.values() for error in lista]
+        return HttpResponseBadRequest(" ".join(errores))
+
+    try:
+        zip_stream = StreamConTurno(limite_exportaciones, zip_comprobantes(form.ventas()))
+    except ComprobantesSaturados:
+        response = HttpResponse('Ya hay una exportación de comprobantes en curso, intente nuevamente en unos segundos', status=503)
+        response['Retry-After'] = str(settings.COMPROBANTES_PDF_REINTENTO)
+        return response
+
+    response = StreamingHttpResponse(zip_stream, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="comprobantes_{timezone.now():%Y%m%d%H%M%S}.zip"'
+    return response
+
+
+@login_required
+@en_replica
+def exportar(request, tipo):
+    """Descarga ventas o items de venta en CSV o XLSX (?formato=, desde, hasta, producto)."""
+    return vista_exportacion(request, EXPORTACIONES, tipo)
+
+
+# Rangos (en días) ofrecidos en el dashboard; se acepta cualquier valor hasta el máximo
+RANGOS_DASHBOARD = [7, 30, 90, 365]
+MAXIMO_DIAS_DASHBOARD = 3660
+
+
+@en_replica
 def dashboard_ventas(request):
-    """Dashboard con gráfico de ventas por día."""
-    # Obtener ventas de los últimos 30 días
-    fecha_inicio = timezone.now() - timedelta(days=30)
-    
-    ventas_por_dia = Venta.objects.filter(
-        fecha__gte=fecha_inicio
-    ).annotate(
-        dia=TruncDate('fecha')
-    ).values('dia').annotate(
-        total_dia=Sum('total'),
-        cantidad_ventas=Count('id')
-    ).order_by('dia')
-    
+    """Dashboard con gráfico de ventas por día, leído del resumen diario."""
+    try:
+        dias = int(request.GET.get('dias', 30))
+    except ValueError:
+        dias = 30
+    dias = min(max(dias, 1), MAXIMO_DIAS_DASHBOARD)
+    # La clave es el rango ya normalizado y el día: ?dias=abc y ?dias=30 comparten entrada
+    clave = f'vistas:dashboard:{dias}:{timezone.localdate().isoformat()}'
+    context = obtener(clave, ['ventas'], lambda: _datos_dashboard(dias))
+    context['rangos'] = RANGOS_DASHBOARD
+    return render(request, 'ventas/dashboard.html', context)
+
+
+def _datos_dashboard(dias):
+    fecha_inicio = timezone.localdate() - timedelta(days=dias - 1)
+
+    # Una fila por día con ventas, sin importar cuántas ventas haya en el historial
+    ventas_por_dia = list(ResumenVentaDiaria.objects.filter(fecha__gte=fecha_inicio).order_by('fecha'))
+
     # Preparar datos para Chart.js
-    labels = [v['dia'].strftime('%d/%m') for v in ventas_por_dia]
-    totales = [float(v['total_dia']) for v in ventas_por_dia]
-    cantidades = [v['cantidad_ventas'] for v in ventas_por_dia]
-    
+    formato = '%d/%m' if dias <= 90 else '%d/%m/%y'
+    labels = [v.fecha.strftime(formato) for v in ventas_por_dia]
+    totales = [float(v.total) for v in ventas_por_dia]
+    cantidades = [v.cantidad_ventas for v in ventas_por_dia]
+
     # Estadísticas generales
-    total_ventas = Venta.objects.filter(fecha__gte=fecha_inicio).aggregate(
-        total=Sum('total'),
-        cantidad=Count('id')
-    )
-    
-    context = {
+    total_periodo = sum(v.total for v in ventas_por_dia)
+    cantidad_periodo = sum(cantidades)
+
+    return {
         'labels': labels,
         'totales': totales,
         'cantidades': cantidades,
-        'total_mes': total_ventas['total'] or 0,
-        'cantidad_mes': total_ventas['cantidad'] or 0,
-        'promedio_venta': (total_ventas['total'] / total_ventas['cantidad']) if total_ventas['cantidad'] else 0
+        'dias': dias,
+        'total_mes': total_periodo,
+        'cantidad_mes': cantidad_periodo,
+        'unidades_mes': sum(v.unidades for v in ventas_por_dia),
+        'promedio_venta': (total_periodo / cantidad_periodo) if cantidad_periodo else 0
     }
-    
-    return render(request, 'ventas/dashboard.html', context)